@@ -1,3 +1,4 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
@@ -8,7 +9,8 @@ class RecipeFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags'
     )
     # Фильтры по аннотированным полям
     is_favorited = filters.BooleanFilter(field_name='is_favorited')
@@ -20,6 +22,17 @@ class RecipeFilter(filters.FilterSet):
         model = Recipe
         fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
 
+    def filter_tags(self, queryset, name, tags):
+        if not tags:
+            return queryset
+        # EXISTS вместо JOIN + DISTINCT: лента остаётся отсортированной
+        # по индексу даты, без сортировки всех рецептов с тегом
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=tags
+            )
+        ))
+
 
 class IngredientSearchFilter(SearchFilter):
     """
@@ -0,0 +1,172 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet, UserViewSet
+from recipes.models import ShoppingCart, Tag
+from users.models import User
+
+# Признаки плохого плана: полный просмотр таблицы и сортировка без индекса
+POSTGRES_SEQ_SCAN_RE = re.compile(r'Seq Scan on (\w+)')
+POSTGRES_SORT_RE = re.compile(r'(?:Incremental )?Sort\s+\(cost=\S+ rows=(\d+)')
+SQLITE_SCAN_RE = re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)')
+SQLITE_SORT_RE = re.compile(r'USE TEMP B-TREE FOR (?:ORDER|GROUP) BY')
+
+
+class Command(BaseCommand):
+    """Проверка планов основных запросов API через EXPLAIN."""
+
+    help = (
+        'Выполняет EXPLAIN для запросов ленты рецептов, подписок и списка '
+        'покупок и отмечает полные просмотры и сортировки больших таблиц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='С какого размера таблица считается большой. '
+                 'По умолчанию: 1000'
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='EXPLAIN ANALYZE (только PostgreSQL): выполняет запросы'
+        )
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Печатать планы целиком'
+        )
+        parser.add_argument(
+            '--fail', action='store_true',
+            help='Завершаться с ошибкой, если найдены проблемы'
+        )
+
+    def _table_rows(self, table):
+        if table not in self.table_rows:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute(
+                        'SELECT reltuples FROM pg_class WHERE relname = %s',
+                        (table,)
+                    )
+                else:
+                    cursor.execute(
+                        f'SELECT COUNT(*) FROM '
+                        f'{connection.ops.quote_name(table)}'
+                    )
+                row = cursor.fetchone()
+            self.table_rows[table] = int(row[0]) if row else 0
+        return self.table_rows[table]
+
+    def _issues(self, plan, queryset):
+        """Проблемные узлы плана для текущей СУБД."""
+        if connection.vendor == 'postgresql':
+            scan_re, sort_re = POSTGRES_SEQ_SCAN_RE, POSTGRES_SORT_RE
+        else:
+            scan_re, sort_re = SQLITE_SCAN_RE, SQLITE_SORT_RE
+        issues = []
+        total = None
+        for line in plan.splitlines():
+            scan = scan_re.search(line)
+            if scan:
+                rows = self._table_rows(scan.group(1))
+                if rows >= self.min_rows:
+                    issues.append(
+                        f'полный просмотр {scan.group(1)} ({rows} строк)'
+                    )
+            sort = sort_re.search(line)
+            if sort:
+                # В плане SQLite нет оценки строк: сортируется вся выборка,
+                # её размер считается один раз на запрос
+                if sort.groups():
+                    rows = int(sort.group(1))
+                else:
+                    if total is None:
+                        total = queryset.count()
+                    rows = total
+                if rows >= self.min_rows:
+                    issues.append(
+                        f'сортировка {rows} строк без индекса: {line.strip()}'
+                    )
+        return issues
+
+    def _request(self, user, path, params=None):
+        request = APIRequestFactory().get(path, params or {})
+        if user is not None:
+            force_authenticate(request, user)
+        return request
+
+    def _view(self, viewset, action, request):
+        view = viewset(
+            action_map={'get': action}, format_kwarg=None, kwargs={}
+        )
+        view.request = view.initialize_request(request)
+        return view
+
+    def _recipe_list(self, user, params=None):
+        view = self._view(
+            RecipeViewSet, 'list',
+            self._request(user, '/api/recipes/', params)
+        )
+        return view.filter_queryset(view.get_queryset()), True
+
+    def _subscriptions(self, user):
+        view = self._view(
+            UserViewSet, 'subscriptions',
+            self._request(user, '/api/users/subscriptions/')
+        )
+        return view.get_subscriptions_queryset(), True
+
+    def _queries(self):
+        """Запросы API и признак пагинации для самого активного покупателя."""
+        user = (
+            User.objects.annotate(carts=Count('shopping_carts'))
+            .order_by('-carts').first()
+        )
+        if user is None or not ShoppingCart.objects.exists():
+            raise CommandError('Нет данных для проверки, выполните seed')
+        author = (
+            User.objects.annotate(recipes_count=Count('recipes'))
+            .order_by('-recipes_count').first()
+        )
+        tag = Tag.objects.order_by('id').first()
+        return {
+            'Лента рецептов (аноним)': self._recipe_list(None),
+            'Лента рецептов': self._recipe_list(user),
+            'Рецепты автора': self._recipe_list(user, {'author': author.id}),
+            'Рецепты по тегу': self._recipe_list(user, {'tags': tag.slug}),
+            'Избранное': self._recipe_list(user, {'is_favorited': 1}),
+            'Корзина': self._recipe_list(user, {'is_in_shopping_cart': 1}),
+            'Подписки': self._subscriptions(user),
+            'Список покупок': (
+                RecipeViewSet.get_shopping_cart_ingredients(user), False
+            ),
+        }
+
+    def handle(self, *args, **options):
+        if options['analyze'] and connection.vendor != 'postgresql':
+            raise CommandError('--analyze поддерживается только PostgreSQL')
+        self.min_rows = options['min_rows']
+        self.page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        self.table_rows = {}
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        total = 0
+        for name, (queryset, paginated) in self._queries().items():
+            page = queryset[:self.page_size] if paginated else queryset
+            plan = page.explain(**explain_options)
+            issues = self._issues(plan, queryset)
+            total += len(issues)
+            if issues:
+                self.stdout.write(self.style.WARNING(f'{name}:'))
+                for issue in issues:
+                    self.stdout.write(f'  {issue}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: OK'))
+            if options['verbose_plans'] or issues:
+                self.stdout.write(plan + '\n')
+        if total and options['fail']:
+            raise CommandError(f'Найдено проблем в планах: {total}')
+        self.stdout.write(f'Проблем в планах: {total}')
@@ -0,0 +1,377 @@
+import json
+import random
+import re
+import subprocess
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+DEFAULT_COLLECTION = (
+    settings.BASE_DIR.parent / 'postman_collection'
+    / 'foodgram.postman_collection.json'
+)
+PERCENTILES = (50, 95, 99)
+VARIABLE_RE = re.compile(r'{{(\w+)}}')
+
+# Сценарии — последовательности запросов коллекции Postman (по имени)
+# и их относительные веса в общей нагрузке
+SCENARIOS = {
+    'browse_feed': (50, (
+        'get_recipes_list // User',
+        'get_recipe_detail // User',
+    )),
+    'filter_by_tags': (20, (
+        'get_recipes_list_with_two_tags_param // User',
+    )),
+    'favorite': (10, (
+        'add_to_favorite // User',
+        'get_recipes_list_with_is_favorited_param // User',
+        'remove_from_favorite // User',
+    )),
+    'fill_cart': (10, (
+        'add_to_shopping_cart // User',
+        'get_recipes_list_with_is_in_shopping_cart_param // User',
+        'remove_from_shopping_cart // User',
+    )),
+    'download_list': (5, (
+        'download_shopping_cart // User',
+    )),
+    'subscribe': (5, (
+        'create_subscription // User',
+        'get_subscription_list // User',
+        'delete_first_subscription // User',
+    )),
+}
+
+
+def iter_requests(items):
+    for item in items:
+        if 'item' in item:
+            yield from iter_requests(item['item'])
+        else:
+            yield item
+
+
+def percentile(sorted_values, rank):
+    """Перцентиль методом ближайшего ранга, в миллисекундах."""
+    if not sorted_values:
+        return None
+    index = max(0, -(-rank * len(sorted_values) // 100) - 1)
+    return round(sorted_values[index] * 1000, 2)
+
+
+def is_error(status):
+    """Сбой соединения (None) или ответ не 2xx/3xx."""
+    return status is None or not 200 <= status < 400
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies = sorted(latencies)
+    count = len(latencies)
+    errors = sum(
+        number for status, number in statuses.items() if is_error(status)
+    )
+    summary = {
+        'count': count,
+        'errors': errors,
+        # Статус None — сбой соединения
+        'statuses': {
+            str(status): number for status, number in sorted(
+                statuses.items(), key=lambda item: item[0] or 0
+            )
+        },
+        'error_rate': round(errors / count, 4) if count else 0,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else 0,
+        'mean_ms': (
+            round(sum(latencies) / count * 1000, 2) if count else None
+        ),
+    }
+    for rank in PERCENTILES:
+        summary[f'p{rank}_ms'] = percentile(latencies, rank)
+    return summary
+
+
+class Command(BaseCommand):
+    """Нагрузочное тестирование API по сценариям коллекции Postman."""
+
+    help = (
+        'Воспроизводит взвешенные сценарии из коллекции Postman против '
+        'запущенного сервера и сохраняет задержки по эндпоинтам в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url', type=str, default='http://127.0.0.1:8000',
+            help='Адрес сервера. По умолчанию: http://127.0.0.1:8000'
+        )
+        parser.add_argument(
+            '--collection', type=str, default=str(DEFAULT_COLLECTION),
+            help='Путь к коллекции Postman'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help='Количество параллельных виртуальных пользователей'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Длительность теста в секундах. По умолчанию: 30'
+        )
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Сколько пользователей из БД использовать для авторизации'
+        )
+        parser.add_argument(
+            '--scenario', action='append', choices=tuple(SCENARIOS),
+            help='Запустить только указанные сценарии (можно повторять)'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора для выбора сценариев и параметров'
+        )
+        parser.add_argument(
+            '--output', type=str,
+            help='Путь к JSON-файлу с результатами'
+        )
+        parser.add_argument(
+            '--compare', type=str,
+            help='JSON предыдущего прогона для сравнения p95'
+        )
+
+    def _load_collection(self, path, scenarios):
+        try:
+            with open(path, encoding='utf-8') as file:
+                collection = json.load(file)
+        except (OSError, json.JSONDecodeError) as error:
+            raise CommandError(f'Не удалось прочитать коллекцию: {error}')
+        requests = {}
+        for item in iter_requests(collection['item']):
+            url = item['request']['url']
+            raw = url['raw'] if isinstance(url, dict) else url
+            requests.setdefault(item['name'], (
+                item['request']['method'],
+                raw.replace('{{baseUrl}}', ''),
+            ))
+        steps = {}
+        for name in scenarios:
+            missing = [
+                step for step in SCENARIOS[name][1] if step not in requests
+            ]
+            if missing:
+                raise CommandError(
+                    f'В коллекции нет запросов сценария {name}: {missing}'
+                )
+            steps[name] = [requests[step] for step in SCENARIOS[name][1]]
+        return steps
+
+    def _load_pools(self, users_count):
+        """Данные для подстановки переменных коллекции."""
+        users = list(
+            User.objects.filter(is_active=True)
+            .order_by('id').values_list('id', flat=True)[:users_count]
+        )
+        if not users:
+            raise CommandError('Нет пользователей, выполните команду seed')
+        tokens = {
+            token.user_id: token.key for token in (
+                Token.objects.get_or_create(user_id=user_id)[0]
+                for user_id in users
+            )
+        }
+        pools = {
+            'recipes': list(
+                Recipe.objects.order_by('id').values_list('id', flat=True)
+            ),
+            'tags': list(Tag.objects.values_list('slug', flat=True)),
+            'tag_ids': list(Tag.objects.values_list('id', flat=True)),
+            'ingredients': list(
+                Ingredient.objects.values_list('id', flat=True)[:1000]
+            ),
+            'users': users,
+        }
+        if not pools['recipes'] or not pools['tags']:
+            raise CommandError('Нет рецептов или тегов, выполните seed')
+        return tokens, pools
+
+    def _resolve(self, variable, rng, user_id, token, pools):
+        """Значение переменной Postman для конкретного прогона сценария."""
+        if variable == 'userToken':
+            return token
+        if variable == 'userId':
+            return user_id
+        if variable.endswith('RecipeId'):
+            return rng.choice(pools['recipes'])
+        if variable.endswith('TagSlug'):
+            return rng.choice(pools['tags'])
+        if variable.endswith('TagId'):
+            return rng.choice(pools['tag_ids'])
+        if variable.endswith('IndredientId'):
+            return rng.choice(pools['ingredients'])
+        if variable.endswith('UserId'):
+            authors = [user for user in pools['users'] if user != user_id]
+            return rng.choice(authors or pools['users'])
+        if variable == 'ingredientNameFirstLatter':
+            return rng.choice('абвгдеклмнопрст')
+        raise CommandError(f'Неизвестная переменная коллекции: {variable}')
+
+    def _worker(self, number, deadline, steps, weights, tokens, pools,
+                seed, results):
+        rng = random.Random(seed * 1000 + number)
+        parts = urlsplit(self.base_url)
+        connection_class = (
+            HTTPSConnection if parts.scheme == 'https' else HTTPConnection
+        )
+        connection = connection_class(parts.hostname, parts.port)
+        latencies = defaultdict(list)
+        statuses = defaultdict(Counter)
+        names = list(weights)
+        cum_weights = []
+        total = 0
+        for name in names:
+            total += weights[name]
+            cum_weights.append(total)
+        while time.monotonic() < deadline:
+            scenario = rng.choices(names, cum_weights=cum_weights)[0]
+            user_id = rng.choice(pools['users'])
+            token = tokens[user_id]
+            # Переменные фиксируются на весь прогон сценария, чтобы
+            # добавление и удаление касались одного и того же рецепта
+            bound = {}
+
+            def substitute(match):
+                variable = match.group(1)
+                if variable not in bound:
+                    bound[variable] = self._resolve(
+                        variable, rng, user_id, token, pools
+                    )
+                return str(bound[variable])
+
+            for method, template in steps[scenario]:
+                path = VARIABLE_RE.sub(substitute, template)
+                label = f'{method} {template}'
+                started = time.perf_counter()
+                try:
+                    connection.request(
+                        method, parts.path.rstrip('/') + path,
+                        headers={'Authorization': f'Token {token}'}
+                    )
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, HTTPException):
+                    connection.close()
+                    status = None
+                latencies[label].append(time.perf_counter() - started)
+                statuses[label][status] += 1
+        connection.close()
+        results.append((latencies, statuses))
+
+    def _print_report(self, report, baseline):
+        previous = (baseline or {}).get('endpoints', {})
+        for label, stats in sorted(report['endpoints'].items()):
+            line = (
+                f'{label}: n={stats["count"]} '
+                f'p50={stats["p50_ms"]} p95={stats["p95_ms"]} '
+                f'p99={stats["p99_ms"]} мс, {stats["throughput_rps"]} rps, '
+                f'ошибок {stats["error_rate"]:.2%}'
+            )
+            failed = {
+                status: number for status, number in stats['statuses'].items()
+                if is_error(None if status == 'None' else int(status))
+            }
+            if failed:
+                # 400 бывает и от пересекающихся сценариев: рецепт уже
+                # в избранном у этого пользователя и т. п.
+                line += ' [' + ', '.join(
+                    f'{status}: {number}' for status, number in failed.items()
+                ) + ']'
+            old = previous.get(label, {}).get('p95_ms')
+            if old:
+                line += f' (p95 {stats["p95_ms"] / old - 1:+.1%})'
+            self.stdout.write(line)
+        total = report['total']
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего: {total["count"]} запросов, '
+            f'{total["throughput_rps"]} rps, p95={total["p95_ms"]} мс, '
+            f'ошибок {total["error_rate"]:.2%}'
+        ))
+
+    @staticmethod
+    def _commit():
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', 'HEAD'), capture_output=True,
+                text=True, cwd=settings.BASE_DIR, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        self.base_url = options['base_url']
+        scenarios = options['scenario'] or tuple(SCENARIOS)
+        steps = self._load_collection(options['collection'], scenarios)
+        weights = {name: SCENARIOS[name][0] for name in scenarios}
+        tokens, pools = self._load_pools(options['users'])
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        results = []
+        self.stdout.write(
+            f'Нагрузка: {options["concurrency"]} потоков, '
+            f'{options["duration"]} с, сценарии: {", ".join(scenarios)}'
+        )
+        started_at = datetime.now(timezone.utc).isoformat()
+        started = time.monotonic()
+        deadline = started + options['duration']
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            futures = [
+                executor.submit(
+                    self._worker, number, deadline, steps, weights,
+                    tokens, pools, options['seed'], results
+                )
+                for number in range(options['concurrency'])
+            ]
+        for future in futures:
+            future.result()
+        elapsed = time.monotonic() - started
+
+        latencies = defaultdict(list)
+        statuses = defaultdict(Counter)
+        for worker_latencies, worker_statuses in results:
+            for label, values in worker_latencies.items():
+                latencies[label].extend(values)
+            for label, counts in worker_statuses.items():
+                statuses[label].update(counts)
+        report = {
+            'commit': self._commit(),
+            'started_at': started_at,
+            'config': {
+                key: options[key] for key in (
+                    'base_url', 'concurrency', 'duration', 'users', 'seed'
+                )
+            },
+            'scenarios': weights,
+            'endpoints': {
+                label: summarize(values, statuses[label], elapsed)
+                for label, values in latencies.items()
+            },
+            'total': summarize(
+                [value for values in latencies.values() for value in values],
+                sum(statuses.values(), Counter()), elapsed
+            ),
+        }
+        self._print_report(report, baseline)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
@@ -1,11 +1,19 @@
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import (
     UserSerializer as BaseUserSerializer
 )
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from core.constants import MIN_INGREDIENT_AMOUNT
+from core import catalog
+from core.batch import get_batch_cache
+from core.constants import (
+    MAX_PANTRY_INGREDIENTS, MAX_PATH_LENGTH, MIN_INGREDIENT_AMOUNT
+)
+from core.fieldsets import SparseFieldsMixin
+from core.utils import set_prefetched
 from recipes.models import (
     Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Tag
 )
@@ -20,7 +28,7 @@ class AvatarSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
-class UserSerializer(BaseUserSerializer):
+class UserSerializer(SparseFieldsMixin, BaseUserSerializer):
     """Основной сериализатор пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
@@ -31,10 +39,28 @@ class UserSerializer(BaseUserSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        return (
+        if not (
             request and request.user.is_authenticated
-            and request.user.user_subscriptions.filter(author=obj).exists()
-        )
+            # На себя подписаться нельзя — запрос не нужен
+            and request.user != obj
+        ):
+            return False
+        return obj.pk in self.get_subscribed_ids(request.user)
+
+    def get_subscribed_ids(self, user):
+        """
+        Авторы, на которых подписан пользователь: один запрос на ответ,
+        а в пакетном запросе — на все подзапросы.
+        """
+        # Списки и вложенные сериализаторы делят корневой сериализатор
+        cache = get_batch_cache()
+        if cache is None:
+            cache = self.root.__dict__.setdefault('_subscriptions', {})
+        if 'subscribed_ids' not in cache:
+            cache['subscribed_ids'] = set(
+                user.user_subscriptions.values_list('author_id', flat=True)
+            )
+        return cache['subscribed_ids']
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
@@ -43,6 +69,13 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class SimilarRecipeSerializer(ShortRecipeSerializer):
+    score = serializers.FloatField(read_only=True)
+
+    class Meta(ShortRecipeSerializer.Meta):
+        fields = ShortRecipeSerializer.Meta.fields + ('score',)
+
+
 class SubscriptionReadSerializer(UserSerializer):
     """Сериализатор для подписок с дополнительной информацией."""
 
@@ -126,7 +159,9 @@ class IngredientInRecipeReadSerializer(serializers.ModelSerializer):
 
 
 class IngredientInRecipeWriteSerializer(serializers.Serializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Существование ингредиентов проверяется одним запросом
+    # в RecipeWriteSerializer.validate_ingredients
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         min_value=MIN_INGREDIENT_AMOUNT,
         error_messages={'min_value': f'Количество ингредиента не должно быть'
@@ -134,7 +169,7 @@ class IngredientInRecipeWriteSerializer(serializers.Serializer):
     )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = IngredientInRecipeReadSerializer(
         source='recipe_ingredients', many=True
@@ -150,8 +185,20 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'id', 'author', 'name', 'image', 'text', 'ingredients',
             'is_favorited', 'is_in_shopping_cart', 'tags', 'cooking_time'
         )
+        # Без ?expand= при ?fields= вложенные объекты отдаются как id
+        collapsed_fields = {
+            'author': serializers.IntegerField(
+                source='author_id', read_only=True
+            ),
+            'tags': serializers.PrimaryKeyRelatedField(
+                many=True, read_only=True
+            ),
+        }
 
     def get_is_favorited(self, obj):
+        # Значение уже аннотировано в RecipeViewSet.get_queryset
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (
             request and request.user.is_authenticated
@@ -159,6 +206,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (
             request and request.user.is_authenticated
@@ -166,11 +215,67 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
 
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """Рецепт из поиска по имеющимся ингредиентам."""
+
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.SerializerMethodField()
+    coverage = serializers.SerializerMethodField()
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'matched_ingredients', 'missing_ingredients', 'coverage'
+        )
+
+    def get_missing_ingredients(self, obj):
+        return obj.total_ingredients - obj.matched_ingredients
+
+    def get_coverage(self, obj):
+        return round(obj.matched_ingredients / obj.total_ingredients, 3)
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=MAX_PANTRY_INGREDIENTS
+    )
+    tags = serializers.ListField(
+        child=serializers.SlugField(), required=False
+    )
+    max_cooking_time = serializers.IntegerField(
+        min_value=1, required=False
+    )
+
+    def validate_tags(self, value):
+        """Слаги тегов в id по справочнику в памяти."""
+        tag_ids = {tag['slug']: tag['id'] for tag in catalog.tags.get()}
+        unknown = [slug for slug in value if slug not in tag_ids]
+        if unknown:
+            raise serializers.ValidationError(
+                f'Тег "{unknown[0]}" не существует.'
+            )
+        return {tag_ids[slug] for slug in value}
+
+    @classmethod
+    def from_query_params(cls, query_params):
+        """ingredients принимает и 1,2,3, и повторяющийся параметр."""
+        data = {
+            'ingredients': [
+                value for item in query_params.getlist('ingredients')
+                for value in item.split(',') if value
+            ],
+            'tags': query_params.getlist('tags'),
+        }
+        if 'max_cooking_time' in query_params:
+            data['max_cooking_time'] = query_params['max_cooking_time']
+        return cls(data=data)
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = IngredientInRecipeWriteSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField(required=True, allow_null=False)
     cooking_time = serializers.IntegerField(
         min_value=MIN_INGREDIENT_AMOUNT,
@@ -203,7 +308,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться'
             )
-        return value
+        ingredients = self._get_existing(Ingredient, ingredient_ids)
+        return [
+            {'ingredient': ingredients[item['id']], 'amount': item['amount']}
+            for item in value
+        ]
 
     def validate_tags(self, value):
         if not value:
@@ -215,7 +324,20 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Теги не должны повторяться'
             )
-        return value
+        tags = self._get_existing(Tag, value)
+        return [tags[pk] for pk in value]
+
+    @staticmethod
+    def _get_existing(model, ids):
+        """Объекты по списку id одним запросом IN."""
+        objects = model.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                f'Недопустимый первичный ключ "{missing[0]}" - '
+                f'объект не существует.'
+            )
+        return objects
 
     def validate(self, data):
         if 'tags' not in self.initial_data:
@@ -229,39 +351,100 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
+        # UpdateModelMixin сбрасывает кеш prefetch_related после записи,
+        # поэтому он заполняется записанными объектами. Связи, которые
+        # PATCH не менял, читаются двумя запросами, а не на каждый объект
+        for name, objects in getattr(self, '_written_relations', {}).items():
+            set_prefetched(instance, name, objects)
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
+            'tags'
+        )
         return RecipeReadSerializer(instance, context=self.context).data
 
     @staticmethod
     def create_ingredients(ingredients_data, recipe):
-        IngredientInRecipe.objects.bulk_create([
+        return IngredientInRecipe.objects.bulk_create([
             IngredientInRecipe(
                 recipe=recipe,
-                ingredient=item['id'],
+                ingredient=item['ingredient'],
                 amount=item['amount']
             )
             for item in ingredients_data
         ])
 
+    @staticmethod
+    def update_ingredients(ingredients_data, recipe):
+        """
+        Меняет только изменившиеся количества, добавляет новые
+        и удаляет убранные ингредиенты. Возвращает строки рецепта
+        в порядке запроса.
+        """
+        current = {
+            item.ingredient_id: item
+            for item in recipe.recipe_ingredients.all()
+        }
+        result, changed, created = [], [], []
+        for item in ingredients_data:
+            ingredient = item['ingredient']
+            row = current.pop(ingredient.id, None)
+            if row is None:
+                row = IngredientInRecipe(
+                    recipe=recipe, ingredient=ingredient,
+                    amount=item['amount']
+                )
+                created.append(row)
+            else:
+                # Ингредиент уже прочитан валидацией: ответ без запросов
+                row.ingredient = ingredient
+                if row.amount != item['amount']:
+                    row.amount = item['amount']
+                    changed.append(row)
+            result.append(row)
+        if current:
+            IngredientInRecipe.objects.filter(
+                pk__in=[row.pk for row in current.values()]
+            ).delete()
+        IngredientInRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientInRecipe.objects.bulk_create(created)
+        return result
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        self.create_ingredients(ingredients_data, recipe)
         recipe.tags.set(tags)
+        self._written_relations = {
+            'recipe_ingredients': self.create_ingredients(
+                ingredients_data, recipe
+            ),
+            'tags': tags,
+        }
+        # Новый рецепт ещё никто не добавил в избранное или корзину
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients', None)
         tags = validated_data.pop('tags', None)
+        self._written_relations = {}
 
         if ingredients_data is not None:
-            instance.recipe_ingredients.all().delete()
-            self.create_ingredients(ingredients_data, instance)
+            self._written_relations['recipe_ingredients'] = (
+                self.update_ingredients(ingredients_data, instance)
+            )
 
         if tags is not None:
             instance.tags.set(tags)
+            self._written_relations['tags'] = tags
 
         return super().update(instance, validated_data)
 
@@ -295,3 +478,29 @@ class FavoriteWriteSerializer(BaseWriteSerializer):
 class ShoppingCartWriteSerializer(BaseWriteSerializer):
     class Meta(BaseWriteSerializer.Meta):
         model = ShoppingCart
+
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=('GET',), default='GET')
+    path = serializers.CharField(max_length=MAX_PATH_LENGTH)
+
+    def validate_path(self, path):
+        if not path.startswith('/api/'):
+            raise serializers.ValidationError(
+                'Путь должен начинаться с /api/.'
+            )
+        return path
+
+
+class BatchSerializer(serializers.Serializer):
+    """Подзапросы пакетного запроса к API."""
+
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+    parallel = serializers.BooleanField(default=False)
+
+    def validate_requests(self, requests):
+        if len(requests) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(
+                f'Не больше {settings.BATCH_MAX_REQUESTS} подзапросов.'
+            )
+        return requests
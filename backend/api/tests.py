@@ -0,0 +1,647 @@
+import json
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.management.commands.check_query_plans import (
+    Command as CheckQueryPlansCommand
+)
+from api.management.commands.loadtest import (
+    DEFAULT_COLLECTION, SCENARIOS, Command as LoadTestCommand, summarize
+)
+from api.views import TagViewSet, ingredient_list
+from core.batch import SubRequest
+from core.cache import invalidate
+from recipes.models import (
+    Ingredient, IngredientInRecipe, Recipe, RecipeRanking, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+
+class RankingOrderingTests(TestCase):
+    """Лента ?ordering=popular по курсору."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        Tag.objects.create(name='Обед', slug='lunch')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        items = [
+            {
+                'author': 'author@example.com',
+                'name': f'Рецепт {number}',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'image': 'images/seed.png',
+                'pub_date': '2026-01-01T00:00:00+00:00',
+                'tags': ['lunch'],
+                'ingredients': [{
+                    'name': 'Соль', 'measurement_unit': 'г', 'amount': 1
+                }],
+            }
+            for number in range(7)
+        ]
+        # Импорт идёт через bulk_create, без сигналов создания рецепта
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.ndjson', encoding='utf-8'
+        ) as file:
+            file.writelines(
+                json.dumps(item, ensure_ascii=False) + '\n' for item in items
+            )
+            file.flush()
+            call_command('import_recipes', file.name, stdout=StringIO())
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def page_through(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_imported_recipes_have_rankings(self):
+        self.assertEqual(
+            RecipeRanking.objects.count(), Recipe.objects.count()
+        )
+
+    def test_pages_reach_the_end(self):
+        recipe_ids = sorted(
+            Recipe.objects.values_list('id', flat=True), reverse=True
+        )
+        # Одинаковые оценки: порядок внутри серии задаёт id
+        RecipeRanking.objects.filter(recipe_id=recipe_ids[-1]).update(
+            popular=2.5
+        )
+        RecipeRanking.objects.filter(recipe_id__in=recipe_ids[:2]).update(
+            popular=1.5
+        )
+        expected = [recipe_ids[-1], *recipe_ids[:-1]]
+        self.assertEqual(
+            self.page_through('/api/recipes/?ordering=popular&limit=2'),
+            expected
+        )
+
+
+class SubscriptionFlagTests(TestCase):
+    """is_subscribed в списках без запроса на каждого автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', first_name='Автор',
+                last_name=f'Номер {number}', password='password'
+            )
+            for number in range(4)
+        ]
+        for author in cls.authors[:3]:
+            Subscription.objects.create(user=cls.reader, author=author)
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {author.username}',
+                text='Описание', cooking_time=10, image='images/seed.png'
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        self.subscribed = {author.pk for author in self.authors[:3]}
+
+    def test_users_list(self):
+        # Полный список пользователей djoser показывает только персоналу
+        self.reader.is_staff = True
+        self.client.force_authenticate(self.reader)
+        response = self.client.get('/api/users/?limit=6')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {
+                user['id'] for user in response.data['results']
+                if user['is_subscribed']
+            },
+            self.subscribed
+        )
+
+    def test_subscriptions_list(self):
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(
+            user['is_subscribed'] for user in response.data['results']
+        ))
+
+    def test_recipe_authors(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {
+                recipe['author']['id'] for recipe in response.data['results']
+                if recipe['author']['is_subscribed']
+            },
+            self.subscribed
+        )
+
+
+class RecipeUpdateTests(TestCase):
+    """Ответ на изменение рецепта строится по сохранённым связям."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.lunch = Tag.objects.create(name='Обед', slug='lunch')
+        cls.dinner = Tag.objects.create(name='Ужин', slug='dinner')
+        cls.salt, cls.pepper, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Перец', 'Мука')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+        cls.recipe.tags.set([cls.lunch])
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(
+                recipe=cls.recipe, ingredient=ingredient, amount=1
+            )
+            for ingredient in (cls.salt, cls.pepper)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_response_reflects_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', {
+                    'tags': [self.dinner.id],
+                    'ingredients': [
+                        {'id': self.salt.id, 'amount': 5},
+                        {'id': self.flour.id, 'amount': 200},
+                    ],
+                }, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        # Ответ строится из записанных объектов: после записи (конец
+        # transaction.atomic сериализатора) запросов нет
+        self.assertTrue(
+            queries.captured_queries[-1]['sql'].startswith('RELEASE')
+        )
+        self.assertEqual(
+            [tag['slug'] for tag in response.data['tags']], ['dinner']
+        )
+        self.assertEqual(
+            sorted(
+                (item['name'], item['amount'])
+                for item in response.data['ingredients']
+            ),
+            [('Мука', 200), ('Соль', 5)]
+        )
+
+
+@override_settings(CATALOG_CHECK_INTERVAL=0)
+class IngredientCatalogTests(TestCase):
+    """Асинхронный поиск ингредиентов по снимку справочника."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Соль', 'Морская соль', 'Соль морская', 'Сахар'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        # Снимок общий для процесса: после других тестов он устарел
+        invalidate('ingredients')
+
+    def search(self, query=None, method='get'):
+        params = {} if query is None else {'name': query}
+        request = getattr(RequestFactory(), method)(
+            '/api/ingredients/', params
+        )
+        response = async_to_sync(ingredient_list)(request)
+        if response.status_code != 200:
+            return response.status_code
+        return [item['name'] for item in json.loads(response.content)]
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(
+            self.search('соль'), ['Соль', 'Соль морская', 'Морская соль']
+        )
+        self.assertEqual(
+            self.search('МОР, соль'), ['Морская соль', 'Соль морская']
+        )
+        self.assertEqual(self.search('перец'), [])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_limit(self):
+        self.assertEqual(self.search('соль'), ['Соль', 'Соль морская'])
+        self.assertEqual(self.search(), ['Морская соль', 'Сахар'])
+
+    def test_snapshot_follows_changes(self):
+        self.assertEqual(self.search('перец'), [])
+        Ingredient.objects.create(name='Перец', measurement_unit='г')
+        invalidate('ingredients')
+        self.assertEqual(self.search('перец'), ['Перец'])
+
+    def test_write_goes_to_viewset(self):
+        self.assertEqual(self.search(method='post'), 405)
+
+
+class SparseFieldsTests(TestCase):
+    """?fields= и ?expand=: состав ответа, число запросов и ошибки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10, image='images/seed.png'
+            )
+            recipe.tags.add(cls.tag)
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=salt, amount=1
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def results(self, query, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_fields_narrow_response_and_queries(self):
+        # COUNT и SELECT рецептов без связей и аннотаций
+        self.assertEqual(
+            self.results('fields=id,name', 2)[0].keys(), {'id', 'name'}
+        )
+        # Теги — id из одного запроса к связи
+        self.assertEqual(
+            self.results('fields=id,tags', 3)[0]['tags'], [self.tag.id]
+        )
+        # Автор — JOIN, подписки читателя — один запрос на страницу
+        recipe = self.results('fields=id,tags,author&expand=tags,author', 4)[0]
+        self.assertEqual(recipe['tags'][0]['slug'], 'lunch')
+        self.assertEqual(recipe['author']['username'], 'author')
+        self.assertEqual(
+            self.results('fields=id,is_favorited', 2)[0]['is_favorited'],
+            False
+        )
+
+    def test_invalid_fields(self):
+        for query, param in (
+            ('fields=', 'fields'),
+            ('fields=%20,', 'fields'),
+            ('fields=id,calories', 'fields'),
+            ('expand=ingredients', 'expand'),
+            # Пустая страница: сериализатор не вызывается
+            (f'fields=calories&author={self.reader.id}', 'fields'),
+        ):
+            with self.subTest(query=query), self.assertNumQueries(0):
+                response = self.client.get(f'/api/recipes/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(param, response.json())
+
+    def test_user_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f'/api/users/{self.author.id}/?fields=id,username'
+            )
+        self.assertEqual(response.json(), {
+            'id': self.author.id, 'username': 'author'
+        })
+        response = self.client.get(f'/api/users/{self.author.id}/?fields=')
+        self.assertEqual(response.status_code, 400)
+
+
+class LoadTestHarnessTests(TestCase):
+    """loadtest: сценарии из коллекции, подстановка и учёт статусов."""
+
+    def test_summary(self):
+        summary = summarize(
+            [0.05, 0.01, 0.03, 0.02, 0.04],
+            Counter({200: 2, 302: 1, 404: 1, None: 1}), 2
+        )
+        self.assertEqual(summary['errors'], 2)
+        self.assertEqual(summary['error_rate'], 0.4)
+        self.assertEqual(
+            list(summary['statuses']), ['None', '200', '302', '404']
+        )
+        self.assertEqual(summary['p50_ms'], 30.0)
+        self.assertEqual(summary['p99_ms'], 50.0)
+        self.assertEqual(summary['throughput_rps'], 2.5)
+
+    def test_collection_has_scenario_requests(self):
+        steps = LoadTestCommand()._load_collection(
+            str(DEFAULT_COLLECTION), tuple(SCENARIOS)
+        )
+        for name, (_, requests) in SCENARIOS.items():
+            self.assertEqual(len(steps[name]), len(requests), name)
+
+    def test_worker_binds_variables_per_scenario(self):
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def respond(self):
+                received.append((self.command, self.path))
+                self.send_response(500 if self.command == 'DELETE' else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_GET = do_POST = do_DELETE = respond
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        command = LoadTestCommand()
+        command.base_url = f'http://127.0.0.1:{server.server_port}'
+        steps = command._load_collection(
+            str(DEFAULT_COLLECTION), ('favorite',)
+        )
+        results = []
+        command._worker(
+            0, time.monotonic() + 0.2, steps, {'favorite': 1},
+            {1: 'token'}, {'recipes': [10, 20, 30], 'users': [1]}, 42,
+            results
+        )
+        [(latencies, statuses)] = results
+        self.assertGreaterEqual(len(received), 3)
+        # Добавление и удаление в одном прогоне — один и тот же рецепт
+        for start in range(0, len(received) - 2, 3):
+            add, _, remove = received[start:start + 3]
+            self.assertEqual(add[0], 'POST')
+            self.assertEqual(remove, ('DELETE', add[1]))
+        errors = defaultdict(int)
+        for label, counts in statuses.items():
+            errors[label.split()[0]] += counts[500]
+        self.assertEqual(errors['DELETE'], len(received) // 3)
+        self.assertEqual(errors['POST'] + errors['GET'], 0)
+
+
+class QueryPlanTests(TestCase):
+    """Индексы ленты, фильтр по тегам и check_query_plans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.lunch = Tag.objects.create(name='Обед', slug='lunch')
+        cls.dinner = Tag.objects.create(name='Ужин', slug='dinner')
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        cls.recipes = []
+        for number, tags in enumerate(
+            ((cls.lunch,), (cls.lunch, cls.dinner), ())
+        ):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10, image='images/seed.png'
+            )
+            for tag in tags:
+                Recipe.tags.through.objects.create(recipe=recipe, tag=tag)
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=salt, amount=1
+            )
+            cls.recipes.append(recipe)
+
+    def test_tag_filter_returns_each_recipe_once(self):
+        response = APIClient().get(
+            '/api/recipes/?tags=lunch&tags=dinner&limit=10'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(
+            [recipe['name'] for recipe in response.json()['results']],
+            ['Рецепт 1', 'Рецепт 0']
+        )
+
+    def test_requires_seeded_data(self):
+        with self.assertRaises(CommandError):
+            call_command('check_query_plans', stdout=StringIO())
+
+    def test_feed_plans_use_indexes(self):
+        ShoppingCart.objects.create(user=self.author, recipe=self.recipes[0])
+        out = StringIO()
+        call_command('check_query_plans', '--verbose-plans', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Проблем в планах: 0', output)
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX recipe_pub_date_idx', output)
+            self.assertIn('USING INDEX recipe_author_pub_date_idx', output)
+        # Список покупок сортируется: при --min-rows 1 это проблема
+        with self.assertRaises(CommandError):
+            call_command(
+                'check_query_plans', '--min-rows', '1', '--fail',
+                stdout=StringIO()
+            )
+
+    def test_postgresql_plan_issues(self):
+        command = CheckQueryPlansCommand()
+        command.min_rows = 1000
+        command.table_rows = {'recipes_recipe': 5000, 'recipes_tag': 10}
+        plan = (
+            'Limit  (cost=0.1..9.9 rows=6 width=8)\n'
+            '  ->  Sort  (cost=1.0..2.0 rows=5000 width=8)\n'
+            '        ->  Seq Scan on recipes_recipe  (cost=0.0..1.0)\n'
+            '  ->  Seq Scan on recipes_tag  (cost=0.0..1.0)\n'
+            '  ->  Index Scan using recipe_pub_date_idx on recipes_recipe'
+        )
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            issues = command._issues(plan, Recipe.objects.all())
+        self.assertEqual(len(issues), 2)
+        self.assertTrue(issues[0].startswith('сортировка 5000 строк'))
+        self.assertEqual(
+            issues[1], 'полный просмотр recipes_recipe (5000 строк)'
+        )
+
+
+class BatchTests(TestCase):
+    """POST /api/batch/: ответы подзапросов, лимиты и пользователь."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', first_name='Автор',
+                last_name='Рецептов', password='password'
+            )
+            for number in range(2)
+        ]
+        Subscription.objects.create(user=cls.reader, author=cls.authors[0])
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            author=cls.authors[0], name='Рецепт', text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+
+    def batch(self, paths, client=None, **params):
+        client = client or APIClient()
+        return client.post('/api/batch/', {
+            'requests': [{'path': path} for path in paths], **params
+        }, format='json')
+
+    def test_responses_in_request_order(self):
+        paths = [
+            '/api/tags/', f'/api/recipes/{self.recipe.id}/',
+            '/api/recipes/0/', '/api/unknown/', '/api/users/me/',
+            '/api/ingredients/?name=Со', '/api/batch/', '/api/tags/',
+        ]
+        with mock.patch.object(
+            SubRequest, 'execute', autospec=True,
+            side_effect=SubRequest.execute
+        ) as execute:
+            response = self.batch(paths)
+        self.assertEqual(response.status_code, 200)
+        responses = response.json()['responses']
+        self.assertEqual([item['path'] for item in responses], paths)
+        self.assertEqual(
+            [item['status'] for item in responses],
+            [200, 200, 404, 404, 401, 200, 405, 200]
+        )
+        self.assertEqual(responses[0]['body'], [
+            {'id': self.tag.id, 'name': 'Обед', 'slug': 'lunch'}
+        ])
+        self.assertEqual(responses[1]['body']['name'], 'Рецепт')
+        self.assertEqual(responses[5]['body'][0]['name'], 'Соль')
+        # Одинаковые пути выполняются один раз
+        self.assertEqual(execute.call_count, len(paths) - 1)
+        self.assertEqual(responses[-1], {**responses[0], 'path': '/api/tags/'})
+
+    def test_subrequests_share_user_and_subscriptions(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        paths = [f'/api/users/{author.id}/' for author in self.authors]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(['/api/users/me/', *paths], client)
+        responses = response.json()['responses']
+        self.assertEqual(responses[0]['body']['id'], self.reader.id)
+        self.assertEqual(
+            [item['body']['is_subscribed'] for item in responses[1:]],
+            [True, False]
+        )
+        # Подписки читаются один раз на весь пакет
+        self.assertEqual(sum(
+            'users_subscription' in query['sql']
+            for query in queries.captured_queries
+        ), 1)
+
+    def test_invalid_requests(self):
+        for body in (
+            {'requests': []},
+            {'requests': [{'path': '/admin/'}]},
+            {'requests': [{'method': 'POST', 'path': '/api/tags/'}]},
+        ):
+            response = APIClient().post('/api/batch/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('requests', response.json())
+
+    @override_settings(BATCH_MAX_REQUESTS=3)
+    def test_request_limit(self):
+        paths = [f'/api/recipes/{number}/' for number in range(4)]
+        self.assertEqual(self.batch(paths).status_code, 400)
+        self.assertEqual(self.batch(paths[:3]).status_code, 200)
+
+    @override_settings(BATCH_MAX_COST=11, BATCH_LIST_COST=5)
+    def test_cost_limit(self):
+        lists = ['/api/recipes/', '/api/users/']
+        details = [f'/api/recipes/{number}/' for number in range(2)]
+        response = self.batch([*lists, *details])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['requests'], [
+            'Стоимость пакета 12 больше допустимой 11: список стоит 5, '
+            'остальные запросы — 1.'
+        ])
+        # Повтор пути не стоит ничего
+        self.assertEqual(
+            self.batch([*lists, details[0], details[0]]).status_code, 200
+        )
+
+    def test_view_error_is_item_error(self):
+        # Иначе тестовый клиент перевыбросит исключение подзапроса
+        client = APIClient(raise_request_exception=False)
+        with mock.patch.object(
+            TagViewSet, 'list', side_effect=RuntimeError('boom')
+        ), self.assertLogs('django.request', 'ERROR'):
+            response = self.batch(
+                ['/api/tags/', '/api/ingredients/'], client
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in response.json()['responses']],
+            [500, 200]
+        )
+
+
+class ParallelBatchTests(TransactionTestCase):
+    """Подзапросы в потоках пула видят зафиксированные данные."""
+
+    def test_parallel_matches_sequential(self):
+        user = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        Tag.objects.create(name='Обед', slug='lunch')
+        client = APIClient()
+        client.force_authenticate(user)
+        body = {'requests': [
+            {'path': '/api/tags/'}, {'path': '/api/users/me/'},
+            {'path': '/api/recipes/'},
+        ]}
+        sequential = client.post('/api/batch/', body, format='json').json()
+        parallel = client.post(
+            '/api/batch/', {**body, 'parallel': True}, format='json'
+        ).json()
+        self.assertEqual(parallel, sequential)
+        self.assertEqual(
+            [item['status'] for item in parallel['responses']],
+            [200, 200, 200]
+        )
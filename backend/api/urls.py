@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from core.cache import is_shared
+
 from .views import (
-    IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+    BatchView, IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet,
+    ingredient_list, tag_list
 )
 
 router = DefaultRouter()
@@ -13,6 +17,15 @@ router.register(r'users', UserViewSet, basename='users')
 
 
 urlpatterns = [
+    # Асинхронные списки раньше маршрутов роутера с теми же путями;
+    # под WSGI они выполнялись бы через async_to_sync, а без общего
+    # кеша снимки не узнали бы об изменениях в других воркерах,
+    # поэтому там списки отдают ViewSet'ы
+    *((
+        path('tags/', tag_list),
+        path('ingredients/', ingredient_list),
+    ) if settings.SERVER_MODE == 'asgi' and is_shared() else ()),
+    path('batch/', BatchView.as_view()),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,38 +1,65 @@
+from functools import wraps
 from io import BytesIO
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db.models import (
-    BooleanField, Count, Exists, F, OuterRef, Sum, Value
+    BooleanField, Count, F, Prefetch, Sum, Value
 )
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse
+from django.http import FileResponse, JsonResponse
 from django.urls import reverse
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from core import catalog
+from core.batch import Batch
+from core.fieldsets import SparseFieldsViewMixin
+from core.ingredient_index import ingredient_index
+from core.pagination import KeysetPagination
 from core.permissions import IsOwnerOrReadOnly
 from core.services import generate_unique_short_code
+from core.sharding import user_relation_exists, user_relation_ids
+from core.timing import TimedSerializerViewMixin, timed_serializer
+from core.utils import SAFE_VIEW_METHODS, run_in_thread
 from recipes.models import (
     Favorite, Ingredient, IngredientInRecipe, Recipe, Tag, ShoppingCart
 )
 from users.models import Subscription
 from .filters import IngredientSearchFilter, RecipeFilter
 from .serializers import (
-    AvatarSerializer, FavoriteWriteSerializer, RecipeReadSerializer,
+    AvatarSerializer, BatchSerializer, FavoriteWriteSerializer,
+    PantryQuerySerializer, PantryRecipeSerializer, RecipeReadSerializer,
     RecipeWriteSerializer, ShoppingCartWriteSerializer,
+    SimilarRecipeSerializer,
     SubscriptionReadSerializer, SubscriptionCreateSerializer, TagSerializer,
     IngredientSerializer, UserSerializer
 )
 
+# Формат JSON как у JSONRenderer DRF
+JSON_DUMPS_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
 
-class UserViewSet(DjoserUserViewSet):
+
+class UserViewSet(
+    TimedSerializerViewMixin, SparseFieldsViewMixin, DjoserUserViewSet
+):
     """Расширенный ViewSet для работы с пользователями."""
 
     serializer_class = UserSerializer
 
+    def get_queryset(self):
+        return self.only_requested(super().get_queryset(), {
+            name: (name,) for name in (
+                'email', 'username', 'first_name', 'last_name', 'avatar'
+            )
+        })
+
     # Без этого 401 на /api/users/me/  :/
     @action(
         detail=False,
@@ -72,25 +99,33 @@ class UserViewSet(DjoserUserViewSet):
             permission_classes=(IsAuthenticated,),
             serializer_class=SubscriptionReadSerializer)
     def subscriptions(self, request):
+        page = self.paginate_queryset(self.get_subscriptions_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_subscriptions_queryset(self):
+        """Авторы, на которых подписан текущий пользователь."""
         queryset = (
             self.get_queryset()
-            .filter(subscriptions_to_author__user=request.user)
-            .annotate(recipes_count=Count('recipes'))
-            .prefetch_related('recipes')
+            .filter(pk__in=user_relation_ids(
+                Subscription, self.request.user, 'author'
+            ))
             .order_by('username',)
         )
-        page = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(page, many=True)
-        return self.get_paginated_response(serializer.data)
+        if self.wants('recipes_count'):
+            queryset = queryset.annotate(recipes_count=Count('recipes'))
+        if self.wants('recipes'):
+            queryset = queryset.prefetch_related('recipes')
+        return queryset
 
     @action(detail=True, methods=('post',),
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id=None):
         """Управление подпиской."""
-        serializer = SubscriptionCreateSerializer(
+        serializer = timed_serializer(SubscriptionCreateSerializer(
             data={'author': self.get_object().id},
             context={'request': request}
-        )
+        ))
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -110,11 +145,40 @@ class UserViewSet(DjoserUserViewSet):
         )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    TimedSerializerViewMixin, SparseFieldsViewMixin, viewsets.ModelViewSet
+):
 
     permission_classes = (IsOwnerOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    lookup_value_regex = r'\d+'
+    # ?ordering= для списка: поле RecipeRanking, страницы по курсору
+    ranking_orderings = {
+        'popular': 'ranking__popular',
+        'trending': 'ranking__trending',
+    }
+
+    def get_ranking_field(self):
+        if self.action != 'list':
+            return None
+        ordering = self.request.query_params.get('ordering')
+        if not ordering:
+            return None
+        if ordering not in self.ranking_orderings:
+            raise ValidationError({'ordering': (
+                f'Допустимые значения: {", ".join(self.ranking_orderings)}.'
+            )})
+        return self.ranking_orderings[ordering]
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            field = self.get_ranking_field()
+            self._paginator = (
+                KeysetPagination(field) if field else super().paginator
+            )
+        return self._paginator
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -122,32 +186,49 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeWriteSerializer
+        if self.action == 'by_ingredients':
+            return PantryRecipeSerializer
         return RecipeReadSerializer
 
     def get_queryset(self):
-        queryset = (
-            Recipe.objects
-            .select_related('author')
-            .prefetch_related('tags', 'ingredients')
-        )
-        user = self.request.user
-
-        if user.is_authenticated:
-            return queryset.annotate(
-                is_favorited=Exists(
-                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
-                ),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        user=user, recipe=OuterRef('pk')
-                    )
+        queryset = self.only_requested(Recipe.objects.all(), {
+            'author': ('author',),
+            'name': ('name',),
+            'image': ('image',),
+            'text': ('text',),
+            'cooking_time': ('cooking_time',),
+        })
+        # Связи читаются, только если попадут в ответ
+        if self.expands('author'):
+            queryset = queryset.select_related('author')
+        if self.wants('tags'):
+            queryset = queryset.prefetch_related(
+                'tags' if self.expands('tags') else Prefetch(
+                    'tags', queryset=Tag.objects.only('id')
                 )
             )
-        # Анонимы: оба поля False
-        return queryset.annotate(
-            is_favorited=Value(False, output_field=BooleanField()),
-            is_in_shopping_cart=Value(False, output_field=BooleanField())
-        )
+        if self.wants('ingredients'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ))
+        user = self.request.user
+        annotations = {}
+        for name, model in (
+            ('is_favorited', Favorite),
+            ('is_in_shopping_cart', ShoppingCart),
+        ):
+            # Аннотации нужны и фильтрам RecipeFilter
+            if not (self.wants(name) or name in self.request.query_params):
+                continue
+            # Анонимы: оба поля False
+            annotations[name] = (
+                user_relation_exists(model, user) if user.is_authenticated
+                else Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(**annotations)
 
     def _add_item(self, serializer_class, pk):
         """Метод добавления рецепта в избранное или корзину."""
@@ -155,9 +236,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = self.request.user
 
         data = {'user': user.id, 'recipe': recipe.id}
-        serializer = serializer_class(
+        serializer = timed_serializer(serializer_class(
             data=data, context={'request': self.request}
-        )
+        ))
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
@@ -200,15 +281,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return text_content
 
-    @action(detail=False, methods=('get',))
-    def download_shopping_cart(self, request):
-        """Скачать список покупок в виде текстового файла."""
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_carts__user=request.user
+    @staticmethod
+    def get_shopping_cart_ingredients(user):
+        """Суммарное количество ингредиентов из корзины пользователя."""
+        return IngredientInRecipe.objects.filter(
+            recipe__in=user_relation_ids(ShoppingCart, user, 'recipe')
         ).values(
             name=F('ingredient__name'),
             measurement_unit=F('ingredient__measurement_unit')
         ).annotate(total_amount=Sum('amount')).order_by('name')
+
+    @action(detail=False, methods=('get',))
+    def download_shopping_cart(self, request):
+        """Скачать список покупок в виде текстового файла."""
+        ingredients = self.get_shopping_cart_ingredients(request.user)
         if not ingredients:
             return Response(
                 {'error': 'Корзина пуста'},
@@ -222,6 +308,55 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return response
 
+    @action(detail=False, url_path='by-ingredients', methods=('get',))
+    def by_ingredients(self, request):
+        """
+        Рецепты, которые можно приготовить из имеющихся ингредиентов:
+        сначала те, где их доля в рецепте больше.
+        """
+        query = PantryQuerySerializer.from_query_params(request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        page = self.paginate_queryset(ingredient_index.search(
+            params['ingredients'], params.get('tags'),
+            params.get('max_cooking_time')
+        ))
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        results = []
+        for recipe_id, matched, total in page:
+            # Рецепт могли удалить после синхронизации индекса
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched_ingredients = matched
+                recipe.total_ingredients = total
+                results.append(recipe)
+        serializer = self.get_serializer(results, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=('get',))
+    def similar(self, request, pk=None):
+        """
+        Рецепты с похожими ингредиентами и тегами: список заранее
+        посчитан update_similar_recipes и читается одним запросом.
+        """
+        recipes = (
+            Recipe.objects
+            .filter(similar_to__recipe_id=pk)
+            .only('id', 'name', 'image', 'cooking_time')
+            .annotate(score=F('similar_to__score'))
+            .order_by('similar_to__position')
+        )
+        serializer = timed_serializer(SimilarRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        ))
+        data = serializer.data
+        if not data:
+            # Пустой список бывает и у рецепта без соседей
+            get_object_or_404(Recipe, pk=pk)
+        return Response(data)
+
     @action(detail=True, url_path='get-link', methods=('get',))
     def get_link(self, request, pk=None):
         recipe = self.get_object()
@@ -232,17 +367,101 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response({'short-link': short_url})
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(TimedSerializerViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    TimedSerializerViewMixin, viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
     filter_backends = (IngredientSearchFilter,)
     search_fields = ('name',)
+
+
+class BatchView(APIView):
+    """
+    Несколько GET-запросов к API за один: подзапросы выполняются в
+    процессе через обычные маршруты с пользователем пакета, ответы
+    возвращаются в порядке запроса со своими статусами.
+    """
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        batch = Batch([item['path'] for item in params['requests']])
+        if batch.cost > settings.BATCH_MAX_COST:
+            raise ValidationError({'requests': [
+                f'Стоимость пакета {batch.cost} больше допустимой '
+                f'{settings.BATCH_MAX_COST}: список стоит '
+                f'{settings.BATCH_LIST_COST}, остальные запросы — 1.'
+            ]})
+        return Response({
+            'responses': batch.run(request, params['parallel'])
+        })
+
+
+def async_list(viewset, basename):
+    """
+    Асинхронный список из снимка в памяти для GET и HEAD с JSON.
+
+    Остальное — OPTIONS, запись (405), browsable API и ?format= —
+    обрабатывает список ViewSet'а, как без этого представления.
+    """
+    fallback = sync_to_async(viewset.as_view(
+        {'get': 'list'}, basename=basename, detail=False, suffix='List'
+    ))
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request):
+            if (
+                request.method in SAFE_VIEW_METHODS
+                and 'format' not in request.GET
+                and 'text/html' not in request.META.get('HTTP_ACCEPT', '')
+            ):
+                return await view(request)
+            return await fallback(request)
+
+        # CSRF проверяет DRF, а csrf_exempt сделал бы обёртку синхронной
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+# Списки тегов и ингредиентов отдаются асинхронными представлениями
+# из снимков в памяти: в ASGI-режиме они не занимают потоки
+# пула, а детальные маршруты остаются за ViewSet'ами выше.
+@async_list(TagViewSet, 'tags')
+async def tag_list(request):
+    return JsonResponse(
+        await catalog.tags.aget(), safe=False,
+        json_dumps_params=JSON_DUMPS_PARAMS
+    )
+
+
+@async_list(IngredientViewSet, 'ingredients')
+async def ingredient_list(request):
+    # Сначала совпадения с начала названия, затем в произвольном месте;
+    # не больше INGREDIENT_SEARCH_LIMIT
+    limit = settings.INGREDIENT_SEARCH_LIMIT
+    names = await catalog.ingredients.aget()
+    terms = catalog.search_terms(
+        request.GET.get(IngredientSearchFilter.search_param, '')
+    )
+    found = catalog.search_by_prefix(names, terms, limit)
+    if terms and len(found) < limit:
+        found += await run_in_thread(
+            catalog.search_anywhere, names, terms, limit - len(found)
+        )
+    return JsonResponse(
+        found, safe=False, json_dumps_params=JSON_DUMPS_PARAMS
+    )
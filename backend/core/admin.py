@@ -0,0 +1,241 @@
+import os
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html_join
+
+from core import sharding
+from core.constants import ESTIMATED_COUNT_THRESHOLD
+from core.models import RequestProfile
+
+
+class SubqueryCount(Subquery):
+    """
+    Количество связанных записей коррелированным подзапросом.
+
+    В отличие от Count с GROUP BY считается только для строк текущей
+    страницы changelist и не размножает строки при нескольких счётчиках.
+    """
+
+    output_field = IntegerField()
+
+    def __init__(self, model, field_name):
+        queryset = (
+            model.objects.filter(**{field_name: OuterRef('pk')})
+            .order_by().values(field_name)
+            .annotate(count=Count('pk')).values('count')
+        )
+        super().__init__(queryset)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return f'COALESCE({sql}, 0)', params
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, берущий число строк без фильтров из статистики PostgreSQL
+    вместо полного COUNT(*) по большой таблице.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE relname = %s',
+                    (queryset.model._meta.db_table,)
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    Фильтр по внешнему ключу с поиском через admin autocomplete
+    вместо списка всех связанных объектов.
+    """
+
+    template = 'admin/autocomplete_filter.html'
+
+    def field_choices(self, field, request, model_admin):
+        # Перечисляем только выбранный объект, остальные ищутся по вводу
+        if not self.lookup_val:
+            return []
+        return [
+            (obj.pk, str(obj)) for obj in
+            field.remote_field.model.objects.filter(pk=self.lookup_val)
+        ]
+
+    def has_output(self):
+        return True
+
+    @property
+    def autocomplete_attrs(self):
+        return {
+            'app_label': self.field.model._meta.app_label,
+            'model_name': self.field.model._meta.model_name,
+            'field_name': self.field.name,
+        }
+
+
+class ScalableAdminMixin:
+    """Настройки changelist для больших таблиц."""
+
+    paginator = EstimatedCountPaginator
+    # Без второго COUNT(*) по всей таблице при активном фильтре
+    show_full_result_count = False
+
+    class Media:
+        css = {
+            'screen': (
+                'admin/css/vendor/select2/select2.min.css',
+                'admin/css/autocomplete.css',
+            ),
+        }
+        js = (
+            'admin/js/vendor/jquery/jquery.min.js',
+            'admin/js/vendor/select2/select2.full.min.js',
+            'admin/js/jquery.init.js',
+            'admin/js/autocomplete.js',
+            'core/autocomplete_filter.js',
+        )
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """Выбор шарда: changelist показывает записи одного шарда."""
+
+    title = 'шард'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in settings.RELATION_SHARDS]
+
+    def value(self):
+        value = super().value()
+        if value not in settings.RELATION_SHARDS:
+            return settings.RELATION_SHARDS[0]
+        return value
+
+    def choices(self, changelist):
+        # Варианта «Все» нет: выборка не объединяет несколько БД
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: lookup}
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        return queryset.using(self.value())
+
+
+class ShardedAdminMixin:
+    """
+    Админка связей пользователя, разложенных по шардам.
+
+    В шарде нет таблиц пользователей и рецептов, поэтому без JOIN:
+    ни select_related, ни поиска и фильтров по связанным полям,
+    только просмотр списка выбранного шарда.
+    """
+
+    def get_list_filter(self, request):
+        if sharding.is_enabled():
+            return (ShardListFilter,)
+        return super().get_list_filter(request)
+
+    def get_list_select_related(self, request):
+        if sharding.is_enabled():
+            # False означал бы автоматический select_related
+            return ()
+        return super().get_list_select_related(request)
+
+    def get_search_fields(self, request):
+        if sharding.is_enabled():
+            return ()
+        return super().get_search_fields(request)
+
+    def get_ordering(self, request):
+        if sharding.is_enabled():
+            return ('-pk',)
+        return super().get_ordering(request)
+
+    def get_list_display_links(self, request, list_display):
+        # Страница объекта ищет его в default, а не в шарде
+        if sharding.is_enabled():
+            return None
+        return super().get_list_display_links(request, list_display)
+
+    def has_add_permission(self, request):
+        if sharding.is_enabled():
+            return False
+        return super().has_add_permission(request)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Профили запросов: файлы для speedscope или flamegraph.pl."""
+
+    list_display = (
+        'created', 'method', 'path', 'status', 'duration', 'samples',
+        'user', 'downloads',
+    )
+    list_filter = ('method', 'engine')
+    list_select_related = ('user',)
+    search_fields = ('path',)
+    readonly_fields = [
+        field.name for field in RequestProfile._meta.fields
+    ] + ['downloads']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/<str:kind>/',
+                self.admin_site.admin_view(self.download),
+                name='core_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download(self, request, pk, kind):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        filename = get_object_or_404(RequestProfile, pk=pk).file_path(kind)
+        if filename is None or not os.path.exists(filename):
+            raise Http404
+        return FileResponse(
+            open(filename, 'rb'), as_attachment=True,
+            filename=os.path.basename(filename)
+        )
+
+    @admin.display(description='Файлы')
+    def downloads(self, obj):
+        kinds = ['cpu'] + (['memory'] if obj.memory_file else [])
+        return format_html_join(
+            ' ', '<a href="{}">{}</a>',
+            (
+                (reverse('admin:core_requestprofile_download',
+                         args=(obj.pk, kind)), kind)
+                for kind in kinds
+            )
+        )
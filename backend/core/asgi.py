@@ -0,0 +1,158 @@
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.wsgi import get_wsgi_application
+from django.urls import Resolver404, get_resolver
+
+
+def get_path_info(scope):
+    path = scope['path']
+    script_name = scope.get('root_path', '')
+    if script_name and path.startswith(script_name):
+        return path[len(script_name):]
+    return path
+
+
+def build_environ(scope, body):
+    """WSGI-окружение для HTTP-запроса ASGI с уже прочитанным телом."""
+    script_name = scope.get('root_path', '')
+    path = get_path_info(scope)
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # PEP 3333: пути в WSGI — байты UTF-8, прочитанные как latin-1
+        'SCRIPT_NAME': script_name.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = raw_value.decode('latin-1')
+        if name in environ:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = f'{environ[name]}{separator}{value}'
+        environ[name] = value
+    return environ
+
+
+class AsyncViewHandler(ASGIHandler):
+    """ASGI-обработчик асинхронных представлений с ASYNC_MIDDLEWARE."""
+
+    def load_middleware(self, is_async=False):
+        # BaseHandler читает цепочку из settings.MIDDLEWARE; обработчик
+        # создаётся при запуске, до обработки запросов
+        middleware = settings.MIDDLEWARE
+        settings.MIDDLEWARE = settings.ASYNC_MIDDLEWARE
+        try:
+            super().load_middleware(is_async)
+        finally:
+            settings.MIDDLEWARE = middleware
+
+
+class HybridApplication:
+    """
+    ASGI-приложение: асинхронные представления выполняются в цикле
+    событий, остальные — в ограниченном пуле потоков через WSGI.
+
+    Тело запроса читается, а ответ отправляется в цикле событий,
+    поэтому медленный клиент или загрузка изображения не занимают
+    поток. Потоки пула долгоживущие, как у gthread-воркера gunicorn,
+    и соединения с БД в них переиспользуются.
+    """
+
+    def __init__(self, threads):
+        # get_wsgi_application уже выполнил django.setup()
+        self.sync_app = get_wsgi_application()
+        self.async_app = AsyncViewHandler()
+        self.executor = ThreadPoolExecutor(
+            threads, thread_name_prefix='django-sync'
+        )
+
+    @staticmethod
+    def is_async_view(path):
+        try:
+            match = get_resolver().resolve(path)
+        except Resolver404:
+            return False
+        return asyncio.iscoroutinefunction(match.func)
+
+    @staticmethod
+    async def read_body(receive):
+        """Тело запроса или None, если клиент отключился."""
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, mode='w+b'
+        )
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def call_wsgi(self, environ):
+        """Выполняется в потоке пула: ответ целиком, как у буфера nginx."""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        result = self.sync_app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response['status'], response['headers'], content
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope['type'] != 'http'
+            or self.is_async_view(get_path_info(scope))
+        ):
+            return await self.async_app(scope, receive, send)
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        try:
+            status, headers, content = (
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self.call_wsgi, build_environ(scope, body)
+                )
+            )
+        finally:
+            body.close()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+
+def get_application():
+    return HybridApplication(settings.ASGI_SYNC_THREADS)
@@ -0,0 +1,68 @@
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL с пулом соединений процесса и проверкой их живости.
+
+    Настройки БД:
+    POOL — словарь MAX_SIZE, TIMEOUT, MAX_LIFETIME, CHECK_INTERVAL
+    или None, чтобы открывать соединения напрямую;
+    CONN_HEALTH_CHECKS — проверять переиспользуемое соединение
+    перед первым запросом каждого HTTP-запроса.
+    """
+
+    health_check_done = False
+
+    @property
+    def pool(self):
+        if not self.settings_dict.get('POOL'):
+            return None
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.getconn(
+            partial(super().get_new_connection, conn_params)
+        )
+        # Для соединения из пула уровень изоляции не определён базовым
+        # get_new_connection, а он нужен для _set_autocommit
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def _close(self):
+        pool = self.pool
+        if self.connection is None or pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            return pool.putconn(self.connection)
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # Вызывается на границах HTTP-запроса: новое соединение
+        # проверять не нужно, а переиспользуемое — один раз
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
@@ -0,0 +1,159 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Все соединения пула заняты дольше допустимого."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений одного процесса, общий для всех его потоков.
+
+    Соединение возвращается в пул вне транзакции; перед выдачей
+    давно простаивавшее соединение проверяется запросом SELECT 1.
+    """
+
+    def __init__(self, max_size, timeout, max_lifetime, check_interval):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self._idle = deque()
+        self._created = {}
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def _reserve(self):
+        """Свободное соединение из пула или None, если нужно открыть новое."""
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                if self._idle:
+                    # LIFO: недавно возвращённое соединение не нужно проверять
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f'Нет свободных соединений за {self.timeout} с '
+                        f'(размер пула {self.max_size})'
+                    )
+                self._condition.wait(remaining)
+
+    def _is_healthy(self, connection, returned_at):
+        now = time.monotonic()
+        if connection.closed:
+            return False
+        if now - self._created[connection] >= self.max_lifetime:
+            return False
+        if now - returned_at < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def getconn(self, connect):
+        """Выдаёт соединение; connect() открывает новое при необходимости."""
+        while True:
+            reserved = self._reserve()
+            if reserved is None:
+                break
+            connection, returned_at = reserved
+            if self._is_healthy(connection, returned_at):
+                return connection
+            self._discard(connection)
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._created[connection] = time.monotonic()
+        return connection
+
+    def putconn(self, connection):
+        """Возвращает соединение; сломанное или устаревшее закрывается."""
+        if connection not in self._created:
+            connection.close()
+            return
+        if not connection.closed:
+            try:
+                if (
+                    connection.get_transaction_status()
+                    != TRANSACTION_STATUS_IDLE
+                ):
+                    connection.rollback()
+            except psycopg2.Error:
+                pass
+        if (
+            connection.closed
+            or connection.get_transaction_status() != TRANSACTION_STATUS_IDLE
+            or time.monotonic() - self._created[connection]
+            >= self.max_lifetime
+        ):
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """Закрывает свободные соединения, например перед fork."""
+        with self._condition:
+            idle, self._idle = self._idle, deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        self._created.pop(connection, None)
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+
+def get_pool(alias, settings_dict):
+    """
+    Пул для базы данных в текущем процессе.
+
+    Ключ включает имя БД (служебные подключения к postgres и тестовая
+    база не смешиваются с основной) и pid: после fork дочерний процесс
+    не трогает унаследованные сокеты родителя.
+    """
+    key = (
+        alias, settings_dict['NAME'], settings_dict['USER'],
+        settings_dict['HOST'], settings_dict['PORT'], os.getpid()
+    )
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = settings_dict['POOL']
+                pool = _pools[key] = ConnectionPool(
+                    max_size=options['MAX_SIZE'],
+                    timeout=options['TIMEOUT'],
+                    max_lifetime=options['MAX_LIFETIME'],
+                    check_interval=options['CHECK_INTERVAL'],
+                )
+    return pool
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from io import BytesIO
+from urllib.parse import unquote, urlsplit
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.handlers.exception import response_for_exception
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+from django.utils.encoding import iri_to_uri
+
+from core.nplusone import detect_n_plus_one
+
+current_cache = ContextVar('batch_cache', default=None)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_batch_cache():
+    """
+    Словарь, общий для подзапросов одного пакета, или None вне пакета.
+
+    Сюда кладут то, что подзапросы иначе прочитали бы каждый
+    по отдельности, например подписки пользователя.
+    """
+    return current_cache.get()
+
+
+@contextmanager
+def batch_cache():
+    token = current_cache.set({})
+    try:
+        yield
+    finally:
+        current_cache.reset(token)
+
+
+def get_executor():
+    """
+    Общий пул процесса: потоки долгоживущие, как в core.asgi, и их
+    соединения с БД переиспользуются между пакетами.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.BATCH_THREADS, thread_name_prefix='batch'
+            )
+    return _executor
+
+
+def run_in_pool(func, *args):
+    context = copy_context()
+
+    def task():
+        # Границы подзапроса для соединений — как у HTTP-запроса
+        close_old_connections()
+        try:
+            return context.run(func, *args)
+        finally:
+            close_old_connections()
+
+    return get_executor().submit(task)
+
+
+class SubRequest:
+    """GET-подзапрос пакета: путь, маршрут и стоимость."""
+
+    def __init__(self, path):
+        self.path = path
+        # Путь из JSON может быть не закодирован, как в адресной строке
+        parts = urlsplit(iri_to_uri(path))
+        self.path_info = unquote(parts.path)
+        self.query_string = parts.query
+        try:
+            self.match = resolve(self.path_info)
+        except Resolver404:
+            self.match = None
+
+    @property
+    def cost(self):
+        if self.match is None:
+            return 0
+        # Страница списка дороже: объекты, связи и подсчёт
+        initkwargs = getattr(self.match.func, 'initkwargs', {})
+        if initkwargs.get('suffix') == 'List':
+            return settings.BATCH_LIST_COST
+        return 1
+
+    def build(self, request):
+        """HTTP-запрос с заголовками и пользователем пакетного запроса."""
+        environ = {
+            **request.META,
+            'REQUEST_METHOD': 'GET',
+            # Строки окружения WSGI — байты в latin-1 (PEP 3333)
+            'PATH_INFO': self.path_info.encode().decode('iso-8859-1'),
+            'QUERY_STRING': self.query_string,
+            'CONTENT_LENGTH': '0',
+            'wsgi.input': BytesIO(),
+        }
+        environ.pop('CONTENT_TYPE', None)
+        sub_request = WSGIRequest(environ)
+        sub_request.user = request.user
+        if request.user.is_authenticated:
+            # DRF не аутентифицирует подзапрос заново: пользователь
+            # и токен уже проверены для всего пакета
+            sub_request._force_auth_user = request.user
+            sub_request._force_auth_token = request.auth
+        sub_request.resolver_match = self.match
+        return sub_request
+
+    def call_view(self, sub_request):
+        view, args, kwargs = self.match
+        if asyncio.iscoroutinefunction(view):
+            return async_to_sync(view)(sub_request, *args, **kwargs)
+        return view(sub_request, *args, **kwargs)
+
+    @staticmethod
+    def body(response):
+        if hasattr(response, 'data'):
+            # Ответ DRF: данные войдут в ответ пакета без повторного
+            # рендеринга и разбора JSON
+            return response.data
+        content = (
+            b''.join(response.streaming_content) if response.streaming
+            else response.content
+        )
+        if not content:
+            return None
+        if 'json' in response.get('Content-Type', ''):
+            return json.loads(content)
+        return content.decode(response.charset, errors='replace')
+
+    def execute(self, request):
+        if self.match is None:
+            return {
+                'status': 404, 'body': {'detail': 'Страница не найдена.'}
+            }
+        sub_request = self.build(request)
+        with detect_n_plus_one(f'batch {self.path}'):
+            try:
+                response = self.call_view(sub_request)
+            except Exception as exc:
+                # Как обработчик Django: статус и запись в django.request
+                response = response_for_exception(sub_request, exc)
+                return {
+                    'status': response.status_code,
+                    'body': {'detail': response.reason_phrase},
+                }
+            return {
+                'status': response.status_code, 'body': self.body(response)
+            }
+
+
+class Batch:
+    """
+    GET-подзапросы, выполняемые в процессе через обычные маршруты.
+
+    Одинаковые пути выполняются один раз. Подзапросы делят
+    пользователя пакета и кеш get_batch_cache().
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.requests = {path: SubRequest(path) for path in paths}
+
+    @property
+    def cost(self):
+        return sum(sub_request.cost for sub_request in self.requests.values())
+
+    def run(self, request, parallel=False):
+        with batch_cache():
+            if parallel and len(self.requests) > 1:
+                futures = {
+                    path: run_in_pool(sub_request.execute, request)
+                    for path, sub_request in self.requests.items()
+                }
+                results = {
+                    path: future.result() for path, future in futures.items()
+                }
+            else:
+                results = {
+                    path: sub_request.execute(request)
+                    for path, sub_request in self.requests.items()
+                }
+        return [{'path': path, **results[path]} for path in self.paths]
@@ -0,0 +1,95 @@
+import hashlib
+import re
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+RESPONSE_KEY_PREFIX = 'anon_response'
+VERSION_KEY_PREFIX = 'anon_version'
+
+# Кешируемые пути и группы, от версий которых зависит ответ.
+# Изменение модели меняет версию группы, и старые ответы
+# перестают находиться по ключу.
+CACHED_PATHS = (
+    (re.compile(r'^/api/recipes/$'), ('recipe_list',)),
+    (
+        re.compile(r'^/api/recipes/(?P<pk>\d+)/$'),
+        ('recipe_detail', 'recipe:{pk}'),
+    ),
+    (
+        re.compile(r'^/api/recipes/\d+/similar/$'),
+        ('recipe_list', 'similar_recipes'),
+    ),
+    (re.compile(r'^/api/tags/(?:\d+/)?$'), ('tags',)),
+    (re.compile(r'^/api/users/(?P<pk>\d+)/$'), ('user:{pk}',)),
+)
+
+
+def is_shared():
+    """
+    Общий ли кеш для всех воркеров. LocMemCache живёт в памяти
+    процесса: при нескольких воркерах gunicorn он у каждого свой.
+    """
+    return (
+        settings.GUNICORN_WORKERS <= 1
+        or not isinstance(caches['default'], LocMemCache)
+    )
+
+
+def get_dependencies(path):
+    """Группы инвалидации для пути или None, если путь не кешируется."""
+    for pattern, groups in CACHED_PATHS:
+        match = pattern.match(path)
+        if match:
+            return tuple(
+                group.format(**match.groupdict()) for group in groups
+            )
+    return None
+
+
+def get_versions(groups):
+    keys = [f'{VERSION_KEY_PREFIX}:{group}' for group in groups]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Новая (или вытесненная) версия не должна совпасть
+            # ни с одной из тех, под которыми уже лежат ответы
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*groups):
+    """
+    Делает устаревшими все закешированные ответы указанных групп.
+
+    Вызывается после фиксации изменений (transaction.on_commit),
+    иначе запрос между сбросом и фиксацией закеширует старые данные.
+    """
+    cache.set_many(
+        {
+            f'{VERSION_KEY_PREFIX}:{group}': uuid.uuid4().hex
+            for group in groups
+        },
+        timeout=None
+    )
+
+
+def build_key(request, groups):
+    """Ключ ответа: путь, нормализованные параметры и версии групп."""
+    query = '&'.join(
+        f'{name}={value}'
+        for name, values in sorted(request.GET.lists())
+        for value in sorted(values)
+    )
+    raw_key = '|'.join((
+        request.get_host(),
+        request.path,
+        query,
+        request.META.get('HTTP_ACCEPT', ''),
+        *get_versions(groups),
+    ))
+    digest = hashlib.md5(raw_key.encode()).hexdigest()
+    return f'{RESPONSE_KEY_PREFIX}:{digest}'
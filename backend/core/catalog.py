@@ -0,0 +1,135 @@
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core.cache import get_versions, is_shared
+from recipes.models import Ingredient, Tag
+
+
+class Catalog:
+    """
+    Снимок небольшого справочника в памяти процесса.
+
+    Асинхронные представления читают его без обращения к БД. Раз в
+    CATALOG_CHECK_INTERVAL секунд снимок сверяется с версией группы
+    в общем кеше (core.cache): изменение справочника в любом процессе
+    меняет версию, и снимок перечитывается. Если кеш не общий для
+    воркеров (core.checks), снимок не держится и читается из БД.
+    """
+
+    def __init__(self, group, load):
+        self.group = group
+        self._load = load
+        self._items = None
+        self._version = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self):
+        return (
+            self._items is not None
+            and time.monotonic() - self._checked_at
+            < settings.CATALOG_CHECK_INTERVAL
+        )
+
+    def get(self):
+        if not is_shared():
+            return self._load()
+        if not self._is_fresh():
+            with self._lock:
+                if not self._is_fresh():
+                    version = get_versions((self.group,))[0]
+                    if self._items is None or version != self._version:
+                        self._items = self._load()
+                        self._version = version
+                    self._checked_at = time.monotonic()
+        return self._items
+
+    async def aget(self):
+        if self._is_fresh() and is_shared():
+            return self._items
+        return await sync_to_async(self.get)()
+
+
+def load_tags():
+    return list(Tag.objects.order_by('id').values('id', 'name', 'slug'))
+
+
+class IngredientNames:
+    """
+    Ингредиенты, отсортированные по названию без учёта регистра.
+
+    Строки хранятся кортежами (id, название, единица), а не словарями:
+    снимок справочника на миллионы строк есть в каждом процессе.
+    """
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1].casefold(), row[0]))
+        self.keys = [name.casefold() for _, name, _ in rows]
+        self.rows = rows
+
+    def prefix_range(self, prefix):
+        """Границы строк, чьё название начинается с prefix."""
+        start = bisect_left(self.keys, prefix)
+        return start, bisect_left(self.keys, prefix + '\U0010ffff', start)
+
+
+def load_ingredients():
+    return IngredientNames(
+        Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+    )
+
+
+def search_terms(query):
+    """Слова запроса, как в IngredientSearchFilter: пробелы и запятые."""
+    return query.replace('\x00', '').replace(',', ' ').casefold().split()
+
+
+def as_dicts(rows):
+    return [
+        {'id': pk, 'name': name, 'measurement_unit': unit}
+        for pk, name, unit in rows
+    ]
+
+
+def search_by_prefix(names, terms, limit):
+    """
+    До limit ингредиентов, чьё название начинается с первого слова
+    и содержит остальные: двоичный поиск без просмотра справочника.
+    """
+    if not terms:
+        return as_dicts(names.rows[:limit])
+    start, stop = names.prefix_range(terms[0])
+    found = []
+    for index in range(start, stop):
+        if len(found) == limit:
+            break
+        if all(term in names.keys[index] for term in terms[1:]):
+            found.append(names.rows[index])
+    return as_dicts(found)
+
+
+def search_anywhere(names, terms, limit):
+    """
+    До limit ингредиентов, где первое слово встречается не в начале
+    названия. Просматривает весь справочник, поэтому из цикла событий
+    вызывается в потоке.
+    """
+    first = terms[0]
+    found = []
+    for key, row in zip(names.keys, names.rows):
+        if (
+            not key.startswith(first)
+            and all(term in key for term in terms)
+        ):
+            found.append(row)
+            if len(found) == limit:
+                break
+    return as_dicts(found)
+
+
+tags = Catalog('tags', load_tags)
+ingredients = Catalog('ingredients', load_ingredients)
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+from core.cache import is_shared
+
+
+@register()
+def check_replica_stickiness(app_configs, **kwargs):
+    """Закрепление за основной БД после записи видно всем воркерам."""
+    if not settings.DATABASE_REPLICAS or is_shared():
+        return []
+    return [Error(
+        'Реплики включены, а кеш (CACHE_BACKEND) локален для процесса '
+        'при нескольких воркерах.',
+        hint=(
+            'Клиент с токеном закрепляется за основной БД ключом в кеше; '
+            'попав на другой воркер, он прочитал бы с реплики устаревшие '
+            'данные. Задайте CACHE_BACKEND=memcached или file. До тех пор '
+            'ReplicaRoutingMiddleware отключена и все чтения идут '
+            'с основной БД.'
+        ),
+        id='core.E001',
+    )]
+
+
+@register()
+def check_cache_invalidation(app_configs, **kwargs):
+    """Сброс кеша ответов и снимков справочников доходит до всех воркеров."""
+    if is_shared():
+        return []
+    return [Warning(
+        'Кеш (CACHE_BACKEND) локален для процесса при нескольких воркерах.',
+        hint=(
+            'Сигналы сбрасывают версии групп только в воркере, '
+            'обработавшем запись. Поэтому кеш ответов для анонимов '
+            'отключён, а теги и ингредиенты читаются из БД без снимков. '
+            'Задайте CACHE_BACKEND=memcached или file.'
+        ),
+        id='core.W001',
+    )]
@@ -1,8 +1,12 @@
 MAX_CHAR_LENGTH = 256
+MAX_PATH_LENGTH = 2000
 MAX_SLUG_LENGTH = 32
 MAX_STR_LENGTH = 40
 MAX_SHORT_CODE_LENGTH = 10
+# Длина случайных коротких кодов старого формата
 LENGTH_SHORT_CODE = 3
+SHORT_CODE_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+SHORT_LINK_CACHE_SIZE = 10000
 MAX_NAME_LENGTH = 150
 MAX_EMAIL_LENGTH = 256
 MIN_INGREDIENT_AMOUNT = 1
@@ -10,3 +14,7 @@ MAX_INGREDIENT_LENGTH = 128
 MAX_UNIT_LENGTH = 64
 MAX_TAG_LENGTH = 32
 MIN_VALUE_LENGTH = 1
+HASH_DIR_PREFIX_LENGTH = 2
+ESTIMATED_COUNT_THRESHOLD = 10000
+# Сколько ингредиентов можно передать в поиск «из того, что есть»
+MAX_PANTRY_INGREDIENTS = 100
@@ -0,0 +1,143 @@
+import copy
+from itertools import chain
+
+from rest_framework.exceptions import ValidationError
+
+from core.utils import SAFE_VIEW_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def split_names(value):
+    return frozenset(filter(None, (name.strip() for name in value.split(','))))
+
+
+class Fieldsets:
+    """
+    Поля ответа из ?fields= и вложенные объекты из ?expand=.
+
+    fields равно None, если ограничены только вложенные объекты.
+    """
+
+    def __init__(self, fields, expand):
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_query_params(cls, query_params):
+        """None, если в запросе нет ни fields, ни expand."""
+        fields = query_params.get(FIELDS_PARAM)
+        expand = query_params.get(EXPAND_PARAM)
+        if fields is None and expand is None:
+            return None
+        return cls(
+            None if fields is None else split_names(fields),
+            split_names(expand or '')
+        )
+
+    def wants(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        return self.wants(name) and name in self.expand
+
+
+class SparseFieldsMixin:
+    """
+    Сериализатор с полями из Fieldsets.
+
+    Без fields и expand ответ прежний. Иначе остаются запрошенные поля,
+    а вложенные объекты из Meta.collapsed_fields, не указанные в expand,
+    заменяются на свои id.
+    """
+
+    def __init__(self, *args, fieldsets=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fieldsets = fieldsets
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.fieldsets is None:
+            return fields
+        collapsed = getattr(self.Meta, 'collapsed_fields', {})
+        errors = {}
+        if self.fieldsets.fields is not None:
+            unknown = self.fieldsets.fields - fields.keys()
+            if not self.fieldsets.fields:
+                # ?fields= без имён: ответ из одних пустых объектов
+                errors[FIELDS_PARAM] = 'Укажите хотя бы одно поле.'
+            elif unknown:
+                errors[FIELDS_PARAM] = (
+                    f'Неизвестные поля: {", ".join(sorted(unknown))}.'
+                )
+        unknown = self.fieldsets.expand - collapsed.keys()
+        if unknown:
+            errors[EXPAND_PARAM] = (
+                f'Нельзя раскрыть: {", ".join(sorted(unknown))}. '
+                f'Допустимые значения: {", ".join(collapsed)}.'
+            )
+        if errors:
+            raise ValidationError(errors)
+        return {
+            name: (
+                copy.deepcopy(collapsed[name])
+                if name in collapsed and not self.fieldsets.expands(name)
+                else field
+            )
+            for name, field in fields.items()
+            if self.fieldsets.wants(name)
+        }
+
+
+class SparseFieldsViewMixin:
+    """
+    ?fields= и ?expand= для GET-запросов.
+
+    get_queryset сужает SELECT через wants, expands и only_requested,
+    чтобы не читать столбцы и связи, которых нет в ответе.
+    """
+
+    def get_fieldsets(self):
+        if not hasattr(self, '_fieldsets'):
+            self._fieldsets = (
+                Fieldsets.from_query_params(self.request.query_params)
+                if self.request.method in SAFE_VIEW_METHODS else None
+            )
+            serializer_class = self.get_serializer_class()
+            if self._fieldsets is not None and issubclass(
+                serializer_class, SparseFieldsMixin
+            ):
+                # Ошибки в fields и expand — 400 до запросов к БД, в том
+                # числе когда страница пуста и сериализатор не вызовется
+                serializer_class(
+                    fieldsets=self._fieldsets,
+                    context=self.get_serializer_context()
+                ).fields
+        return self._fieldsets
+
+    def wants(self, name):
+        fieldsets = self.get_fieldsets()
+        return fieldsets is None or fieldsets.wants(name)
+
+    def expands(self, name):
+        fieldsets = self.get_fieldsets()
+        return fieldsets is None or fieldsets.expands(name)
+
+    def only_requested(self, queryset, columns):
+        """only() по столбцам запрошенных полей: поле -> столбцы модели."""
+        fieldsets = self.get_fieldsets()
+        if fieldsets is None or fieldsets.fields is None:
+            return queryset
+        return queryset.only('pk', *chain.from_iterable(
+            field_columns for name, field_columns in columns.items()
+            if name in fieldsets.fields
+        ))
+
+    def get_serializer(self, *args, **kwargs):
+        fieldsets = self.get_fieldsets()
+        if fieldsets is not None and issubclass(
+            self.get_serializer_class(), SparseFieldsMixin
+        ):
+            kwargs['fieldsets'] = fieldsets
+        return super().get_serializer(*args, **kwargs)
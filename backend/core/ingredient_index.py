@@ -0,0 +1,363 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict, namedtuple
+from operator import truediv
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Q
+
+from recipes.models import IngredientInRecipe, Recipe, RecipeChange
+
+# Больше изменений за раз дешевле применить полной перестройкой
+MAX_INCREMENTAL_CHANGES = 1000
+# Пропуски в номерах журнала: запись транзакции, которая взяла номер
+# раньше, а зафиксировалась позже. Её ждут столько секунд, пропуски
+# сверх лимита (откаты, кеш последовательности) не отслеживаются
+CHANGE_GAP_TIMEOUT = 60
+MAX_CHANGE_GAPS = 1000
+
+
+def load_recipes(recipe_ids=None):
+    """
+    Данные рецептов из БД, всех или перечисленных: id рецепта ->
+    (id ингредиентов по возрастанию, время приготовления, id тегов).
+    Списки id — массивы array: в памяти индекса их миллионы.
+    """
+    recipes = Recipe.objects.all()
+    ingredients = IngredientInRecipe.objects.all()
+    tags = Recipe.tags.through.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+        ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+        tags = tags.filter(recipe_id__in=recipe_ids)
+    recipe_ingredients = defaultdict(set)
+    for recipe_id, ingredient_id in ingredients.values_list(
+        'recipe_id', 'ingredient_id'
+    ):
+        recipe_ingredients[recipe_id].add(ingredient_id)
+    recipe_tags = defaultdict(set)
+    for recipe_id, tag_id in tags.values_list('recipe_id', 'tag_id'):
+        recipe_tags[recipe_id].add(tag_id)
+    return {
+        recipe_id: (
+            array('q', sorted(recipe_ingredients[recipe_id])), cooking_time,
+            array('q', sorted(recipe_tags[recipe_id]))
+        )
+        for recipe_id, cooking_time in recipes.values_list(
+            'id', 'cooking_time'
+        )
+    }
+
+
+def _contains(posting, recipe_id):
+    position = bisect_left(posting, recipe_id)
+    return position < len(posting) and posting[position] == recipe_id
+
+
+# Состояние индекса. Синхронизация не меняет его, а собирает новое,
+# поэтому поиск читает снимок без блокировки.
+# sizes: число ингредиентов рецепта по индексу id (0 — рецепта нет).
+# min_sizes: ингредиент -> нижняя граница числа ингредиентов в рецептах
+# с ним (после удалений может быть меньше точной — граница остаётся
+# верной)
+Snapshot = namedtuple(
+    'Snapshot', ('postings', 'recipes', 'sizes', 'min_sizes')
+)
+
+
+def _sized(sizes, recipe_id):
+    """sizes, дополненный нулями до recipe_id включительно."""
+    if recipe_id >= len(sizes):
+        sizes.frombytes(bytes(sizes.itemsize * (recipe_id + 1 - len(sizes))))
+    return sizes
+
+
+def build_snapshot(recipes):
+    """Снимок индекса по данным рецептов из load_recipes."""
+    postings = defaultdict(list)
+    sizes = _sized(array('H'), max(recipes, default=0))
+    min_sizes = {}
+    for recipe_id, (ingredient_ids, _, _) in recipes.items():
+        size = sizes[recipe_id] = len(ingredient_ids)
+        for ingredient_id in ingredient_ids:
+            postings[ingredient_id].append(recipe_id)
+            min_sizes[ingredient_id] = min(
+                min_sizes.get(ingredient_id, size), size
+            )
+    postings = {
+        ingredient_id: array('q', sorted(recipe_ids))
+        for ingredient_id, recipe_ids in postings.items()
+    }
+    return Snapshot(postings, recipes, sizes, min_sizes)
+
+
+class Ranking:
+    """
+    Рецепты по убыванию покрытия как последовательность для пагинатора.
+
+    Оценки считаются только для среза [a:b] — b лучших рецептов.
+    Списки рецептов обходятся от редких ингредиентов к частым; обход
+    останавливается, когда рецепт только из оставшихся ингредиентов
+    уже не обгонит b-й найденный; по оставшимся спискам досчитываются
+    совпадения только уже найденных рецептов.
+    """
+
+    def __init__(self, snapshot, ingredient_ids, tag_ids, max_cooking_time):
+        self._recipes = snapshot.recipes
+        self._sizes = snapshot.sizes
+        self._min_sizes = snapshot.min_sizes
+        ingredient_ids = [
+            ingredient_id for ingredient_id in set(ingredient_ids)
+            if snapshot.postings.get(ingredient_id)
+        ]
+        self._ingredient_ids = sorted(
+            ingredient_ids, key=lambda ingredient_id: (
+                len(snapshot.postings[ingredient_id])
+            )
+        )
+        self._postings = [
+            snapshot.postings[ingredient_id]
+            for ingredient_id in self._ingredient_ids
+        ]
+        self._tag_ids = frozenset(tag_ids or ())
+        self._max_cooking_time = max_cooking_time
+        self._count = None
+
+    def _matches(self, recipe_id):
+        _, cooking_time, recipe_tags = self._recipes[recipe_id]
+        if self._tag_ids and not any(
+            tag_id in self._tag_ids for tag_id in recipe_tags
+        ):
+            return False
+        return not (
+            self._max_cooking_time and cooking_time > self._max_cooking_time
+        )
+
+    def __len__(self):
+        if self._count is None:
+            candidates = set().union(*self._postings)
+            if self._tag_ids or self._max_cooking_time:
+                candidates = filter(self._matches, candidates)
+            self._count = sum(1 for _ in candidates)
+        return self._count
+
+    def _bound(self, position):
+        """Лучший ключ рецепта, которого нет в первых position списках."""
+        remaining = len(self._postings) - position
+        min_size = min(
+            self._min_sizes[ingredient_id]
+            for ingredient_id in self._ingredient_ids[position:]
+        )
+        return remaining / max(remaining, min_size), remaining, float('inf')
+
+    def _top(self, matched, count):
+        """count лучших ключей (доля, совпало, id рецепта)."""
+        if self._tag_ids or self._max_cooking_time:
+            matched = {
+                recipe_id: found for recipe_id, found in matched.items()
+                if self._matches(recipe_id)
+            }
+        found, recipe_ids = matched.values(), matched.keys()
+        # Доля своих ингредиентов, затем их число, затем новизна рецепта.
+        # Ключи собираются map и zip, без цикла на Python
+        return heapq.nlargest(count, zip(
+            map(truediv, found, map(self._sizes.__getitem__, recipe_ids)),
+            found, recipe_ids
+        ))
+
+    def _best(self, count):
+        matched = Counter()
+        walked = len(self._postings)
+        for position, posting in enumerate(self._postings):
+            # Проверка оценивает всех найденных: она окупается, если
+            # следующий список намного длиннее
+            if len(posting) > 2 * len(matched) >= 2 * count:
+                best = self._top(matched, count)
+                # Совпадения найденных рецептов только растут
+                if len(best) == count and best[-1] > self._bound(position):
+                    walked = position
+                    break
+            matched.update(posting)
+        # Новые рецепты из оставшихся списков уже не нужны
+        for posting in self._postings[walked:]:
+            matched.update(filter(matched.__contains__, posting))
+        return self._top(matched, count)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(len(self))
+        return [
+            (recipe_id, matched, self._sizes[recipe_id])
+            for _, matched, recipe_id in self._best(stop)[start:stop]
+        ]
+
+
+class IngredientIndex:
+    """
+    Инвертированный индекс «ингредиент → рецепты» в памяти процесса.
+
+    Списки рецептов хранятся отсортированными массивами id. Перед
+    поиском, не чаще раза в INGREDIENT_INDEX_SYNC_INTERVAL секунд,
+    индекс дочитывает новые записи RecipeChange и обновляет только
+    изменившиеся рецепты. Первый раз индекс строится при прогреве
+    (core.warmup); повторные полные перестройки — раз в
+    INGREDIENT_INDEX_REBUILD секунд и после массовых загрузок — идут
+    в фоновом потоке, а поиск тем временем работает по старому индексу.
+    Под lock только синхронизация: ранжирование идёт по снимку.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = Snapshot({}, {}, array('H'), {})
+        self._last_change = None
+        # Пропущенный номер журнала -> когда пропуск замечен
+        self._gaps = {}
+        self._built_at = 0
+        self._synced_at = 0
+        self._rebuilding = None
+
+    @staticmethod
+    def _load():
+        # Номер изменения читается до данных: изменения, сделанные во
+        # время загрузки, применятся ещё раз при следующей синхронизации
+        last_change = RecipeChange.objects.aggregate(last=Max('id'))['last']
+        return build_snapshot(load_recipes()), last_change or 0
+
+    def _install(self, snapshot, last_change):
+        self._snapshot = snapshot
+        self._last_change = last_change
+        self._gaps = {}
+        self._built_at = time.monotonic()
+
+    def _rebuild_in_background(self):
+        """Полная перестройка в своём потоке; замена индекса под lock."""
+        def rebuild():
+            try:
+                loaded = self._load()
+                with self._lock:
+                    self._install(*loaded)
+            finally:
+                self._rebuilding = None
+                # Соединение этого потока больше не понадобится
+                connections.close_all()
+
+        if self._rebuilding is None:
+            self._rebuilding = threading.Thread(
+                target=rebuild, name='ingredient-index', daemon=True
+            )
+            self._rebuilding.start()
+
+    def _apply(self, recipe_ids):
+        """
+        Новый снимок с перечитанными рецептами. Копируются словари и
+        только затронутые списки: старый снимок может читать поиск.
+        """
+        fresh = load_recipes(recipe_ids)
+        current = self._snapshot
+        recipes = dict(current.recipes)
+        postings = dict(current.postings)
+        sizes = _sized(array('H', current.sizes), max(recipe_ids))
+        min_sizes = dict(current.min_sizes)
+        copied = set()
+
+        def posting(ingredient_id):
+            if ingredient_id not in copied:
+                copied.add(ingredient_id)
+                postings[ingredient_id] = array(
+                    'q', postings.get(ingredient_id, ())
+                )
+            return postings[ingredient_id]
+
+        for recipe_id in recipe_ids:
+            old = recipes.pop(recipe_id, None)
+            sizes[recipe_id] = 0
+            for ingredient_id in old[0] if old else ():
+                ingredient_posting = posting(ingredient_id)
+                if _contains(ingredient_posting, recipe_id):
+                    del ingredient_posting[
+                        bisect_left(ingredient_posting, recipe_id)
+                    ]
+            if recipe_id not in fresh:
+                continue
+            recipes[recipe_id] = fresh[recipe_id]
+            size = sizes[recipe_id] = len(fresh[recipe_id][0])
+            for ingredient_id in fresh[recipe_id][0]:
+                insort(posting(ingredient_id), recipe_id)
+                min_sizes[ingredient_id] = min(
+                    min_sizes.get(ingredient_id, size), size
+                )
+        self._snapshot = Snapshot(postings, recipes, sizes, min_sizes)
+
+    def _track_gaps(self, change_ids, now):
+        """Запоминает пропуски в новых номерах, забывает найденные."""
+        previous = self._last_change
+        for change_id in change_ids:
+            self._gaps.pop(change_id, None)
+            if change_id <= previous:
+                continue
+            missing = change_id - previous - 1
+            if missing and len(self._gaps) + missing <= MAX_CHANGE_GAPS:
+                self._gaps.update(
+                    dict.fromkeys(range(previous + 1, change_id), now)
+                )
+            previous = change_id
+        self._last_change = previous
+
+    def _sync(self, force=False):
+        now = time.monotonic()
+        if self._last_change is None:
+            # Без прогрева индекс строится при первом поиске
+            self._install(*self._load())
+            self._synced_at = now
+            return
+        if self._rebuilding is not None:
+            return
+        if now - self._built_at >= settings.INGREDIENT_INDEX_REBUILD:
+            self._rebuild_in_background()
+            return
+        if not force and (
+            now - self._synced_at < settings.INGREDIENT_INDEX_SYNC_INTERVAL
+        ):
+            return
+        self._synced_at = now
+        self._gaps = {
+            change_id: seen for change_id, seen in self._gaps.items()
+            if now - seen < CHANGE_GAP_TIMEOUT
+        }
+        changes = list(
+            RecipeChange.objects.filter(
+                Q(id__gt=self._last_change) | Q(id__in=list(self._gaps))
+            )
+            .order_by('id')
+            .values_list('id', 'recipe_id')[:MAX_INCREMENTAL_CHANGES + 1]
+        )
+        if not changes:
+            return
+        recipe_ids = {recipe_id for _, recipe_id in changes}
+        if len(changes) > MAX_INCREMENTAL_CHANGES or None in recipe_ids:
+            self._rebuild_in_background()
+            return
+        self._apply(recipe_ids)
+        self._track_gaps([change_id for change_id, _ in changes], now)
+
+    def refresh(self):
+        with self._lock:
+            self._sync(force=True)
+
+    def search(self, ingredient_ids, tag_ids=None, max_cooking_time=None):
+        """
+        Рецепты хотя бы с одним из ингредиентов: Ranking с оценками
+        (совпало ингредиентов, всего ингредиентов в рецепте).
+        """
+        with self._lock:
+            self._sync()
+            snapshot = self._snapshot
+        return Ranking(snapshot, ingredient_ids, tag_ids, max_cooking_time)
+
+
+ingredient_index = IngredientIndex()
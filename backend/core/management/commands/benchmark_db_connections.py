@@ -0,0 +1,110 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+from api.management.commands.loadtest import summarize
+
+POOL_ENGINE = 'core.backends.postgresql'
+
+# Режимы подключения: переопределения настроек БД
+MODES = {
+    'direct': {'CONN_MAX_AGE': 0, 'POOL': None},
+    'persistent': {'CONN_MAX_AGE': 600, 'POOL': None},
+    'pool': {'CONN_MAX_AGE': 0},
+}
+
+
+class Command(BaseCommand):
+    """Сравнение задержки запроса при разных режимах подключения к БД."""
+
+    help = (
+        'Имитирует HTTP-запросы с одним SQL-запросом и сравнивает задержку '
+        'без переиспользования соединений, с постоянными соединениями '
+        'и с пулом'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Количество запросов на поток. По умолчанию: 500'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Количество потоков (как --threads у gunicorn)'
+        )
+        parser.add_argument(
+            '--mode', action='append', choices=tuple(MODES),
+            help='Проверить только указанные режимы (можно повторять)'
+        )
+
+    def _settings(self, mode, threads):
+        settings_dict = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            'ENGINE': POOL_ENGINE,
+            'CONN_HEALTH_CHECKS': True,
+            **MODES[mode],
+        }
+        if mode == 'pool':
+            settings_dict['POOL'] = {
+                'MAX_SIZE': threads,
+                'TIMEOUT': 10,
+                'MAX_LIFETIME': 1800,
+                'CHECK_INTERVAL': 30,
+                **(settings_dict.get('POOL') or {}),
+            }
+        return settings_dict
+
+    def _worker(self, wrapper_class, settings_dict, alias, count):
+        wrapper = wrapper_class(settings_dict, alias)
+        latencies = []
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                # Так Django обрамляет каждый запрос: request_started и
+                # request_finished вызывают close_if_unusable_or_obsolete
+                wrapper.close_if_unusable_or_obsolete()
+                with wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                wrapper.close_if_unusable_or_obsolete()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            wrapper.close()
+        return latencies
+
+    def _run(self, mode, options):
+        settings_dict = self._settings(mode, options['threads'])
+        wrapper_class = load_backend(POOL_ENGINE).DatabaseWrapper
+        alias = f'benchmark_{mode}'
+        started = time.monotonic()
+        with ThreadPoolExecutor(options['threads']) as executor:
+            futures = [
+                executor.submit(
+                    self._worker, wrapper_class, settings_dict, alias,
+                    options['requests']
+                )
+                for _ in range(options['threads'])
+            ]
+            latencies = [
+                value for future in futures for value in future.result()
+            ]
+        return summarize(latencies, 0, time.monotonic() - started)
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'postgresql':
+            raise CommandError('Сравнение имеет смысл только для PostgreSQL')
+        results = {}
+        for mode in options['mode'] or tuple(MODES):
+            results[mode] = stats = self._run(mode, options)
+            line = (
+                f'{mode}: p50={stats["p50_ms"]} p95={stats["p95_ms"]} '
+                f'среднее={stats["mean_ms"]} мс, '
+                f'{stats["throughput_rps"]} запросов/с'
+            )
+            if mode != 'direct' and 'direct' in results:
+                saved = results['direct']['mean_ms'] - stats['mean_ms']
+                line += f', экономия {saved:.2f} мс на запрос'
+            self.stdout.write(line)
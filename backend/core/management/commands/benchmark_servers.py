@@ -0,0 +1,202 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.client import HTTPConnection, HTTPException
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.management.commands.loadtest import summarize
+
+HOST = '127.0.0.1'
+SLOW_PATH = '/api/auth/token/login/'
+SLOW_BODY = json.dumps(
+    {'email': 'slow-client@example.com', 'password': 'slow-client'}
+).encode()
+DEFAULT_PROBES = (
+    '/api/tags/',
+    f'/api/ingredients/?name={quote("соль")}',
+    '/api/recipes/?limit=6',
+)
+
+
+class Command(BaseCommand):
+    """Сравнение воркеров WSGI и ASGI под нагрузкой медленных клиентов."""
+
+    help = (
+        'Запускает gunicorn в режимах wsgi и asgi (gunicorn.conf.py), '
+        'занимает его медленными клиентами, которые передают тело запроса '
+        'по байту, и измеряет задержку обычных запросов в это время'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', action='append', choices=('wsgi', 'asgi'),
+            help='Проверить только указанные режимы (можно повторять)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество воркеров gunicorn. По умолчанию: 1'
+        )
+        parser.add_argument(
+            '--slow-clients', type=int, default=10,
+            help='Количество медленных клиентов. По умолчанию: 10'
+        )
+        parser.add_argument(
+            '--slow-seconds', type=float, default=5,
+            help='За сколько секунд медленный клиент передаёт тело'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Параллельные обычные клиенты. По умолчанию: 4'
+        )
+        parser.add_argument(
+            '--path', action='append',
+            help='Пути обычных запросов (можно повторять)'
+        )
+        parser.add_argument(
+            '--port', type=int, default=8100,
+            help='Порт для запускаемого сервера. По умолчанию: 8100'
+        )
+
+    def _start_server(self, mode, options):
+        process = subprocess.Popen(
+            (sys.executable, '-m', 'gunicorn',
+             '--bind', f'{HOST}:{options["port"]}',
+             '--workers', str(options['workers'])),
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'SERVER_MODE': mode},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'gunicorn ({mode}) завершился при старте')
+            try:
+                self._get(options['port'], options['paths'][0], timeout=1)
+                return process
+            except (OSError, HTTPException):
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f'gunicorn ({mode}) не ответил за 30 с')
+
+    @staticmethod
+    def _get(port, path, timeout):
+        connection = HTTPConnection(HOST, port, timeout=timeout)
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _slow_client(port, seconds, finished):
+        """POST, тело которого приходит по байту за seconds секунд."""
+        interval = seconds / len(SLOW_BODY)
+        try:
+            with socket.create_connection(
+                (HOST, port), timeout=seconds + 30
+            ) as sock:
+                sock.sendall(
+                    f'POST {SLOW_PATH} HTTP/1.1\r\nHost: {HOST}\r\n'
+                    'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(SLOW_BODY)}\r\n'
+                    'Connection: close\r\n\r\n'.encode()
+                )
+                for byte in SLOW_BODY:
+                    time.sleep(interval)
+                    sock.sendall(bytes((byte,)))
+                if sock.recv(1):
+                    finished.append(True)
+        except OSError:
+            pass
+
+    def _probe(self, port, paths, deadline, timeout, results):
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        number = 0
+        while time.monotonic() < deadline:
+            path = paths[number % len(paths)]
+            number += 1
+            started = time.perf_counter()
+            try:
+                status = self._get(port, path, timeout)
+            except (OSError, HTTPException):
+                status = None
+            latencies[path].append(time.perf_counter() - started)
+            if status is None or status >= 500:
+                errors[path] += 1
+        results.append((latencies, errors))
+
+    def _run(self, mode, options):
+        process = self._start_server(mode, options)
+        port = options['port']
+        seconds = options['slow_seconds']
+        finished = []
+        results = []
+        try:
+            slow = [
+                threading.Thread(
+                    target=self._slow_client, args=(port, seconds, finished)
+                )
+                for _ in range(options['slow_clients'])
+            ]
+            for thread in slow:
+                thread.start()
+            # Медленные клиенты успевают занять воркеры
+            time.sleep(0.2)
+            started = time.monotonic()
+            probes = [
+                threading.Thread(target=self._probe, args=(
+                    port, options['paths'], started + seconds,
+                    seconds + 10, results
+                ))
+                for _ in range(options['concurrency'])
+            ]
+            for thread in probes:
+                thread.start()
+            for thread in probes + slow:
+                thread.join()
+            elapsed = time.monotonic() - started
+        finally:
+            process.terminate()
+            process.wait()
+        latencies = defaultdict(list)
+        errors = defaultdict(int)
+        for probe_latencies, probe_errors in results:
+            for path, values in probe_latencies.items():
+                latencies[path].extend(values)
+            for path, count in probe_errors.items():
+                errors[path] += count
+        return {
+            path: summarize(values, errors[path], elapsed)
+            for path, values in latencies.items()
+        }, len(finished)
+
+    def handle(self, *args, **options):
+        options['paths'] = options['path'] or DEFAULT_PROBES
+        self.stdout.write(
+            f'{options["slow_clients"]} медленных клиентов по '
+            f'{options["slow_seconds"]} с, {options["concurrency"]} обычных, '
+            f'воркеров: {options["workers"]}'
+        )
+        for mode in options['mode'] or ('wsgi', 'asgi'):
+            endpoints, finished = self._run(mode, options)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{mode}: медленных клиентов обслужено {finished}'
+            ))
+            for path, stats in endpoints.items():
+                self.stdout.write(
+                    f'  GET {path}: n={stats["count"]} '
+                    f'p50={stats["p50_ms"]} p95={stats["p95_ms"]} мс, '
+                    f'{stats["throughput_rps"]} запросов/с, '
+                    f'ошибок {stats["errors"]}'
+                )
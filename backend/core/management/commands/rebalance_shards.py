@@ -0,0 +1,112 @@
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from core import sharding
+
+
+class Command(BaseCommand):
+    """Перенос связей пользователей в шарды, определённые хешем user_id."""
+
+    help = (
+        'Создаёт таблицы в шардах и переносит записи избранного, корзин '
+        'и подписок из default и чужих шардов в шард пользователя. '
+        'Выполняется после включения шардирования или изменения их состава'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество записей в одной пачке. По умолчанию: 5000'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать записи, которые нужно перенести'
+        )
+        parser.add_argument(
+            '--source', action='append',
+            help='Просматривать только указанные БД (можно повторять)'
+        )
+
+    def _move_batch(self, model, source, rows):
+        """Переносит записи пачки из source; возвращает их количество."""
+        by_target = defaultdict(list)
+        for row in rows:
+            target = sharding.shard_for_user(row.user_id)
+            if target != source:
+                by_target[target].append(row)
+        moved = [row.pk for rows in by_target.values() for row in rows]
+        if not moved or self.dry_run:
+            return len(moved)
+        for target, target_rows in by_target.items():
+            for row in target_rows:
+                # Идентификаторы в шардах независимы
+                row.pk = None
+            # Копия уже в шарде, если прошлый запуск прервался
+            # до удаления из источника
+            with transaction.atomic(using=target):
+                model.objects.using(target).bulk_create(
+                    target_rows, ignore_conflicts=True
+                )
+        with transaction.atomic(using=source):
+            model.objects.using(source).filter(pk__in=moved).delete()
+        return len(moved)
+
+    def _rebalance(self, model, source):
+        tables = connections[source].introspection.table_names()
+        if model._meta.db_table not in tables:
+            # Шард ещё не создан (--dry-run до первого запуска)
+            return 0
+        queryset = model.objects.using(source).order_by('pk')
+        last_pk = 0
+        total = 0
+        started = time.monotonic()
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk)[:self.batch_size])
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+            total += self._move_batch(model, source, rows)
+            if len(rows) < self.batch_size:
+                # Неполная пачка — последняя, пустой запрос не нужен
+                break
+        if total:
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{model._meta.label} из {source}: '
+                f'{"к переносу" if self.dry_run else "перенесено"} {total} '
+                f'({elapsed:.1f} с)'
+            )
+        return total
+
+    def handle(self, *args, **options):
+        if not sharding.is_enabled():
+            raise CommandError(
+                'Шарды не настроены: задайте SQLITE_SHARDS или DB_SHARD_HOSTS'
+            )
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        if self.batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        sources = options['source'] or [
+            DEFAULT_DB_ALIAS, *settings.RELATION_SHARDS
+        ]
+        unknown = set(sources) - {DEFAULT_DB_ALIAS, *settings.RELATION_SHARDS}
+        if unknown:
+            raise CommandError(f'Неизвестные БД: {", ".join(sorted(unknown))}')
+        if not self.dry_run:
+            for alias in settings.RELATION_SHARDS:
+                for table in sharding.create_shard_tables(alias):
+                    self.stdout.write(f'{alias}: создана таблица {table}')
+        total = sum(
+            self._rebalance(model, source)
+            for model in sharding.get_sharded_models()
+            for source in sources
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. {"К переносу" if self.dry_run else "Перенесено"} '
+            f'записей: {total}'
+        ))
@@ -0,0 +1,54 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """Имитация асинхронной репликации для локальной проверки реплик."""
+
+    help = (
+        'Периодически копирует основную SQLite-базу в реплику; период '
+        'копирования задаёт задержку репликации'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delay', type=float, default=2,
+            help='Задержка репликации в секундах. По умолчанию: 2'
+        )
+        parser.add_argument(
+            '--replica', type=str, default='replica',
+            help='Псевдоним реплики. По умолчанию: replica'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Скопировать один раз и выйти'
+        )
+
+    def _replicate(self, source, target):
+        # Контекст sqlite3.connect только завершает транзакцию,
+        # соединения закрывает closing
+        with closing(sqlite3.connect(source)) as primary, \
+                closing(sqlite3.connect(target)) as replica:
+            primary.backup(replica)
+
+    def handle(self, *args, **options):
+        alias = options['replica']
+        if alias not in settings.DATABASE_REPLICAS:
+            raise CommandError(
+                f'Реплика {alias} не настроена, задайте SQLITE_REPLICA=True'
+            )
+        databases = (connections['default'], connections[alias])
+        if any(db.vendor != 'sqlite' for db in databases):
+            raise CommandError('Имитация репликации только для SQLite')
+        source, target = (db.settings_dict['NAME'] for db in databases)
+        while True:
+            self._replicate(source, target)
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS('Реплика обновлена'))
+                return
+            time.sleep(options['delay'])
@@ -0,0 +1,138 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+APPLICATIONS = {
+    'wsgi': 'foodgram_backend.wsgi',
+    'asgi': 'foodgram_backend.asgi',
+}
+# Выполняется в отдельном интерпретаторе, чтобы импорты были холодными
+CHILD_SCRIPT = '''
+import importlib, json, resource, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+result = {{'load': time.perf_counter() - started, 'steps': []}}
+if sys.argv[2] == 'warm':
+    from core.warmup import warm_up
+    result['steps'] = warm_up()
+result['rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print({marker!r} + json.dumps(result))
+'''
+RESULT_MARKER = 'STARTUP_PROFILE:'
+
+
+class Command(BaseCommand):
+    """Профиль холодного старта воркера: импорты, прогрев, память."""
+
+    help = (
+        'Загружает приложение в новом интерпретаторе с -X importtime '
+        'и показывает самые долгие импорты, время по пакетам, шаги '
+        'прогрева и пиковую память процесса'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=tuple(APPLICATIONS),
+            help='Приложение: wsgi или asgi. По умолчанию: SERVER_MODE'
+        )
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Сколько модулей и пакетов показать. По умолчанию: 20'
+        )
+        parser.add_argument(
+            '--no-warm-up', action='store_true',
+            help='Не выполнять прогрев после загрузки приложения'
+        )
+        parser.add_argument(
+            '--output', type=str,
+            help='Путь к JSON-файлу с результатами'
+        )
+
+    def _run_child(self, module, warm):
+        process = subprocess.run(
+            (sys.executable, '-X', 'importtime', '-c',
+             CHILD_SCRIPT.format(marker=RESULT_MARKER), module,
+             'warm' if warm else 'cold'),
+            cwd=settings.BASE_DIR, env=os.environ.copy(),
+            capture_output=True, text=True,
+        )
+        lines = process.stdout.splitlines()
+        if process.returncode or not lines[-1:] or (
+            not lines[-1].startswith(RESULT_MARKER)
+        ):
+            raise CommandError(
+                f'Не удалось загрузить {module}:\n{process.stderr[-2000:]}'
+            )
+        return (
+            json.loads(lines[-1][len(RESULT_MARKER):]),
+            self._parse_import_times(process.stderr),
+        )
+
+    @staticmethod
+    def _parse_import_times(stderr):
+        """Модули как (имя, собственное время, с вложенными), в секундах."""
+        modules = []
+        for line in stderr.splitlines():
+            match = IMPORT_TIME_RE.match(line)
+            if match:
+                own, cumulative, _, name = match.groups()
+                modules.append(
+                    (name, int(own) / 1e6, int(cumulative) / 1e6)
+                )
+        return modules
+
+    def handle(self, *args, **options):
+        mode = options['mode'] or settings.SERVER_MODE
+        result, modules = self._run_child(
+            APPLICATIONS[mode], warm=not options['no_warm_up']
+        )
+        packages = defaultdict(float)
+        for name, own, _ in modules:
+            packages[name.split('.')[0]] += own
+        top = options['top']
+        slowest = sorted(modules, key=lambda module: -module[1])[:top]
+        heaviest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+        total = sum(own for _, own, _ in modules)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Загрузка {APPLICATIONS[mode]}: {result["load"] * 1000:.0f} мс; '
+            f'импорты за весь запуск, с прогревом: {total * 1000:.0f} мс '
+            f'({len(modules)} модулей)'
+        ))
+        self.stdout.write(self.style.MIGRATE_HEADING('Пакеты:'))
+        for package, seconds in heaviest:
+            self.stdout.write(f'  {package}: {seconds * 1000:.1f} мс')
+        self.stdout.write(self.style.MIGRATE_HEADING('Модули:'))
+        for name, own, cumulative in slowest:
+            self.stdout.write(
+                f'  {name}: {own * 1000:.1f} мс '
+                f'(с вложенными {cumulative * 1000:.1f} мс)'
+            )
+        if result['steps']:
+            self.stdout.write(self.style.MIGRATE_HEADING('Прогрев:'))
+            for name, seconds, error in result['steps']:
+                self.stdout.write(
+                    f'  {name}: {seconds * 1000:.0f} мс'
+                    + (f' — ошибка {error}' if error else '')
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пиковая память процесса: {result["rss_kb"] / 1024:.1f} МБ'
+        ))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'mode': mode,
+                    **result,
+                    'packages': dict(heaviest),
+                    'modules': [
+                        {'name': name, 'self': own, 'cumulative': cumulative}
+                        for name, own, cumulative in slowest
+                    ],
+                }, file, ensure_ascii=False, indent=2)
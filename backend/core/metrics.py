@@ -0,0 +1,321 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+
+from core.timing import view_label
+
+HEADER = struct.Struct('i')
+VALUE = struct.Struct('d')
+INITIAL_SIZE = 1 << 16
+# Границы гистограммы задержки, в секундах
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+
+# Имя, тип и описание для # HELP и # TYPE
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'HTTP-запросы по действию, методу и статусу'
+    ),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса по действию'
+    ),
+    'foodgram_db_queries_total': (
+        'counter', 'Запросы к БД по действию'
+    ),
+    'foodgram_db_query_duration_seconds_total': (
+        'counter', 'Суммарное время запросов к БД по действию'
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кешам: result=hit или miss'
+    ),
+    'foodgram_worker_requests_in_progress': (
+        'gauge', 'Запросы, которые воркер обрабатывает сейчас'
+    ),
+    'foodgram_worker_start_time_seconds': (
+        'gauge', 'Время запуска живого воркера gunicorn'
+    ),
+    'foodgram_worker_exits_total': (
+        'counter', 'Завершения воркеров gunicorn'
+    ),
+    'foodgram_worker_timeouts_total': (
+        'counter', 'Воркеры, прерванные gunicorn по таймауту'
+    ),
+}
+
+
+class MmapStore:
+    """
+    Значения метрик одного процесса в файле, отображённом в память.
+
+    Процесс пишет только в свой файл, поэтому обновление — это запись
+    восьми байт без межпроцессных блокировок. Формат: длина занятой
+    части, затем записи «длина ключа, ключ, выравнивание, double».
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._positions = {}
+        self._used = HEADER.unpack_from(self._map, 0)[0] or 8
+        for key, _, position in iter_entries(self._map, self._used):
+            self._positions[key] = position
+
+    def _add(self, key):
+        encoded = key.encode()
+        padded = len(encoded) + (8 - (len(encoded) + HEADER.size) % 8) % 8
+        size = HEADER.size + padded + VALUE.size
+        if self._used + size > len(self._map):
+            capacity = len(self._map)
+            while self._used + size > capacity:
+                capacity *= 2
+            self._map.close()
+            self._file.truncate(capacity)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        HEADER.pack_into(self._map, self._used, len(encoded))
+        self._map[
+            self._used + HEADER.size:self._used + HEADER.size + len(encoded)
+        ] = encoded
+        position = self._used + HEADER.size + padded
+        VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        # Длина обновляется последней: читатели не увидят запись без значения
+        HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def inc(self, key, amount=1):
+        with self._lock:
+            position = self._positions.get(key) or self._add(key)
+            value = VALUE.unpack_from(self._map, position)[0]
+            VALUE.pack_into(self._map, position, value + amount)
+
+    def set(self, key, value):
+        with self._lock:
+            position = self._positions.get(key) or self._add(key)
+            VALUE.pack_into(self._map, position, value)
+
+
+def iter_entries(data, used):
+    """Записи (ключ, значение, позиция значения) из содержимого файла."""
+    offset = 8
+    while offset < used:
+        length = HEADER.unpack_from(data, offset)[0]
+        key_start = offset + HEADER.size
+        key = bytes(data[key_start:key_start + length]).decode()
+        padded = length + (8 - (length + HEADER.size) % 8) % 8
+        position = key_start + padded
+        yield key, VALUE.unpack_from(data, position)[0], position
+        offset = position + VALUE.size
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(kind):
+    """Файл процесса: counters накапливаются, gauges удаляются с процессом."""
+    pid = os.getpid()
+    store = _stores.get((kind, pid))
+    if store is None:
+        with _stores_lock:
+            store = _stores.get((kind, pid))
+            if store is None:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                store = _stores[(kind, pid)] = MmapStore(
+                    os.path.join(settings.METRICS_DIR, f'{kind}_{pid}.db')
+                )
+    return store
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+@lru_cache(maxsize=4096)
+def format_series(name, labels):
+    if not labels:
+        return name
+    pairs = ','.join(f'{label}="{escape(value)}"' for label, value in labels)
+    return f'{name}{{{pairs}}}'
+
+
+def series(name, **labels):
+    return format_series(name, tuple(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    get_store('counters').inc(series(name, **labels), amount)
+
+
+def observe(name, value, **labels):
+    """Гистограмма: в файле счётчики без накопления, копит экспозиция."""
+    store = get_store('counters')
+    bucket = next(
+        (str(bound) for bound in LATENCY_BUCKETS if value <= bound), '+Inf'
+    )
+    store.inc(series(f'{name}_bucket', **labels, le=bucket))
+    store.inc(series(f'{name}_sum', **labels), value)
+    store.inc(series(f'{name}_count', **labels))
+
+
+def set_gauge(name, value, **labels):
+    get_store('gauges').set(series(name, pid=os.getpid(), **labels), value)
+
+
+def inc_gauge(name, amount=1, **labels):
+    get_store('gauges').inc(series(name, pid=os.getpid(), **labels), amount)
+
+
+def request_started():
+    inc_gauge('foodgram_worker_requests_in_progress')
+
+
+def request_finished(request, response, stats, duration):
+    """Метрики запроса по данным core.timing: десятки микросекунд."""
+    # Ответы из кеша не доходят до маршрутизации; без маршрута
+    # (404 на произвольный путь) — одна серия на всех, иначе перебор
+    # путей раздул бы число серий
+    if response.get('X-Cache') == 'HIT':
+        action = 'cached'
+    else:
+        action = view_label(request) or 'unmatched'
+    inc_gauge('foodgram_worker_requests_in_progress', -1)
+    inc(
+        'foodgram_http_requests_total', action=action,
+        method=request.method, status=response.status_code
+    )
+    observe('foodgram_http_request_duration_seconds', duration, action=action)
+    if stats.queries:
+        inc('foodgram_db_queries_total', len(stats.queries), action=action)
+        inc(
+            'foodgram_db_query_duration_seconds_total', stats.db_time,
+            action=action
+        )
+
+
+def cache_access(cache, hit):
+    inc('foodgram_cache_requests_total', cache=cache,
+        result='hit' if hit else 'miss')
+
+
+def worker_started():
+    set_gauge('foodgram_worker_start_time_seconds', time.time())
+
+
+def mark_process_dead(pid):
+    """Значения gauge умершего воркера больше не актуальны."""
+    path = os.path.join(settings.METRICS_DIR, f'gauges_{pid}.db')
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def clear():
+    """Сброс в мастере перед запуском воркеров: счётчики с нуля."""
+    with _stores_lock:
+        _stores.clear()
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        os.remove(path)
+
+
+def collect():
+    """Сумма значений по файлам всех процессов."""
+    values = defaultdict(float)
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            continue
+        if len(data) < 8:
+            continue
+        used = min(HEADER.unpack_from(data)[0], len(data))
+        try:
+            for key, value, _ in iter_entries(data, used):
+                values[key] += value
+        except (struct.error, UnicodeDecodeError):
+            # Файл растёт прямо сейчас: недописанный хвост пропускаем
+            continue
+    return values
+
+
+def split_series(key):
+    name, _, labels = key.partition('{')
+    return name, labels.rstrip('}')
+
+
+def format_value(value):
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus."""
+    families = defaultdict(list)
+    for key, value in collect().items():
+        name, labels = split_series(key)
+        family = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                family = name[:-len(suffix)]
+        families[family].append((name, labels, value))
+
+    lines = []
+    for family in sorted(families):
+        kind, description = METRICS.get(family, ('untyped', ''))
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        samples = families[family]
+        if kind == 'histogram':
+            lines.extend(render_histogram(family, samples))
+            continue
+        for name, labels, value in sorted(samples):
+            lines.append(
+                f'{name}{{{labels}}} {format_value(value)}' if labels
+                else f'{name} {format_value(value)}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def render_histogram(family, samples):
+    """Накопленные бакеты с +Inf, _sum и _count по наборам меток."""
+    by_labels = defaultdict(lambda: {'buckets': {}, 'sum': 0, 'count': 0})
+    for name, labels, value in samples:
+        if name.endswith('_bucket'):
+            base, _, bound = labels.rpartition(',le=')
+            if not bound:
+                base, bound = '', labels[len('le='):]
+            by_labels[base]['buckets'][bound.strip('"')] = value
+        elif name.endswith('_sum'):
+            by_labels[labels]['sum'] = value
+        else:
+            by_labels[labels]['count'] = value
+    lines = []
+    for labels in sorted(by_labels):
+        histogram = by_labels[labels]
+        prefix = f'{labels},' if labels else ''
+        total = 0
+        for bound in (*map(str, LATENCY_BUCKETS), '+Inf'):
+            total += histogram['buckets'].get(bound, 0)
+            lines.append(
+                f'{family}_bucket{{{prefix}le="{bound}"}} '
+                f'{format_value(total)}'
+            )
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{family}_sum{suffix} {format_value(histogram["sum"])}')
+        lines.append(
+            f'{family}_count{suffix} {format_value(histogram["count"])}'
+        )
+    return lines
@@ -0,0 +1,396 @@
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.middleware import clickjacking, common, security
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import metrics
+from core.cache import build_key, get_dependencies, is_shared
+from core.constants import MAX_PATH_LENGTH
+from core.models import RequestProfile
+from core.nplusone import detect_n_plus_one, get_mode
+from core.profiling import profile, profile_lock, requested_profile
+from core.routers import read_from_replica
+from core.timing import RequestStats, current_stats, finish
+from core.utils import run_in_thread
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_COOKIE = 'primary_db'
+STICKY_KEY_PREFIX = 'primary_db'
+
+
+class HybridMiddleware:
+    """
+    Основа middleware, которая работает и в WSGI, и в ASGI.
+
+    Перед асинхронными представлениями Django передаёт асинхронный
+    get_response; тогда вызывается acall(), иначе call(). Без этого
+    Django переключал бы поток на каждом синхронном middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Признак корутины для Django, как в MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return self.call(request)
+
+    def call(self, request):
+        raise NotImplementedError
+
+    async def acall(self, request):
+        raise NotImplementedError
+
+
+class InlineHooksMixin:
+    """
+    Хуки MiddlewareMixin выполняются в цикле событий.
+
+    В асинхронном режиме Django 3.2 выполняет каждый process_* через
+    sync_to_async в одном общем потоке, и запросы асинхронных
+    представлений выстраиваются к нему в очередь. Встроенным
+    middleware ниже поток не нужен: они читают запрос и дописывают
+    заголовки. Используются только в ASYNC_MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        if (
+            asyncio.iscoroutinefunction(get_response)
+            and hasattr(self, 'process_view')
+        ):
+            process_view = self.process_view
+
+            async def async_process_view(*args):
+                return process_view(*args)
+
+            self.process_view = async_process_view
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, 'process_request'):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, 'process_response'):
+            response = self.process_response(request, response)
+        return response
+
+
+def inline_hooks(middleware_class):
+    return type(
+        middleware_class.__name__, (InlineHooksMixin, middleware_class),
+        {'__module__': __name__}
+    )
+
+
+SecurityMiddleware = inline_hooks(security.SecurityMiddleware)
+CommonMiddleware = inline_hooks(common.CommonMiddleware)
+XFrameOptionsMiddleware = inline_hooks(clickjacking.XFrameOptionsMiddleware)
+
+
+class ServerTimingMiddleware(HybridMiddleware):
+    """
+    Собирает статистику запроса: SQL, время БД и рендеринга, размер.
+
+    Сотрудникам и при DEBUG отдаёт её в заголовке Server-Timing,
+    запросы дольше SLOW_REQUEST_MS пишет в журнал
+    foodgram.slow_requests вместе с SQL, а счётчики и гистограммы
+    передаёт в core.metrics. Стоит первым в MIDDLEWARE, чтобы
+    учитывать время всех остальных.
+    """
+
+    @staticmethod
+    def _finish(request, response, stats):
+        finish(request, response, stats)
+        metrics.request_finished(
+            request, response, stats, time.perf_counter() - stats.started
+        )
+
+    def call(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        metrics.request_started()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self._finish(request, response, stats)
+        return response
+
+    async def acall(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        metrics.request_started()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self._finish(request, response, stats)
+        return response
+
+
+class NPlusOneMiddleware(HybridMiddleware):
+    """
+    Ищет повторы одного запроса из одного места кода (core.nplusone).
+
+    Включается N_PLUS_ONE_MODE; при off не входит в цепочку.
+    """
+
+    def __init__(self, get_response):
+        if get_mode() == 'off':
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def call(self, request):
+        with detect_n_plus_one(f'{request.method} {request.path}'):
+            return self.get_response(request)
+
+    async def acall(self, request):
+        with detect_n_plus_one(f'{request.method} {request.path}'):
+            return await self.get_response(request)
+
+
+class AnonymousResponseCacheMiddleware(HybridMiddleware):
+    """
+    Кеширует целые ответы публичных GET-эндпоинтов для анонимов.
+
+    Запрос считается анонимным, если в нём нет заголовка Authorization:
+    API авторизуется только токеном. Ответы сбрасываются сигналами
+    моделей (core.signals), таймаут лишь страхует. Без общего для
+    воркеров кеша (core.checks) middleware не включается: сброс дошёл
+    бы только до воркера, обработавшего запись.
+    """
+
+    def __init__(self, get_response):
+        if not is_shared():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @staticmethod
+    def _groups(request):
+        if (
+            request.method not in ('GET', 'HEAD')
+            or 'HTTP_AUTHORIZATION' in request.META
+        ):
+            return None
+        return get_dependencies(request.path)
+
+    @staticmethod
+    def _lookup(request, groups):
+        key = build_key(request, groups)
+        cached = cache.get(key)
+        metrics.cache_access('response', cached is not None)
+        return key, cached
+
+    @staticmethod
+    def _cached_response(cached):
+        content, status, headers = cached
+        response = HttpResponse(content, status=status)
+        for header, value in headers:
+            response[header] = value
+        response['X-Cache'] = 'HIT'
+        return response
+
+    @staticmethod
+    def _store(key, response):
+        if (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        ):
+            cache.set(
+                key,
+                (response.content, response.status_code,
+                 list(response.items())),
+                settings.ANONYMOUS_CACHE_TIMEOUT
+            )
+            response['X-Cache'] = 'MISS'
+
+    def call(self, request):
+        groups = self._groups(request)
+        if groups is None:
+            return self.get_response(request)
+        key, cached = self._lookup(request, groups)
+        if cached is not None:
+            return self._cached_response(cached)
+        # Заполняем кеш с основной БД: отстающая реплика закрепила бы
+        # в нём устаревший ответ до истечения таймаута
+        token = read_from_replica.set(False)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        self._store(key, response)
+        return response
+
+    async def acall(self, request):
+        groups = self._groups(request)
+        if groups is None:
+            return await self.get_response(request)
+        key, cached = await run_in_thread(self._lookup, request, groups)
+        if cached is not None:
+            return self._cached_response(cached)
+        token = read_from_replica.set(False)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        await run_in_thread(self._store, key, response)
+        return response
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """
+    Направляет безопасные запросы к API на реплики.
+
+    После записи клиент на REPLICA_STICKINESS_SECONDS закрепляется
+    за основной БД, чтобы не увидеть свои данные устаревшими:
+    браузер — по cookie, клиент с токеном — по ключу в кеше. Если кеш
+    не общий для воркеров (core.checks), middleware не включается:
+    закрепление сработало бы только в своём воркере.
+    """
+
+    def __init__(self, get_response):
+        if settings.DATABASE_REPLICAS and not is_shared():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    @staticmethod
+    def _sticky_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        digest = hashlib.md5(authorization.encode()).hexdigest()
+        return f'{STICKY_KEY_PREFIX}:{digest}'
+
+    @staticmethod
+    def _may_use_replica(request):
+        """Чтение, которое уходит на реплику, если клиент не закреплён."""
+        return (
+            request.method in SAFE_METHODS
+            and request.path.startswith(settings.REPLICA_READ_PREFIX)
+            and STICKY_COOKIE not in request.COOKIES
+        )
+
+    @staticmethod
+    def _stick(request, response, key):
+        window = settings.REPLICA_STICKINESS_SECONDS
+        if key is not None:
+            cache.set(key, True, window)
+        response.set_cookie(
+            STICKY_COOKIE, '1', max_age=window, httponly=True,
+            samesite='Lax'
+        )
+
+    def call(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        key = self._sticky_key(request)
+        token = read_from_replica.set(
+            self._may_use_replica(request)
+            and (key is None or cache.get(key) is None)
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        if request.method not in SAFE_METHODS:
+            self._stick(request, response, key)
+        return response
+
+    async def acall(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        key = self._sticky_key(request)
+        use_replica = self._may_use_replica(request)
+        if use_replica and key is not None:
+            use_replica = await run_in_thread(cache.get, key) is None
+        token = read_from_replica.set(use_replica)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_from_replica.reset(token)
+        if request.method not in SAFE_METHODS:
+            await run_in_thread(self._stick, request, response, key)
+        return response
+
+
+class RequestProfilerMiddleware(HybridMiddleware):
+    """
+    Профилирует запрос сотрудника с X-Profile: 1 или ?_profile=1.
+
+    С значением memory дополнительно снимает tracemalloc. Профиль
+    сохраняется в PROFILE_DIR и RequestProfile (виден в админке),
+    его id возвращается в X-Profile-Id. Остальные запросы проходят
+    с одной проверкой заголовка и параметра.
+    """
+
+    @staticmethod
+    def _staff_user(request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user if user.is_staff else None
+        # Токен DRF проверяет только в представлении
+        try:
+            authenticated = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        if authenticated and authenticated[0].is_staff:
+            return authenticated[0]
+        return None
+
+    @staticmethod
+    def _save(request, response, user, result):
+        saved = RequestProfile.objects.create(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:MAX_PATH_LENGTH],
+            status=response.status_code,
+            duration=round(result.duration * 1000, 1),
+            engine=result.engine,
+            samples=result.samples,
+            cpu_file=result.files['cpu'],
+            memory_file=result.files.get('memory', ''),
+            peak_memory=result.peak_memory,
+        )
+        response['X-Profile-Id'] = str(saved.pk)
+
+    def call(self, request):
+        kind = requested_profile(request)
+        user = kind and self._staff_user(request)
+        if not user or not profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            with profile(kind) as result:
+                response = self.get_response(request)
+        finally:
+            profile_lock.release()
+        self._save(request, response, user, result)
+        return response
+
+    async def acall(self, request):
+        kind = requested_profile(request)
+        user = kind and await run_in_thread(self._staff_user, request)
+        if not user or not profile_lock.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            with profile(kind) as result:
+                response = await self.get_response(request)
+        finally:
+            profile_lock.release()
+        await run_in_thread(self._save, request, response, user, result)
+        return response
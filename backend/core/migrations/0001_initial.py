@@ -0,0 +1,39 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создан')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=2000, verbose_name='Путь')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Статус')),
+                ('duration', models.FloatField(verbose_name='Время, мс')),
+                ('engine', models.CharField(max_length=32, verbose_name='Профилировщик')),
+                ('samples', models.PositiveIntegerField(verbose_name='Выборок')),
+                ('cpu_file', models.CharField(max_length=256, verbose_name='Файл профиля')),
+                ('memory_file', models.CharField(blank=True, max_length=256, verbose_name='Файл памяти')),
+                ('peak_memory', models.PositiveBigIntegerField(blank=True, null=True, verbose_name='Пик памяти, байт')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'профиль запроса',
+                'verbose_name_plural': 'профили запросов',
+                'ordering': ('-created',),
+            },
+        ),
+    ]
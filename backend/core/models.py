@@ -0,0 +1,43 @@
+import os
+
+from django.conf import settings
+from django.db import models
+
+from core.constants import MAX_CHAR_LENGTH, MAX_PATH_LENGTH
+
+
+class RequestProfile(models.Model):
+    """Профиль одного запроса сотрудника (core.profiling)."""
+
+    created = models.DateTimeField('Создан', auto_now_add=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        verbose_name='Пользователь'
+    )
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Путь', max_length=MAX_PATH_LENGTH)
+    status = models.PositiveSmallIntegerField('Статус')
+    duration = models.FloatField('Время, мс')
+    engine = models.CharField('Профилировщик', max_length=32)
+    samples = models.PositiveIntegerField('Выборок')
+    cpu_file = models.CharField('Файл профиля', max_length=MAX_CHAR_LENGTH)
+    memory_file = models.CharField(
+        'Файл памяти', max_length=MAX_CHAR_LENGTH, blank=True
+    )
+    peak_memory = models.PositiveBigIntegerField(
+        'Пик памяти, байт', null=True, blank=True
+    )
+
+    class Meta:
+        verbose_name = 'профиль запроса'
+        verbose_name_plural = 'профили запросов'
+        ordering = ('-created',)
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
+
+    def file_path(self, kind):
+        name = self.memory_file if kind == 'memory' else self.cpu_file
+        return os.path.join(settings.PROFILE_DIR, name) if name else None
@@ -0,0 +1,151 @@
+import logging
+import re
+import sys
+import warnings
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+MODES = ('off', 'log', 'warn', 'raise')
+# N+1 — это чтения; вставки в цикле (фикстуры тестов) не считаются
+READ_PREFIXES = ('SELECT', 'WITH')
+NUMBER_RE = re.compile(r'\b\d+\b')
+PLACEHOLDERS_RE = re.compile(r'\((?:%s|\?)(?:,\s*(?:%s|\?))*\)')
+# Кадры этих пакетов не считаются местом вызова
+INTERNAL_PACKAGES = (
+    'django/db/', 'django/utils/', 'django/dispatch/', 'asgiref/',
+)
+
+current_detector = ContextVar('current_detector', default=None)
+
+logger = logging.getLogger('foodgram.n_plus_one')
+
+
+class NPlusOneError(Exception):
+    """Один и тот же запрос повторился в одном месте кода."""
+
+
+class NPlusOneWarning(RuntimeWarning):
+    pass
+
+
+def fingerprint(sql):
+    """SQL без чисел и с любым количеством значений в IN (...)."""
+    return NUMBER_RE.sub('N', PLACEHOLDERS_RE.sub('(...)', sql))
+
+
+def short_path(filename):
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base):
+        return filename[len(base):].lstrip('/')
+    marker = filename.rfind('-packages/')
+    return filename[marker + len('-packages/'):] if marker != -1 else filename
+
+
+def call_site():
+    """
+    Место вызова: первый кадр кода проекта и ближайший к БД кадр
+    библиотеки (например, rest_framework/relations.py).
+    """
+    # Сначала выходим из обёрток execute() и django.db
+    frame = sys._getframe(2)
+    while frame is not None and 'django/db/' not in frame.f_code.co_filename:
+        frame = frame.f_back
+    library = None
+    base = str(settings.BASE_DIR)
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        location = f'{short_path(filename)}:{frame.f_lineno} in {code.co_name}'
+        if filename.startswith(base) and '-packages/' not in filename:
+            return location, library
+        if library is None and not any(
+            package in filename for package in INTERNAL_PACKAGES
+        ):
+            library = location
+        frame = frame.f_back
+    return library, None
+
+
+class Detector:
+    """Повторы запросов в пределах одного HTTP-запроса или теста."""
+
+    def __init__(self, mode, threshold):
+        self.mode = mode
+        self.threshold = threshold
+        # (отпечаток, место вызова) -> [число, SQL, кадр библиотеки]
+        self.seen = {}
+
+    def add(self, sql):
+        if not sql.lstrip()[:6].upper().startswith(READ_PREFIXES):
+            return
+        site, library = call_site()
+        key = (fingerprint(sql), site)
+        entry = self.seen.get(key)
+        if entry is None:
+            self.seen[key] = [1, sql, library]
+            return
+        entry[0] += 1
+        if self.mode == 'raise' and entry[0] == self.threshold:
+            raise NPlusOneError(self.describe(key, entry))
+
+    def describe(self, key, entry):
+        (_, site), (count, sql, library) = key, entry
+        via = f' через {library}' if library else ''
+        return f'N+1: {count} одинаковых запросов из {site}{via}: {sql}'
+
+    def problems(self):
+        return [
+            self.describe(key, entry) for key, entry in self.seen.items()
+            if entry[0] >= self.threshold
+        ]
+
+    def report(self, label):
+        if self.mode == 'raise':
+            # Об этих повторах уже сообщило исключение
+            return
+        for problem in self.problems():
+            message = f'{label}: {problem}' if label else problem
+            if self.mode == 'warn':
+                warnings.warn(message, NPlusOneWarning)
+            else:
+                logger.warning(message)
+
+
+def detect_queries(execute, sql, params, many, context):
+    """Обёртка execute() для всех соединений (core.signals)."""
+    detector = current_detector.get()
+    if detector is not None:
+        detector.add(sql)
+    return execute(sql, params, many, context)
+
+
+def get_mode():
+    mode = settings.N_PLUS_ONE_MODE
+    if mode not in MODES:
+        raise ValueError(
+            f'N_PLUS_ONE_MODE должен быть одним из {MODES}, а не {mode!r}'
+        )
+    return mode
+
+
+@contextmanager
+def detect_n_plus_one(label=None, mode=None):
+    """
+    Отслеживает повторы запросов внутри блока.
+
+    В режиме raise исключение возникает на запросе, который достиг
+    N_PLUS_ONE_THRESHOLD, остальные режимы сообщают при выходе.
+    """
+    mode = mode or get_mode()
+    if mode == 'off':
+        yield None
+        return
+    detector = Detector(mode, settings.N_PLUS_ONE_THRESHOLD)
+    token = current_detector.set(detector)
+    try:
+        yield detector
+    finally:
+        current_detector.reset(token)
+    detector.report(label)
@@ -1,7 +1,105 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class LimitPageNumberPagination (PageNumberPagination):
     page_query_param = 'page'
     page_size_query_param = 'limit'
     max_page_size = 6
+
+
+class KeysetPagination(BasePagination):
+    """
+    Страницы по убыванию (field, pk) без OFFSET и COUNT.
+
+    Курсор — значения ключа последней записи страницы. Страница
+    собирается двумя запросами, каждый из которых начинается с поиска
+    по индексу (field, pk): сначала остаток записей с тем же значением
+    field, затем записи с меньшим. Так глубокие страницы и длинные
+    серии одинаковых значений не сканируются с начала.
+
+    Записи без значения field (нет строки рейтинга) в ленту не входят:
+    NULL нельзя ни сравнить в курсоре, ни упорядочить одинаково
+    во всех СУБД.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = LimitPageNumberPagination.page_size_query_param
+    max_page_size = LimitPageNumberPagination.max_page_size
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, field):
+        self.field = field
+
+    def get_page_size(self, request):
+        size = LimitPageNumberPagination.page_size
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            pass
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            value, pk = urlsafe_b64decode(cursor.encode()).decode().split(':')
+            return float(value), int(pk)
+        except (DecodeError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def encode_cursor(value, pk):
+        return urlsafe_b64encode(f'{value!r}:{pk}'.encode()).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        keys = (
+            queryset.prefetch_related(None)
+            .filter(**{f'{self.field}__isnull': False})
+            .order_by(f'-{self.field}', '-pk')
+            .values_list(self.field, 'pk')
+        )
+        position = self.decode_cursor(request)
+        if position is None:
+            rows = list(keys[:size + 1])
+        else:
+            value, pk = position
+            rows = list(
+                keys.filter(**{self.field: value, 'pk__lt': pk})[:size + 1]
+            )
+            if len(rows) <= size:
+                rows += keys.filter(
+                    **{f'{self.field}__lt': value}
+                )[:size + 1 - len(rows)]
+        self.next_position = rows[size - 1] if len(rows) > size else None
+        rows = rows[:size]
+        objects = queryset.in_bulk([pk for _, pk in rows])
+        return [objects[pk] for _, pk in rows if pk in objects]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor(*self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,199 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from core.nplusone import short_path
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    Profiler = None
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+MEMORY_FLAG = 'memory'
+MEMORY_FRAMES = 25
+MEMORY_TOP = 200
+# Одновременно профилируется один запрос: tracemalloc общий на процесс,
+# а выборки стеков замедляют все потоки
+profile_lock = threading.Lock()
+
+
+def requested_profile(request):
+    """None, 'cpu' или 'memory' по заголовку X-Profile или ?_profile=."""
+    value = request.META.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    if not value or value in ('0', 'false'):
+        return None
+    return 'memory' if value == MEMORY_FLAG else 'cpu'
+
+
+def code_name(code):
+    return (
+        f'{code.co_name} ({short_path(code.co_filename)}:'
+        f'{code.co_firstlineno})'
+    )
+
+
+def stack_codes(frame):
+    """Объекты кода стека от корня: дёшево, имена строятся при выводе."""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(reversed(codes))
+
+
+class StackSampler:
+    """
+    Профилировщик на стандартной библиотеке: отдельный поток раз в
+    interval снимает стек потока запроса через sys._current_frames().
+    """
+
+    engine = 'sampler'
+    extension = 'collapsed'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._thread = threading.Thread(
+            target=self._run, name='request-profiler', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self.stacks[stack_codes(frame)] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def output(self):
+        """Формат collapsed (flamegraph.pl, speedscope)."""
+        names = {}
+        lines = []
+        for codes, count in self.stacks.most_common():
+            stack = ';'.join(
+                names.get(code) or names.setdefault(code, code_name(code))
+                for code in codes
+            )
+            lines.append(f'{stack} {count}\n')
+        return ''.join(lines)
+
+
+class PyinstrumentSampler:
+    """pyinstrument, если установлен: меньше накладных расходов."""
+
+    engine = 'pyinstrument'
+    extension = 'speedscope.json'
+
+    def __init__(self, interval):
+        self.profiler = Profiler(interval=interval, async_mode='enabled')
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.session = self.profiler.stop()
+
+    @property
+    def samples(self):
+        return self.session.sample_count
+
+    def output(self):
+        return self.profiler.output(renderer=SpeedscopeRenderer())
+
+
+def get_sampler():
+    sampler_class = PyinstrumentSampler if Profiler else StackSampler
+    return sampler_class(settings.PROFILE_INTERVAL)
+
+
+def memory_output(snapshot):
+    """Оставшиеся после запроса выделения памяти по стекам, в байтах."""
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ))
+    lines = []
+    for statistic in snapshot.statistics('traceback')[:MEMORY_TOP]:
+        stack = ';'.join(
+            f'{short_path(frame.filename)}:{frame.lineno}'
+            for frame in statistic.traceback
+        )
+        lines.append(f'{stack} {statistic.size}\n')
+    return ''.join(lines)
+
+
+class ProfileResult:
+    def __init__(self, engine):
+        self.engine = engine
+        self.files = {}
+        self.samples = 0
+        self.peak_memory = None
+        self.duration = None
+
+
+def write_file(name, content):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    with open(
+        os.path.join(settings.PROFILE_DIR, name), 'w', encoding='utf-8'
+    ) as file:
+        file.write(content)
+    return name
+
+
+@contextmanager
+def profile(kind):
+    """
+    Профилирует блок; файлы пишутся в PROFILE_DIR после выхода.
+
+    Для асинхронных запросов выборки снимаются с потока цикла событий,
+    поэтому в них попадают и параллельные запросы этого воркера.
+    """
+    sampler = get_sampler()
+    result = ProfileResult(sampler.engine)
+    trace_memory = kind == 'memory' and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start(MEMORY_FRAMES)
+    started = time.perf_counter()
+    sampler.start()
+    try:
+        yield result
+    finally:
+        sampler.stop()
+        result.duration = time.perf_counter() - started
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            result.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    prefix = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    result.samples = sampler.samples
+    result.files['cpu'] = write_file(
+        f'{prefix}.{sampler.extension}', sampler.output()
+    )
+    if trace_memory:
+        result.files['memory'] = write_file(
+            f'{prefix}.memory.collapsed', memory_output(snapshot)
+        )
@@ -0,0 +1,19 @@
+from rest_framework import renderers
+
+from core.timing import timed
+
+
+class TimedRendererMixin:
+    """Время рендеринга попадает в Server-Timing (core.timing)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class JSONRenderer(TimedRendererMixin, renderers.JSONRenderer):
+    pass
+
+
+class BrowsableAPIRenderer(TimedRendererMixin, renderers.BrowsableAPIRenderer):
+    pass
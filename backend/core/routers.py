@@ -0,0 +1,33 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Включается middleware только для безопасных запросов к API,
+# поэтому команды, сигналы и запросы на запись читают с основной БД
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+class ReplicaRouter:
+    """Чтение с реплик в пределах помеченного запроса, запись — в default."""
+
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and read_from_replica.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        if {obj1._state.db, obj2._state.db} <= {
+            'default', *settings.DATABASE_REPLICAS
+        }:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,37 @@
+import unittest
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.test import runner
+
+from core.nplusone import detect_n_plus_one
+
+
+class NPlusOneResultMixin:
+    """Каждый тест — отдельная область поиска повторов запросов."""
+
+    def startTest(self, test):
+        super().startTest(test)
+        self._n_plus_one = ExitStack()
+        self._n_plus_one.enter_context(detect_n_plus_one(test.id()))
+
+    def stopTest(self, test):
+        self._n_plus_one.close()
+        super().stopTest(test)
+
+
+class DiscoverRunner(runner.DiscoverRunner):
+    """Тесты с поиском N+1 в режиме N_PLUS_ONE_TEST_MODE."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._n_plus_one_mode = settings.N_PLUS_ONE_MODE
+        settings.N_PLUS_ONE_MODE = settings.N_PLUS_ONE_TEST_MODE
+
+    def teardown_test_environment(self, **kwargs):
+        settings.N_PLUS_ONE_MODE = self._n_plus_one_mode
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or unittest.TextTestResult
+        return type(base.__name__, (NPlusOneResultMixin, base), {})
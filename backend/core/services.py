@@ -1,21 +1,17 @@
-import random
-import string
-
 from recipes.models import Recipe
-from core.constants import LENGTH_SHORT_CODE
+from core.short_codes import encode_short_code
 
 
 def generate_unique_short_code(recipe: Recipe):
-    """Генерирует уникальный short_code для модели Recipe."""
+    """
+    Присваивает рецепту short_code, если его ещё нет.
+
+    Код вычисляется из id рецепта, поэтому не требует проверок
+    на уникальность и одинаков при параллельных вызовах.
+    """
     if recipe.short_code:
-        return recipe
-    while True:
-        code = ''.join(
-            random.choices(
-                string.ascii_lowercase + string.digits, k=LENGTH_SHORT_CODE
-            )
-        )
-        if not Recipe.objects.filter(short_code=code).exists():
-            recipe.short_code = code
-            recipe.save(update_fields=['short_code'])
-            return
+        return
+    recipe.short_code = encode_short_code(recipe.pk)
+    Recipe.objects.filter(pk=recipe.pk, short_code__isnull=True).update(
+        short_code=recipe.short_code
+    )
@@ -0,0 +1,181 @@
+import zlib
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, models
+
+# Таблицы связей пользователя, которые раскладываются по шардам.
+# Все записи одного пользователя лежат в одном шарде.
+SHARDED_MODELS = ('recipes.Favorite', 'recipes.ShoppingCart',
+                  'users.Subscription')
+USER_LOOKUPS = ('user', 'user_id', 'user__id', 'user__pk')
+
+
+def is_enabled():
+    return bool(settings.RELATION_SHARDS)
+
+
+def is_sharded(model):
+    return is_enabled() and model._meta.label in SHARDED_MODELS
+
+
+def get_sharded_models():
+    return [apps.get_model(label) for label in SHARDED_MODELS]
+
+
+def shard_for_user(user_id):
+    """Псевдоним БД, в которой лежат связи пользователя."""
+    shards = settings.RELATION_SHARDS
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def user_relation_ids(model, user, field):
+    """
+    Значения field из связей пользователя для фильтра field__in.
+
+    Без шардов — подзапрос в той же БД, с шардами — список,
+    прочитанный из шарда пользователя.
+    """
+    queryset = model.objects.filter(user=user).values_list(field, flat=True)
+    return list(queryset) if is_sharded(model) else queryset
+
+
+def user_relation_exists(model, user, field='recipe'):
+    """Аннотация «объект связан с пользователем» для списков."""
+    if not is_sharded(model):
+        return models.Exists(model.objects.filter(
+            user=user, **{field: models.OuterRef('pk')}
+        ))
+    ids = user_relation_ids(model, user, field)
+    if not ids:
+        return models.Value(False, output_field=models.BooleanField())
+    return models.ExpressionWrapper(
+        models.Q(pk__in=ids), output_field=models.BooleanField()
+    )
+
+
+def count_across_shards(model, **filters):
+    """Число записей по всем шардам, например подписчиков автора."""
+    return sum(
+        model.objects.using(alias).filter(**filters).count()
+        for alias in settings.RELATION_SHARDS
+    )
+
+
+def count_grouped(model, field, **filters):
+    """Число записей по значениям field: во всех шардах или в default."""
+    aliases = settings.RELATION_SHARDS if is_sharded(model) else (None,)
+    counts = Counter()
+    for alias in aliases:
+        counts.update(dict(
+            model.objects.using(alias).filter(**filters).order_by()
+            .values_list(field).annotate(count=models.Count('pk'))
+        ))
+    return counts
+
+
+def delete_across_shards(model, **filters):
+    for alias in settings.RELATION_SHARDS:
+        model.objects.using(alias).filter(**filters).delete()
+
+
+def bulk_create(model, objs, **kwargs):
+    """bulk_create, раскладывающий объекты по шардам пользователей."""
+    if not is_sharded(model):
+        return model.objects.bulk_create(objs, **kwargs)
+    by_shard = defaultdict(list)
+    for obj in objs:
+        by_shard[shard_for_user(obj.user_id)].append(obj)
+    for alias, shard_objs in by_shard.items():
+        model.objects.using(alias).bulk_create(shard_objs, **kwargs)
+    return objs
+
+
+def create_shard_tables(alias):
+    """
+    Создаёт в шарде недостающие таблицы связей.
+
+    Пользователи и рецепты в шарде отсутствуют, поэтому внешние ключи
+    создаются без ограничений БД; целостность при удалении
+    поддерживают сигналы (core.signals).
+    """
+    connection = connections[alias]
+    existing = set(connection.introspection.table_names())
+    created = []
+    for model in get_sharded_models():
+        if model._meta.db_table in existing:
+            continue
+        foreign_keys = [
+            field for field in model._meta.local_fields
+            if field.remote_field and field.db_constraint
+        ]
+        for field in foreign_keys:
+            field.db_constraint = False
+        try:
+            with connection.schema_editor() as editor:
+                editor.create_model(model)
+        finally:
+            for field in foreign_keys:
+                field.db_constraint = True
+        created.append(model._meta.db_table)
+    return created
+
+
+class ShardedQuerySet(models.QuerySet):
+    """
+    Выборка, которая сама уходит в шард, если отфильтрована по user.
+
+    Так код представлений и сериализаторов с filter(user=...) и
+    create(user=...) работает без изменений. Явный using()
+    не переопределяется.
+    """
+
+    def _route(self, kwargs):
+        if not is_sharded(self.model) or self._db is not None:
+            return self
+        for lookup in USER_LOOKUPS:
+            if lookup in kwargs:
+                user = kwargs[lookup]
+                return self.using(shard_for_user(getattr(user, 'pk', user)))
+        return self
+
+    def filter(self, *args, **kwargs):
+        return super(ShardedQuerySet, self._route(kwargs)).filter(
+            *args, **kwargs
+        )
+
+    def create(self, **kwargs):
+        return super(ShardedQuerySet, self._route(kwargs)).create(**kwargs)
+
+
+ShardedManager = models.Manager.from_queryset(ShardedQuerySet)
+
+
+class ShardRouter:
+    """Связи пользователя пишутся и читаются в его шарде."""
+
+    def _shard(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is None or not is_sharded(type(instance)):
+            return None
+        if isinstance(instance, model):
+            return shard_for_user(instance.user_id)
+        # Пользователь или рецепт записи шарда: без подсказки Django
+        # искал бы их в БД самой записи
+        return 'default'
+
+    db_for_read = _shard
+    db_for_write = _shard
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Пользователь и рецепт из default связываются с записью шарда
+        if is_sharded(type(obj1)) or is_sharded(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему шардов создаёт rebalance_shards (create_shard_tables)
+        if db in settings.RELATION_SHARDS:
+            return False
+        return None
@@ -0,0 +1,28 @@
+from core.constants import LENGTH_SHORT_CODE, SHORT_CODE_ALPHABET
+
+BASE = len(SHORT_CODE_ALPHABET)
+# Количество кодов длиной до LENGTH_SHORT_CODE включительно: их занимают
+# случайные коды старого формата, новые коды всегда длиннее.
+OFFSET = sum(BASE ** length for length in range(1, LENGTH_SHORT_CODE + 1))
+
+
+def encode_short_code(recipe_id: int) -> str:
+    """Биективно кодирует id рецепта в короткий код."""
+    number = recipe_id + OFFSET
+    chars = []
+    while number:
+        number, remainder = divmod(number - 1, BASE)
+        chars.append(SHORT_CODE_ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def decode_short_code(code: str):
+    """Возвращает id рецепта по коду или None для чужих и старых кодов."""
+    number = 0
+    for char in code:
+        index = SHORT_CODE_ALPHABET.find(char)
+        if index < 0:
+            return None
+        number = number * BASE + index + 1
+    recipe_id = number - OFFSET
+    return recipe_id if recipe_id > 0 else None
@@ -0,0 +1,165 @@
+import os
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core import sharding
+from core.cache import invalidate
+from core.models import RequestProfile
+from core.nplusone import detect_queries
+from core.timing import record_query
+from recipes.models import (
+    Favorite, Ingredient, IngredientInRecipe, Recipe, RecipeActivity,
+    RecipeChange, RecipeRanking, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+# Действия с рецептами для update_rankings
+ACTIVITY_KINDS = {
+    Favorite: RecipeActivity.FAVORITE,
+    ShoppingCart: RecipeActivity.SHOPPING_CART,
+}
+
+# Поля пользователя, которые видны в публичных ответах
+USER_PUBLIC_FIELDS = frozenset(
+    ('email', 'username', 'first_name', 'last_name', 'avatar')
+)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Сигнал приходит при каждом переподключении одного и того же объекта
+    for wrapper in (record_query, detect_queries):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+def recipes_changed(*recipe_ids):
+    """
+    Сброс кеша ответов и запись в журнал после фиксации транзакции.
+
+    Иначе параллельный запрос успеет закешировать старые данные под
+    новой версией, а при откате останется запись о несостоявшемся
+    изменении.
+    """
+    def record():
+        invalidate(
+            'recipe_list', *(f'recipe:{recipe_id}' for recipe_id in recipe_ids)
+        )
+        RecipeChange.record(*recipe_ids)
+
+    if recipe_ids:
+        transaction.on_commit(record)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    recipes_changed(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_ranking(sender, instance, created, **kwargs):
+    # Лента по рейтингу соединяется с RecipeRanking: строка нужна сразу
+    if created:
+        RecipeRanking.objects.create(recipe=instance)
+
+
+def record_activity(sender, instance, delta):
+    RecipeActivity.objects.create(
+        recipe_id=instance.recipe_id,
+        kind=ACTIVITY_KINDS[sender],
+        delta=delta
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def record_recipe_added(sender, instance, created, **kwargs):
+    if created:
+        record_activity(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def record_recipe_removed(sender, instance, **kwargs):
+    record_activity(sender, instance, -1)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_recipe_ingredient(sender, instance, **kwargs):
+    recipes_changed(instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if reverse and action == 'pre_clear':
+        # После clear() со стороны тега pk_set пуст: рецепты читаем до
+        recipes_changed(*sender.objects.filter(
+            tag_id=instance.pk
+        ).values_list('recipe_id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recipes_changed(instance.pk)
+        elif action != 'post_clear':
+            # Изменение со стороны тега: pk_set — id рецептов
+            recipes_changed(*pk_set)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag(sender, **kwargs):
+    # Теги встроены во все ответы с рецептами; по версии tags
+    # снимки core.catalog перечитываются во всех процессах
+    transaction.on_commit(
+        lambda: invalidate('tags', 'recipe_list', 'recipe_detail')
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient(sender, **kwargs):
+    transaction.on_commit(lambda: invalidate('ingredients'))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user(sender, instance, update_fields=None, **kwargs):
+    # Например, обновление last_login при входе ничего не меняет
+    if update_fields is not None and not (
+        USER_PUBLIC_FIELDS & set(update_fields)
+    ):
+        return
+    groups = [f'user:{instance.pk}']
+    recipe_ids = list(
+        Recipe.objects.filter(author_id=instance.pk)
+        .values_list('id', flat=True)
+    )
+    if recipe_ids:
+        groups.append('recipe_list')
+        groups.extend(f'recipe:{recipe_id}' for recipe_id in recipe_ids)
+    transaction.on_commit(lambda: invalidate(*groups))
+
+
+# Внешние ключи в шардах без ограничений БД, каскад выполняем сами
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_relations(sender, instance, **kwargs):
+    if sharding.is_enabled():
+        for model in (Favorite, ShoppingCart):
+            sharding.delete_across_shards(model, recipe_id=instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def delete_user_relations(sender, instance, **kwargs):
+    if not sharding.is_enabled():
+        return
+    for model in (Favorite, ShoppingCart, Subscription):
+        model.objects.filter(user_id=instance.pk).delete()
+    sharding.delete_across_shards(Subscription, author_id=instance.pk)
+
+
+@receiver(post_delete, sender=RequestProfile)
+def delete_profile_files(sender, instance, **kwargs):
+    for kind in ('cpu', 'memory'):
+        filename = instance.file_path(kind)
+        if filename and os.path.exists(filename):
+            os.remove(filename)
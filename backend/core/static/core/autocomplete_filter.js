@@ -0,0 +1,17 @@
+'use strict';
+{
+    const $ = django.jQuery;
+
+    // Выбор значения в фильтре перезагружает changelist с новым параметром
+    $(function() {
+        $('.autocomplete-filter').on('change', function() {
+            const params = new URLSearchParams(window.location.search);
+            params.delete(this.dataset.lookupKwarg);
+            params.delete('p');
+            if (this.value) {
+                params.set(this.dataset.lookupKwarg, this.value);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
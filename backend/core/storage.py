@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+
+from functools import partial
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils.deconstruct import deconstructible
+
+from core.constants import HASH_DIR_PREFIX_LENGTH
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, именующее файлы по sha256 их содержимого.
+
+    Одинаковые файлы записываются на диск один раз, запись выполняется
+    через временный файл и атомарное переименование. Файл удаляется,
+    только когда на него не ссылается ни одно из полей reference_fields.
+    """
+
+    # (модель, поле) — все места, где может храниться имя файла
+    reference_fields = (
+        ('recipes.Recipe', 'image'),
+        ('users.User', 'avatar'),
+    )
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save, подбирать свободное не нужно
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=full_directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = os.path.join(
+                directory,
+                hexdigest[:HASH_DIR_PREFIX_LENGTH],
+                hexdigest + extension
+            )
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # Такой файл уже есть — повторно не пишем
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(tmp_path, self.file_permissions_mode)
+                os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name.replace('\\', '/')
+
+    def references(self, name):
+        """Количество записей в БД, ссылающихся на файл."""
+        return sum(
+            apps.get_model(model).objects.filter(**{field: name}).count()
+            for model, field in self.reference_fields
+        )
+
+    def delete(self, name):
+        if name and not self.references(name):
+            super().delete(name)
+
+
+def connect_file_cleanup(model, field_name):
+    """
+    Удаляет файл, когда запись перестаёт на него ссылаться:
+    при замене файла в поле и при удалении записи.
+
+    Удаление откладывается до фиксации транзакции: при откате запись
+    снова ссылается на файл, а ссылки пересчитываются уже по
+    зафиксированным данным.
+    """
+    field = model._meta.get_field(field_name)
+    if not isinstance(field.storage, ContentAddressedStorage):
+        # Обычное хранилище не считает ссылки — файлы не трогаем
+        return
+    dispatch_uid = f'file_cleanup_{model._meta.label}_{field_name}'
+
+    def remember_replaced(sender, instance, update_fields=None, **kwargs):
+        if instance.pk is None or (
+            update_fields is not None and field_name not in update_fields
+        ):
+            return
+        old_name = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list(field_name, flat=True).first()
+        )
+        if old_name and old_name != getattr(instance, field_name).name:
+            instance._replaced_file = old_name
+
+    def release(name, using):
+        if name:
+            transaction.on_commit(
+                partial(field.storage.delete, name), using=using
+            )
+
+    def release_replaced(sender, instance, using, **kwargs):
+        old_name = instance.__dict__.pop('_replaced_file', None)
+        # Повторно загруженный тот же файл получает то же имя
+        if old_name and old_name != getattr(instance, field_name).name:
+            release(old_name, using)
+
+    def release_deleted(sender, instance, using, **kwargs):
+        release(getattr(instance, field_name).name, using)
+
+    pre_save.connect(
+        remember_replaced, sender=model, weak=False, dispatch_uid=dispatch_uid
+    )
+    post_save.connect(
+        release_replaced, sender=model, weak=False, dispatch_uid=dispatch_uid
+    )
+    post_delete.connect(
+        release_deleted, sender=model, weak=False, dispatch_uid=dispatch_uid
+    )
@@ -0,0 +1,1255 @@
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import tempfile
+import random
+import threading
+import time
+import tracemalloc
+import unittest
+import zlib
+from array import array
+from unittest import mock
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import (
+    close_old_connections, connection, connections, transaction
+)
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import psycopg2
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import sharding
+from core.backends.postgresql import pool as pool_module
+from core.backends.postgresql.base import DatabaseWrapper
+from core.cache import get_versions
+from core import metrics, profiling, warmup
+from core.checks import check_cache_invalidation, check_replica_stickiness
+from core.constants import LENGTH_SHORT_CODE, SHORT_CODE_ALPHABET
+from core.ingredient_index import IngredientIndex, Ranking, build_snapshot
+from core.management.commands.startup_profile import (
+    Command as StartupProfileCommand
+)
+from core.middleware import (
+    STICKY_COOKIE, AnonymousResponseCacheMiddleware, ReplicaRoutingMiddleware
+)
+from core.models import RequestProfile
+from core.nplusone import NPlusOneError, detect_n_plus_one
+from core.routers import ReplicaRouter
+from core.runner import DiscoverRunner
+from core.short_codes import decode_short_code, encode_short_code
+from core.timing import RequestStats
+from recipes.models import (
+    Favorite, Ingredient, IngredientInRecipe, Recipe, RecipeChange,
+    ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+
+class RunnerTests(TestCase):
+    """Тесты под core.runner.DiscoverRunner ищут N+1."""
+
+    def test_mode_for_tests(self):
+        self.assertEqual(
+            settings.N_PLUS_ONE_MODE, settings.N_PLUS_ONE_TEST_MODE
+        )
+
+    def test_repeated_queries_fail_test(self):
+        if settings.N_PLUS_ONE_TEST_MODE != 'raise':
+            self.skipTest('N_PLUS_ONE_TEST_MODE не raise')
+
+        class RepeatedQueries(unittest.TestCase):
+            def test_n_plus_one(self):
+                for tag_id in range(settings.N_PLUS_ONE_THRESHOLD):
+                    Tag.objects.filter(pk=tag_id).exists()
+
+        result = DiscoverRunner().get_resultclass()(
+            unittest.runner._WritelnDecorator(io.StringIO()),
+            descriptions=False, verbosity=0
+        )
+        RepeatedQueries('test_n_plus_one').run(result)
+        self.assertEqual(len(result.errors), 1)
+        self.assertIn(NPlusOneError.__name__, result.errors[0][1])
+
+
+class IngredientIndexTests(TestCase):
+    """Индекс «ингредиент → рецепты» дочитывает журнал изменений."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+
+    def create_recipe(self, name):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=self.ingredient, amount=1
+        )
+        return recipe
+
+    def found(self, index):
+        ranking = index.search([self.ingredient.id])
+        return {recipe_id for recipe_id, _, _ in ranking[:len(ranking)]}
+
+    def test_change_committed_out_of_order(self):
+        first = self.create_recipe('Первый')
+        last = RecipeChange.objects.create(recipe_id=first.id).id
+        index = IngredientIndex()
+        index.refresh()
+        self.assertEqual(self.found(index), {first.id})
+        second = self.create_recipe('Второй')
+        # Транзакция с номером last + 1 ещё не зафиксирована
+        RecipeChange.objects.create(id=last + 2, recipe_id=second.id)
+        index.refresh()
+        self.assertEqual(self.found(index), {first.id, second.id})
+        third = self.create_recipe('Третий')
+        RecipeChange.objects.create(id=last + 1, recipe_id=third.id)
+        index.refresh()
+        self.assertEqual(
+            self.found(index), {first.id, second.id, third.id}
+        )
+
+    def test_search_keeps_its_snapshot(self):
+        first = self.create_recipe('Первый')
+        index = IngredientIndex()
+        index.refresh()
+        ranking = index.search([self.ingredient.id])
+        second = self.create_recipe('Второй')
+        RecipeChange.objects.create(recipe_id=second.id)
+        index.refresh()
+        self.assertEqual(ranking[:2], [(first.id, 1, 1)])
+        self.assertEqual(self.found(index), {first.id, second.id})
+
+
+class RankingTests(unittest.TestCase):
+    """Отсечение по верхней границе не меняет порядок рецептов."""
+
+    def setUp(self):
+        generator = random.Random(46)
+        self.recipes = {
+            recipe_id: (
+                array('q', sorted(generator.sample(
+                    range(1, 40), generator.randint(1, 12)
+                ))),
+                generator.randint(5, 120),
+                array('q', sorted(generator.sample(range(1, 5), 1)))
+            )
+            for recipe_id in range(1, 1500)
+        }
+        self.snapshot = build_snapshot(self.recipes)
+        self.generator = generator
+
+    def expected(self, ingredient_ids, tag_ids, max_cooking_time):
+        keys = []
+        for recipe_id, (ingredients, cooking_time, tags) in (
+            self.recipes.items()
+        ):
+            matched = len(set(ingredients) & set(ingredient_ids))
+            if not matched or tag_ids and set(tags).isdisjoint(tag_ids):
+                continue
+            if max_cooking_time and cooking_time > max_cooking_time:
+                continue
+            keys.append((matched / len(ingredients), matched, recipe_id))
+        return [
+            (recipe_id, matched, len(self.recipes[recipe_id][0]))
+            for _, matched, recipe_id in sorted(keys, reverse=True)
+        ]
+
+    def test_pages_match_full_sort(self):
+        for _ in range(50):
+            query = (
+                self.generator.sample(
+                    range(1, 45), self.generator.randint(1, 15)
+                ),
+                self.generator.choice((None, {1}, {2, 3})),
+                self.generator.choice((None, 30, 90)),
+            )
+            expected = self.expected(*query)
+            ranking = Ranking(self.snapshot, *query)
+            self.assertEqual(len(ranking), len(expected))
+            for start in (0, 6, 60):
+                self.assertEqual(
+                    ranking[start:start + 6], expected[start:start + 6]
+                )
+
+
+class ShortCodeTests(TestCase):
+    """Короткие коды выводятся из id и не пересекаются со старыми."""
+
+    def test_round_trip(self):
+        codes = set()
+        for recipe_id in itertools.chain(range(1, 5000), (10 ** 12,)):
+            code = encode_short_code(recipe_id)
+            self.assertGreater(len(code), LENGTH_SHORT_CODE)
+            self.assertEqual(decode_short_code(code), recipe_id)
+            codes.add(code)
+        self.assertEqual(len(codes), 5000)
+
+    def test_legacy_codes_are_not_decoded(self):
+        for length in range(1, LENGTH_SHORT_CODE + 1):
+            for chars in itertools.product(SHORT_CODE_ALPHABET, repeat=length):
+                self.assertIsNone(decode_short_code(''.join(chars)))
+        self.assertIsNone(decode_short_code('ABCD'))
+
+
+class ShortLinkRedirectTests(TestCase):
+    """/s/<код>/: новые коды без БД, старые — по таблице рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+        cls.legacy = Recipe.objects.create(
+            author=author, name='Старый', text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+        Recipe.objects.filter(pk=cls.legacy.pk).update(short_code='ab1')
+
+    def test_new_code_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/s/{self.recipe.short_code}/')
+        self.assertRedirects(
+            response, f'/recipes/{self.recipe.id}', status_code=301,
+            fetch_redirect_response=False
+        )
+
+    def test_legacy_code(self):
+        response = self.client.get('/s/ab1/')
+        self.assertRedirects(
+            response, f'/recipes/{self.legacy.id}', status_code=301,
+            fetch_redirect_response=False
+        )
+        self.assertEqual(self.client.get('/s/zz9/').status_code, 404)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    """Чтения API — с реплик, после записи клиент закреплён за default."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+        def get_response(request):
+            # База, которую роутер выбрал бы для чтения в этом запросе
+            response = HttpResponse()
+            response.database = (
+                ReplicaRouter().db_for_read(Recipe) or 'default'
+            )
+            return response
+
+        self.middleware = ReplicaRoutingMiddleware(get_response)
+
+    def database(self, method, path, **extra):
+        request = getattr(self.factory, method)(path, **extra)
+        return self.middleware(request)
+
+    def test_safe_api_reads(self):
+        self.assertEqual(
+            self.database('get', '/api/recipes/').database, 'replica'
+        )
+        self.assertEqual(self.database('get', '/admin/').database, 'default')
+        self.assertEqual(
+            self.database('post', '/api/recipes/').database, 'default'
+        )
+
+    def test_token_client_sticks_after_write(self):
+        token = {'HTTP_AUTHORIZATION': 'Token first'}
+        response = self.database('post', '/api/recipes/', **token)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(
+            self.database('get', '/api/recipes/', **token).database,
+            'default'
+        )
+        other = {'HTTP_AUTHORIZATION': 'Token second'}
+        self.assertEqual(
+            self.database('get', '/api/recipes/', **other).database,
+            'replica'
+        )
+
+    def test_browser_sticks_by_cookie(self):
+        self.factory.cookies[STICKY_COOKIE] = '1'
+        self.assertEqual(
+            self.database('get', '/api/recipes/').database, 'default'
+        )
+
+    @override_settings(GUNICORN_WORKERS=2)
+    def test_process_local_cache_disables_replicas(self):
+        self.assertEqual(
+            [error.id for error in check_replica_stickiness(None)],
+            ['core.E001']
+        )
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaRoutingMiddleware(lambda request: HttpResponse())
+
+
+class CacheInvalidationTests(TestCase):
+    """Сигналы меняют версии своих групп после фиксации."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+
+    def groups(self):
+        return (
+            'recipe_list', 'recipe_detail', f'recipe:{self.recipe.id}',
+            'tags', 'ingredients', f'user:{self.author.id}',
+        )
+
+    def invalidated(self, action):
+        """Группы, версии которых сменились после фиксации action."""
+        groups = self.groups()
+        before = get_versions(groups)
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+            # До фиксации версии прежние
+            self.assertEqual(get_versions(groups), before)
+        return {
+            group for group, old, new
+            in zip(groups, before, get_versions(groups)) if old != new
+        }
+
+    def test_recipe_changes(self):
+        recipe_groups = {'recipe_list', f'recipe:{self.recipe.id}'}
+        self.assertEqual(self.invalidated(self.recipe.save), recipe_groups)
+        self.assertEqual(
+            self.invalidated(lambda: IngredientInRecipe.objects.create(
+                recipe=self.recipe, ingredient=self.ingredient, amount=1
+            )),
+            recipe_groups
+        )
+        self.assertEqual(
+            self.invalidated(lambda: self.recipe.tags.add(self.tag)),
+            recipe_groups
+        )
+        # Со стороны тега после clear() id рецептов уже не прочитать
+        self.assertEqual(
+            self.invalidated(self.tag.recipe_set.clear), recipe_groups
+        )
+
+    def test_catalog_changes(self):
+        self.assertEqual(
+            self.invalidated(self.tag.save),
+            {'tags', 'recipe_list', 'recipe_detail'}
+        )
+        self.assertEqual(
+            self.invalidated(self.ingredient.save), {'ingredients'}
+        )
+
+    def test_user_changes(self):
+        self.assertEqual(
+            self.invalidated(
+                lambda: self.author.save(update_fields=('last_login',))
+            ),
+            set()
+        )
+        self.author.first_name = 'Другое'
+        self.assertEqual(
+            self.invalidated(self.author.save),
+            {f'user:{self.author.id}', 'recipe_list',
+             f'recipe:{self.recipe.id}'}
+        )
+
+    def test_rollback_keeps_versions(self):
+        def rolled_back():
+            with transaction.atomic():
+                self.recipe.save()
+                transaction.set_rollback(True)
+
+        self.assertEqual(self.invalidated(rolled_back), set())
+
+    def test_anonymous_response_cache(self):
+        self.assertEqual(self.client.get('/api/tags/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/tags/')['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Ужин', slug='dinner')
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+
+    @override_settings(GUNICORN_WORKERS=2)
+    def test_process_local_cache_disables_response_cache(self):
+        self.assertEqual(
+            [warning.id for warning in check_cache_invalidation(None)],
+            ['core.W001']
+        )
+        with self.assertRaises(MiddlewareNotUsed):
+            AnonymousResponseCacheMiddleware(lambda request: HttpResponse())
+
+
+class ServerTimingTests(TestCase):
+    """Server-Timing: сериализаторы отдельно от рендеринга и БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='staff@example.com', username='staff', first_name='Кто',
+            last_name='То', password='password', is_staff=True
+        )
+        Tag.objects.create(name='Обед', slug='lunch')
+
+    def test_serializer_metric(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.get('/api/tags/')
+        metrics = [
+            part.split(';')[0]
+            for part in response['Server-Timing'].split(', ')
+        ]
+        self.assertEqual(
+            metrics[:5], ['db', 'serializer', 'render', 'app', 'total']
+        )
+
+    def test_stage_excludes_database_time(self):
+        stats = RequestStats()
+        with stats.timer('serializer'):
+            # Запрос из ленивого поля уже учтён в db_time
+            time.sleep(0.05)
+            stats.add_query('default', 'SELECT 1', (), 0.05)
+        self.assertLess(stats.timings['serializer'], 0.02)
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Файлы по хешу содержимого: одна копия, удаление по ссылкам."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+
+    def save(self, content, name='images/photo.PNG'):
+        return default_storage.save(name, ContentFile(content))
+
+    def create_recipe(self, image):
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image=image
+        )
+
+    def test_same_content_is_stored_once(self):
+        name = self.save(b'photo')
+        digest = hashlib.sha256(b'photo').hexdigest()
+        self.assertEqual(name, f'images/{digest[:2]}/{digest}.png')
+        self.assertEqual(self.save(b'photo', 'images/other.png'), name)
+        self.assertEqual(
+            os.listdir(os.path.dirname(default_storage.path(name))),
+            [os.path.basename(name)]
+        )
+
+    def test_file_deleted_after_last_reference(self):
+        name = self.save(b'photo')
+        first, second = self.create_recipe(name), self.create_recipe(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_replaced_file_deleted_on_commit(self):
+        old, new = self.save(b'old'), self.save(b'new')
+        recipe = self.create_recipe(old)
+        with self.captureOnCommitCallbacks() as callbacks:
+            recipe.image = new
+            recipe.save()
+        # До фиксации файл на месте
+        self.assertTrue(default_storage.exists(old))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(new))
+
+    def test_rollback_keeps_file(self):
+        name = self.save(b'photo')
+        recipe = self.create_recipe(name)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                recipe.delete()
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertTrue(default_storage.exists(name))
+
+
+class AdminChangelistTests(TestCase):
+    """Changelist админки: запросы не растут с числом строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            email='admin@example.com', username='admin', first_name='Админ',
+            last_name='Сайта', password='password', is_staff=True,
+            is_superuser=True
+        )
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for number in range(3)
+        ]
+        cls.tag = Tag.objects.create(name='Обед', slug='lunch')
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        cls.recipes = [cls.create_recipe(number) for number in range(3)]
+        # Избранное: у рецепта number — number добавлений
+        for number, recipe in enumerate(cls.recipes):
+            for user in cls.users[:number]:
+                Favorite.objects.create(user=user, recipe=recipe)
+        Subscription.objects.create(user=cls.users[0], author=cls.users[1])
+        Subscription.objects.create(user=cls.users[2], author=cls.users[1])
+
+    @classmethod
+    def create_recipe(cls, number):
+        recipe = Recipe.objects.create(
+            author=cls.users[0], name=f'Рецепт {number}', text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+        Recipe.tags.through.objects.create(recipe=recipe, tag=cls.tag)
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=cls.ingredient, amount=1
+        )
+        return recipe
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def changelist(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'], [
+            query['sql'] for query in queries.captured_queries
+        ]
+
+    def test_recipe_queries_do_not_grow_with_rows(self):
+        _, before = self.changelist('/admin/recipes/recipe/')
+        for number in range(3, 6):
+            self.create_recipe(number)
+        changelist, after = self.changelist('/admin/recipes/recipe/')
+        self.assertEqual(changelist.result_count, 6)
+        self.assertEqual(len(after), len(before))
+
+    def test_recipe_favorites_count_is_sortable(self):
+        position = admin.site._registry[Recipe].list_display.index(
+            'favorites_count'
+        ) + 1
+        changelist, _ = self.changelist(
+            f'/admin/recipes/recipe/?o=-{position}'
+        )
+        self.assertEqual(
+            [
+                (recipe.name, recipe.favorites_count)
+                for recipe in changelist.result_list
+            ],
+            [('Рецепт 2', 2), ('Рецепт 1', 1), ('Рецепт 0', 0)]
+        )
+
+    def test_user_counts(self):
+        changelist, _ = self.changelist('/admin/users/user/')
+        counts = {
+            user.username: (
+                user.recipes_count, user.subscriptions_to_author_count
+            )
+            for user in changelist.result_list
+        }
+        self.assertEqual(counts['user0'], (3, 0))
+        # Подписчики автора, а не его собственные подписки
+        self.assertEqual(counts['user1'], (0, 2))
+
+    def test_filtered_changelist_counts_once(self):
+        user = self.users[0]
+        changelist, queries = self.changelist(
+            f'/admin/recipes/favorite/?user__id__exact={user.id}'
+        )
+        self.assertEqual(changelist.result_count, 2)
+        self.assertEqual(
+            sum('COUNT(' in query.upper() for query in queries), 1
+        )
+        [user_filter] = changelist.filter_specs
+        # Фильтр перечисляет только выбранного пользователя
+        self.assertEqual(user_filter.lookup_choices, [(user.id, str(user))])
+        changelist, _ = self.changelist('/admin/recipes/favorite/')
+        self.assertEqual(changelist.filter_specs[0].lookup_choices, [])
+
+
+class FakeConnection:
+    """Соединение psycopg2 без сервера: статус транзакции и SELECT 1."""
+
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, sql):
+                if not connection.alive:
+                    raise psycopg2.OperationalError('server closed')
+
+        return Cursor()
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    """Пул соединений процесса на поддельных соединениях."""
+
+    def pool(self, **options):
+        return pool_module.ConnectionPool(**{
+            'max_size': 2, 'timeout': 0.05, 'max_lifetime': 60,
+            'check_interval': 30, **options,
+        })
+
+    def test_returned_connection_is_reused(self):
+        pool = self.pool()
+        first = pool.getconn(FakeConnection)
+        second = pool.getconn(FakeConnection)
+        pool.putconn(first)
+        pool.putconn(second)
+        # Последнее возвращённое выдаётся первым
+        self.assertIs(pool.getconn(FakeConnection), second)
+        self.assertIs(pool.getconn(FakeConnection), first)
+
+    def test_checkout_waits_for_free_connection(self):
+        pool = self.pool(max_size=1, timeout=5)
+        connection = pool.getconn(FakeConnection)
+        timer = threading.Timer(0.05, pool.putconn, (connection,))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertIs(pool.getconn(FakeConnection), connection)
+
+    def test_checkout_timeout(self):
+        pool = self.pool(max_size=1)
+        pool.getconn(FakeConnection)
+        with self.assertRaises(pool_module.PoolTimeout):
+            pool.getconn(FakeConnection)
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.pool(max_size=1)
+
+        def refuse():
+            raise psycopg2.OperationalError('refused')
+
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.getconn(refuse)
+        self.assertIsInstance(pool.getconn(FakeConnection), FakeConnection)
+
+    def test_idle_connection_is_checked(self):
+        pool = self.pool(max_size=1, check_interval=0)
+        dead = pool.getconn(FakeConnection)
+        pool.putconn(dead)
+        dead.alive = False
+        fresh = pool.getconn(FakeConnection)
+        self.assertIsNot(fresh, dead)
+        self.assertTrue(dead.closed)
+
+    def test_old_connection_is_recycled(self):
+        pool = self.pool(max_size=1, max_lifetime=0)
+        connection = pool.getconn(FakeConnection)
+        pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.getconn(FakeConnection), connection)
+
+    def test_returned_connection_is_rolled_back(self):
+        pool = self.pool(max_size=1)
+        connection = pool.getconn(FakeConnection)
+        connection.status = TRANSACTION_STATUS_INTRANS
+        pool.putconn(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(pool.getconn(FakeConnection), connection)
+
+    def test_pool_per_process(self):
+        settings_dict = {
+            'NAME': 'foodgram', 'USER': 'foodgram', 'HOST': 'db',
+            'PORT': '5432', 'POOL': {
+                'MAX_SIZE': 2, 'TIMEOUT': 1, 'MAX_LIFETIME': 60,
+                'CHECK_INTERVAL': 30,
+            },
+        }
+        self.addCleanup(pool_module._pools.clear)
+        pool = pool_module.get_pool('default', settings_dict)
+        self.assertIs(pool_module.get_pool('default', settings_dict), pool)
+        with mock.patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(
+                pool_module.get_pool('default', settings_dict), pool
+            )
+
+    def test_health_check_once_per_request(self):
+        wrapper = DatabaseWrapper({
+            **settings.DATABASES['default'], 'POOL': None,
+            'CONN_HEALTH_CHECKS': True,
+        }, alias='health')
+        wrapper.connection = FakeConnection()
+        with mock.patch.object(
+            wrapper, 'is_usable', return_value=False
+        ) as is_usable, mock.patch.object(wrapper, 'connect') as connect:
+            wrapper.ensure_connection()
+            # Сломанное соединение закрыто и открывается заново
+            connect.assert_called_once()
+            wrapper.connection = FakeConnection()
+            wrapper.ensure_connection()
+            self.assertEqual(is_usable.call_count, 1)
+            # Граница HTTP-запроса: close_if_unusable_or_obsolete
+            wrapper.health_check_done = False
+            wrapper.ensure_connection()
+            self.assertEqual(is_usable.call_count, 2)
+
+
+SHARDS = ['shard_0', 'shard_1']
+
+
+@override_settings(RELATION_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    """Связи пользователя в шардах: маршрутизация, API и rebalance_shards."""
+
+    # Шарды регистрируются в setUpClass, после подготовки тестовых БД:
+    # '__all__' раскрывается уже с ними
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Шарды — отдельные SQLite в памяти; таблицы создаются до
+        # транзакции теста, как это делает rebalance_shards
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'
+            }
+            sharding.create_shard_tables(alias)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия', password='password'
+            )
+            for number in range(4)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.users[0], name=f'Рецепт {number}',
+                text='Описание', cooking_time=10, image='images/seed.png'
+            )
+            for number in range(2)
+        ]
+
+    def rows(self, model, alias):
+        # Проверки раскладки читают каждую БД много раз
+        with detect_n_plus_one('rows'):
+            return set(
+                model.objects.using(alias)
+                .values_list('user_id', 'recipe_id')
+            )
+
+    def expected_shards(self, pairs):
+        """Раскладка пар (user_id, recipe_id) по шардам пользователей."""
+        shards = {alias: set() for alias in SHARDS}
+        for user_id, recipe_id in pairs:
+            shards[sharding.shard_for_user(user_id)].add((user_id, recipe_id))
+        return shards
+
+    def test_users_spread_over_shards(self):
+        shards = [sharding.shard_for_user(user_id) for user_id in range(100)]
+        self.assertEqual(set(shards), set(SHARDS))
+        # Раскладка не зависит от процесса (не hash() со случайной солью)
+        self.assertEqual(shards[:4], [
+            SHARDS[zlib.crc32(str(user_id).encode()) % 2]
+            for user_id in range(4)
+        ])
+
+    def test_relations_live_in_user_shard(self):
+        pairs = set()
+        for user in self.users:
+            Favorite.objects.create(user=user, recipe=self.recipes[0])
+            pairs.add((user.id, self.recipes[0].id))
+        self.assertEqual(
+            {alias: self.rows(Favorite, alias) for alias in SHARDS},
+            self.expected_shards(pairs)
+        )
+        self.assertFalse(Favorite.objects.using('default').exists())
+        # Выборки по пользователю сами уходят в его шард
+        self.assertEqual(
+            Favorite.objects.filter(user=self.users[1]).get().recipe_id,
+            self.recipes[0].id
+        )
+        self.assertEqual(
+            Favorite.objects.filter(user_id=self.users[2].id).count(), 1
+        )
+
+    def test_api_flags_and_filters(self):
+        user = self.users[1]
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post(f'/api/recipes/{self.recipes[1].id}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.rows(Favorite, sharding.shard_for_user(user.id)),
+            {(user.id, self.recipes[1].id)}
+        )
+        flags = {
+            recipe['id']: recipe['is_favorited'] for recipe in
+            client.get('/api/recipes/').json()['results']
+        }
+        self.assertEqual(
+            flags, {self.recipes[0].id: False, self.recipes[1].id: True}
+        )
+        favorited = client.get('/api/recipes/?is_favorited=1').json()
+        self.assertEqual(
+            [recipe['id'] for recipe in favorited['results']],
+            [self.recipes[1].id]
+        )
+        response = client.delete(
+            f'/api/recipes/{self.recipes[1].id}/favorite/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Favorite.objects.filter(user=user).exists())
+
+    def test_subscriptions_across_shards(self):
+        author = self.users[0]
+        sharding.bulk_create(Subscription, [
+            Subscription(user=user, author=author) for user in self.users[1:3]
+        ])
+        client = APIClient()
+        client.force_authenticate(self.users[2])
+        response = client.get('/api/users/subscriptions/')
+        self.assertEqual(
+            [user['id'] for user in response.json()['results']], [author.id]
+        )
+        self.assertEqual(
+            sharding.count_across_shards(Subscription, author=author), 2
+        )
+
+    def test_recipe_delete_cleans_shards(self):
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=self.recipes[1])
+        self.recipes[1].delete()
+        for alias in SHARDS:
+            self.assertEqual(self.rows(ShoppingCart, alias), set())
+
+    def rebalance(self, *args):
+        out = io.StringIO()
+        # Список таблиц и пачки по pk читаются из каждой БД одним и тем
+        # же запросом, это не N+1
+        with override_settings(N_PLUS_ONE_THRESHOLD=10), \
+                detect_n_plus_one('rebalance_shards'):
+            call_command('rebalance_shards', *args, stdout=out)
+        return out.getvalue()
+
+    def test_rebalance_moves_misplaced_rows(self):
+        pairs = {(user.id, self.recipes[0].id) for user in self.users}
+        # Записи до включения шардов лежат в default, часть —
+        # в чужом шарде после изменения их состава
+        for user_id, recipe_id in pairs:
+            Favorite.objects.using('default').create(
+                user_id=user_id, recipe_id=recipe_id
+            )
+        misplaced = (self.users[0].id, self.recipes[1].id)
+        wrong = next(
+            alias for alias in SHARDS
+            if alias != sharding.shard_for_user(misplaced[0])
+        )
+        Favorite.objects.using(wrong).create(
+            user_id=misplaced[0], recipe_id=misplaced[1]
+        )
+        # Прерванный прошлый запуск: копия уже в шарде пользователя
+        user_id, recipe_id = next(iter(pairs))
+        Favorite.objects.using(sharding.shard_for_user(user_id)).create(
+            user_id=user_id, recipe_id=recipe_id
+        )
+        pairs.add(misplaced)
+
+        self.assertIn(
+            'К переносу записей: 5', self.rebalance('--dry-run')
+        )
+        self.assertEqual(len(self.rows(Favorite, 'default')), 4)
+
+        self.assertIn(
+            'Перенесено записей: 5', self.rebalance('--batch-size', '2')
+        )
+        self.assertEqual(self.rows(Favorite, 'default'), set())
+        self.assertEqual(
+            {alias: self.rows(Favorite, alias) for alias in SHARDS},
+            self.expected_shards(pairs)
+        )
+
+        self.assertIn('Перенесено записей: 0', self.rebalance())
+
+
+@override_settings(ALLOWED_HOSTS=['foodgram.example'])
+class WarmUpTests(TestCase):
+    """Прогрев мастера gunicorn и профиль холодного старта."""
+
+    def setUp(self):
+        cache.clear()
+        # Как тестовый клиент: конец запроса не закрывает соединение
+        # с открытой транзакцией теста
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+        # Соединения теста не закрываем, закрытие проверяется отдельно
+        patcher = mock.patch.object(warmup, 'close_connections')
+        self.close_connections = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_steps_fill_response_cache(self):
+        Tag.objects.create(name='Обед', slug='lunch')
+        timings = warmup.warm_up()
+        self.assertEqual(
+            [(name, error) for name, _, error in timings],
+            [(name, None) for name, _ in warmup.STEPS]
+        )
+        self.close_connections.assert_called_once()
+        response = self.client.get(
+            '/api/tags/', HTTP_HOST='foodgram.example'
+        )
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_database_error_skips_dependent_steps(self):
+        with mock.patch.object(
+            connections['default'], 'ensure_connection',
+            side_effect=psycopg2.OperationalError('connection refused')
+        ):
+            timings = warmup.warm_up()
+        names = [name for name, _, _ in timings]
+        self.assertNotIn('справочники', names)
+        self.assertNotIn('запросы', names)
+        [error] = [error for _, _, error in timings if error]
+        self.assertEqual(error, 'OperationalError: connection refused')
+        self.close_connections.assert_called_once()
+
+    def test_parse_import_times(self):
+        stderr = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   _io\n'
+            'import time:      2500 |       4000 | django.db\n'
+            'something else\n'
+        )
+        self.assertEqual(
+            StartupProfileCommand._parse_import_times(stderr),
+            [('_io', 0.00012, 0.00012), ('django.db', 0.0025, 0.004)]
+        )
+
+    def test_cold_start_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'startup.json')
+            out = io.StringIO()
+            call_command(
+                'startup_profile', '--mode', 'wsgi', '--no-warm-up',
+                '--top', '5', '--output', output, stdout=out
+            )
+            with open(output, encoding='utf-8') as file:
+                result = json.load(file)
+        self.assertIn('Загрузка foodgram_backend.wsgi', out.getvalue())
+        self.assertEqual(result['mode'], 'wsgi')
+        self.assertEqual(result['steps'], [])
+        self.assertEqual(len(result['modules']), 5)
+        self.assertEqual(len(result['packages']), 5)
+        self.assertGreater(result['rss_kb'], 0)
+
+
+class MetricsTests(TestCase):
+    """Метрики процессов в mmap-файлах и эндпоинт /metrics."""
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = override_settings(METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        # Файлы процесса из настоящего METRICS_DIR открываются заново
+        metrics.clear()
+        self.addCleanup(metrics.clear)
+
+    def samples(self):
+        return dict(
+            line.rsplit(' ', 1) for line in metrics.render().splitlines()
+            if not line.startswith('#')
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(
+            self.client.get(
+                '/metrics', HTTP_AUTHORIZATION='Bearer other'
+            ).status_code, 403
+        )
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_closed_without_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_requests_are_counted(self):
+        self.client.get('/api/tags/')
+        self.client.get('/api/tags/')
+        requests = {
+            name: value for name, value in self.samples().items()
+            if name.startswith('foodgram_http_requests_total{')
+        }
+        self.assertEqual(len(requests), 2)
+        self.assertEqual(requests.pop(
+            'foodgram_http_requests_total'
+            '{action="cached",method="GET",status="200"}'
+        ), '1')
+        [(name, value)] = requests.items()
+        self.assertIn('method="GET",status="200"', name)
+        self.assertEqual(value, '1')
+        samples = self.samples()
+        self.assertEqual(
+            samples['foodgram_cache_requests_total'
+                    '{cache="response",result="hit"}'], '1'
+        )
+        self.assertEqual(
+            samples['foodgram_worker_requests_in_progress'
+                    f'{{pid="{os.getpid()}"}}'], '0'
+        )
+
+    def test_histogram_buckets_accumulate(self):
+        for duration in (0.003, 0.03, 20):
+            metrics.observe(
+                'foodgram_http_request_duration_seconds', duration,
+                action='test'
+            )
+        samples = self.samples()
+        bucket = (
+            'foodgram_http_request_duration_seconds_bucket'
+            '{{action="test",le="{}"}}'
+        )
+        self.assertEqual(samples[bucket.format('0.005')], '1')
+        self.assertEqual(samples[bucket.format('0.025')], '1')
+        self.assertEqual(samples[bucket.format('0.05')], '2')
+        self.assertEqual(samples[bucket.format('10')], '2')
+        self.assertEqual(samples[bucket.format('+Inf')], '3')
+        self.assertEqual(samples[
+            'foodgram_http_request_duration_seconds_count{action="test"}'
+        ], '3')
+        self.assertEqual(float(samples[
+            'foodgram_http_request_duration_seconds_sum{action="test"}'
+        ]), 20.033)
+
+    def test_processes_are_summed(self):
+        metrics.inc('foodgram_worker_exits_total')
+        # Файлы другого воркера: счётчик и gauge
+        other = metrics.MmapStore(
+            os.path.join(self.directory, 'counters_1.db')
+        )
+        other.inc('foodgram_worker_exits_total', 2)
+        # Файл растёт за пределы начального размера
+        for number in range(metrics.INITIAL_SIZE // 32):
+            other.inc(f'foodgram_test_total{{number="{number}"}}')
+        metrics.MmapStore(
+            os.path.join(self.directory, 'gauges_1.db')
+        ).set('foodgram_worker_start_time_seconds{pid="1"}', 5)
+        samples = self.samples()
+        self.assertEqual(samples['foodgram_worker_exits_total'], '3')
+        self.assertEqual(
+            samples['foodgram_test_total{number="0"}'], '1'
+        )
+        self.assertEqual(
+            len(metrics.MmapStore(
+                os.path.join(self.directory, 'counters_1.db')
+            )._positions),
+            metrics.INITIAL_SIZE // 32 + 1
+        )
+        self.assertIn(
+            'foodgram_worker_start_time_seconds{pid="1"}', samples
+        )
+        metrics.mark_process_dead(1)
+        self.assertNotIn(
+            'foodgram_worker_start_time_seconds{pid="1"}', self.samples()
+        )
+
+
+class RequestProfilerTests(TestCase):
+    """Профиль запроса сотрудника по X-Profile или ?_profile=."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email='staff@example.com', username='staff', first_name='Админ',
+            last_name='Сайта', password='password', is_staff=True,
+            is_superuser=True
+        )
+        cls.reader = User.objects.create_user(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Рецептов', password='password'
+        )
+        cls.token = Token.objects.create(user=cls.staff)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(
+            PROFILE_DIR=directory.name, PROFILE_INTERVAL=0.0005
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def profiled(self, response):
+        profile_id = response.get('X-Profile-Id')
+        return profile_id and RequestProfile.objects.get(pk=profile_id)
+
+    def test_requested_profile(self):
+        factory = RequestFactory()
+        for request, kind in (
+            (factory.get('/api/tags/'), None),
+            (factory.get('/api/tags/?_profile=0'), None),
+            (factory.get('/api/tags/?_profile=1'), 'cpu'),
+            (factory.get('/api/tags/', HTTP_X_PROFILE='memory'), 'memory'),
+        ):
+            self.assertEqual(profiling.requested_profile(request), kind)
+
+    def test_only_staff_is_profiled(self):
+        response = self.client.get('/api/tags/?_profile=1')
+        self.assertIsNone(self.profiled(response))
+        client = APIClient()
+        client.force_login(self.reader)
+        response = client.get('/api/tags/?_profile=1')
+        self.assertIsNone(self.profiled(response))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_token_staff_cpu_profile(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = client.get('/api/users/me/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile = self.profiled(response)
+        self.assertEqual(
+            (profile.user, profile.method, profile.path, profile.status),
+            (self.staff, 'GET', '/api/users/me/', 200)
+        )
+        self.assertEqual(profile.memory_file, '')
+        with open(profile.file_path('cpu'), encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        if profile.engine == 'sampler':
+            self.assertEqual(
+                sum(int(line.rsplit(' ', 1)[1]) for line in lines),
+                profile.samples
+            )
+            for line in lines:
+                self.assertRegex(line, r'^\S.* \d+$')
+        self.assertFalse(profiling.profile_lock.locked())
+
+    def test_memory_profile_and_admin_download(self):
+        self.client.force_login(self.staff)
+        profile = self.profiled(self.client.get('/api/tags/?_profile=memory'))
+        self.assertTrue(profile.memory_file)
+        self.assertGreater(profile.peak_memory, 0)
+        self.assertFalse(tracemalloc.is_tracing())
+        url = f'/admin/core/requestprofile/{profile.pk}/download/memory/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            b''.join(response.streaming_content).decode().splitlines()[0],
+            r':\d+ \d+$'
+        )
+        response.close()
+        files = [profile.file_path(kind) for kind in ('cpu', 'memory')]
+        profile.delete()
+        self.assertFalse(any(map(os.path.exists, files)))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_busy_profiler_skips_request(self):
+        self.client.force_login(self.staff)
+        with profiling.profile_lock:
+            response = self.client.get('/api/tags/?_profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.profiled(response))
+
+    def test_stack_sampler(self):
+        def busy_profiled_function():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = profiling.StackSampler(0.001)
+        sampler.start()
+        busy_profiled_function()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        self.assertIsNotNone(re.search(
+            r';busy_profiled_function \(core/tests\.py:\d+\) \d+$',
+            sampler.output(), re.MULTILINE
+        ))
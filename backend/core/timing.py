@@ -0,0 +1,202 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+# Статистика текущего запроса; None вне запроса (команды, миграции)
+current_stats = ContextVar('current_stats', default=None)
+
+slow_request_logger = logging.getLogger('foodgram.slow_requests')
+
+
+class RequestStats:
+    """Запросы к БД и время этапов одного HTTP-запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.db_time = 0
+        self.timings = {}
+        self._running = set()
+
+    def add_query(self, alias, sql, params, duration):
+        self.queries.append((alias, sql, params, duration))
+        self.db_time += duration
+
+    @contextmanager
+    def timer(self, name):
+        # Вложенные вызовы (рендерер внутри рендерера) не считаются дважды
+        if name in self._running:
+            yield
+            return
+        self._running.add(name)
+        started = time.perf_counter()
+        db_time = self.db_time
+        try:
+            yield
+        finally:
+            self._running.discard(name)
+            # Без запросов к БД внутри этапа (ленивые поля сериализатора):
+            # они уже учтены в db_time
+            self.timings[name] = (
+                self.timings.get(name, 0) + time.perf_counter() - started
+                - (self.db_time - db_time)
+            )
+
+
+@contextmanager
+def timed(name):
+    """Засекает этап запроса для Server-Timing; вне запроса — ничего."""
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    with stats.timer(name):
+        yield
+
+
+def timed_serializer(serializer):
+    """
+    serializer, у которого построение .data засекается этапом
+    serializer. Обёртка на экземпляре: вложенные и дочерние
+    сериализаторы списка вызываются внутри и не считаются дважды.
+    """
+    to_representation = serializer.to_representation
+
+    def timed_representation(instance):
+        with timed('serializer'):
+            return to_representation(instance)
+
+    serializer.to_representation = timed_representation
+    return serializer
+
+
+class TimedSerializerViewMixin:
+    """Сериализаторы get_serializer засекаются для Server-Timing."""
+
+    def get_serializer(self, *args, **kwargs):
+        return timed_serializer(super().get_serializer(*args, **kwargs))
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка execute() для всех соединений (core.signals)."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(
+            context['connection'].alias, sql, params,
+            time.perf_counter() - started
+        )
+
+
+def view_label(request):
+    """Представление запроса: Класс.действие для ViewSet'ов, иначе имя."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = match.func
+    view_class = getattr(view, 'cls', None)
+    if view_class is None:
+        return getattr(view, '__name__', type(view).__name__)
+    actions = getattr(view, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def loaded_user(request):
+    """
+    Пользователь запроса, если он уже загружен, иначе None.
+
+    Пользователя сессии не загружаем ради статистики: это запрос к БД,
+    а в асинхронном представлении ещё и блокировка цикла событий.
+    Пользователя по токену DRF уже подставил в request.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+def is_staff(request):
+    user = loaded_user(request)
+    return bool(user is not None and user.is_staff)
+
+
+def response_size(response):
+    return None if response.streaming else len(response.content)
+
+
+def server_timing(stats, total, size, label):
+    render = stats.timings.get('render', 0)
+    serializer = stats.timings.get('serializer', 0)
+    # Представления и middleware без БД, сериализаторов и рендеринга
+    app = max(total - stats.db_time - serializer - render, 0)
+    parts = [
+        f'db;dur={stats.db_time * 1000:.1f};'
+        f'desc="{len(stats.queries)} queries"',
+        f'serializer;dur={serializer * 1000:.1f}',
+        f'render;dur={render * 1000:.1f}',
+        f'app;dur={app * 1000:.1f};desc="views and middleware"',
+        f'total;dur={total * 1000:.1f}',
+    ]
+    if size is not None:
+        parts.append(f'size;desc="{size} bytes"')
+    if label:
+        parts.append(f'action;desc="{label}"')
+    return ', '.join(parts)
+
+
+def query_entry(alias, sql, params, duration):
+    entry = {'db': alias, 'ms': round(duration * 1000, 2), 'sql': sql}
+    # Параметры содержат токены, хеши паролей и почту: только по явному
+    # SLOW_REQUEST_LOG_PARAMS
+    if settings.SLOW_REQUEST_LOG_PARAMS:
+        entry['params'] = repr(params)[:settings.SLOW_REQUEST_MAX_PARAMS]
+    return entry
+
+
+def log_slow_request(request, response, stats, total, size, label):
+    queries = stats.queries[:settings.SLOW_REQUEST_MAX_QUERIES]
+    slow_request_logger.warning(json.dumps({
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'action': label,
+        'user_id': getattr(loaded_user(request), 'pk', None),
+        'total_ms': round(total * 1000, 1),
+        'db_ms': round(stats.db_time * 1000, 1),
+        'serializer_ms': round(
+            stats.timings.get('serializer', 0) * 1000, 1
+        ),
+        'render_ms': round(stats.timings.get('render', 0) * 1000, 1),
+        'query_count': len(stats.queries),
+        'response_bytes': size,
+        'queries': [
+            query_entry(alias, sql, params, duration)
+            for alias, sql, params, duration in queries
+        ],
+    }, ensure_ascii=False, default=str))
+
+
+def finish(request, response, stats):
+    """Заголовок Server-Timing и запись в журнал медленных запросов."""
+    total = time.perf_counter() - stats.started
+    threshold = settings.SLOW_REQUEST_MS
+    show = settings.DEBUG or is_staff(request)
+    is_slow = threshold and total * 1000 >= threshold
+    if not (show or is_slow):
+        return
+    size = response_size(response)
+    label = view_label(request)
+    if show:
+        response['Server-Timing'] = server_timing(stats, total, size, label)
+    if is_slow:
+        log_slow_request(request, response, stats, total, size, label)
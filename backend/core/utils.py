@@ -0,0 +1,112 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.http import HttpResponseNotAllowed
+
+SAFE_VIEW_METHODS = ('GET', 'HEAD')
+
+
+def batched(iterable, size):
+    """Разбивает итерируемый объект на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def bulk_create_with_ids(model, objs):
+    """
+    bulk_create, после которого у объектов есть id, назначенные БД.
+
+    Без RETURNING (SQLite) id читаются после вставки: SQLite держит
+    блокировку записи до конца транзакции, поэтому последние id — наши.
+    Вызывается внутри transaction.atomic.
+    """
+    model.objects.bulk_create(objs)
+    if not connection.features.can_return_rows_from_bulk_insert:
+        ids = list(
+            model.objects.order_by('-pk')
+            .values_list('pk', flat=True)[:len(objs)]
+        )
+        for obj, pk in zip(objs, reversed(ids)):
+            obj.pk = pk
+    return objs
+
+
+def set_prefetched(instance, name, objects):
+    """
+    Кладёт objects в кеш prefetch_related связи name так же, как это
+    делает prefetch_related_objects: instance.<name>.all() отдаёт их
+    без запроса, а prefetch_related_objects считает связь загруженной.
+    """
+    cache = instance.__dict__.setdefault('_prefetched_objects_cache', {})
+    # Иначе менеджер вернёт прежний кеш вместо нового QuerySet
+    cache.pop(name, None)
+    queryset = getattr(instance, name).get_queryset()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    cache[name] = queryset
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кеш процесса.
+
+    В отличие от functools.lru_cache позволяет проверить наличие
+    значения без вычисления: так асинхронное представление обходится
+    без потока при попадании.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def run_in_thread(func, *args):
+    """
+    Блокирующий вызов (кеш, просмотр справочника) из асинхронного кода
+    без занятия цикла событий.
+    """
+    return sync_to_async(func, thread_sensitive=False)(*args)
+
+
+def require_safe_async(view):
+    """
+    require_safe для асинхронных представлений.
+
+    Декораторы django.views.decorators.http в Django 3.2 оборачивают
+    представление синхронной функцией, и оно перестаёт быть асинхронным.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_VIEW_METHODS:
+            return HttpResponseNotAllowed(SAFE_VIEW_METHODS)
+        return await view(request, *args, **kwargs)
+
+    # Безопасные методы не нуждаются в CSRF-проверке, а csrf_exempt
+    # тоже превратил бы представление в синхронное
+    wrapper.csrf_exempt = True
+    return wrapper
@@ -0,0 +1,28 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from core import metrics
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Метрики всех процессов в формате Prometheus.
+
+    Без METRICS_TOKEN эндпоинт открыт только при DEBUG.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            raise Http404
+    elif not hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', ''),
+        f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,141 @@
+import importlib
+import time
+from urllib.parse import quote
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.urls import get_resolver
+
+# Модули, которые Django и DRF импортируют лениво при первых запросах
+HOT_MODULES = (
+    'djoser.views',
+    'djoser.serializers',
+    'drf_extra_fields.fields',
+    'rest_framework.authtoken.models',
+    'rest_framework.renderers',
+    'rest_framework.parsers',
+    'django_filters.rest_framework',
+    'api.views',
+    'api.serializers',
+    'api.filters',
+)
+HOT_SERIALIZERS = (
+    'RecipeReadSerializer', 'RecipeWriteSerializer', 'UserSerializer',
+    'SubscriptionReadSerializer', 'TagSerializer', 'IngredientSerializer',
+)
+# Публичные запросы, которые проходят весь стек до ответа
+WARM_UP_PATHS = (
+    ('/api/recipes/', ''),
+    ('/api/tags/', ''),
+    ('/api/ingredients/', f'name={quote("а")}'),
+)
+
+
+def import_modules():
+    for name in HOT_MODULES:
+        importlib.import_module(name)
+    # Pillow подгружает модули форматов при первом открытии изображения
+    from PIL import Image
+    Image.init()
+
+
+def compile_urls():
+    resolver = get_resolver()
+    # Заполнение словарей reverse компилирует регулярные выражения
+    # всех маршрутов
+    resolver.reverse_dict
+    resolver.resolve('/api/recipes/')
+
+
+def build_serializers():
+    # Поля сериализаторов строятся по _meta моделей, которые
+    # кешируют связи при первом обращении
+    from api import serializers
+    for name in HOT_SERIALIZERS:
+        getattr(serializers, name)().fields
+
+
+def check_databases():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def prime_catalogs():
+    from core import catalog
+    from core.cache import is_shared
+    from core.ingredient_index import ingredient_index
+    if is_shared():
+        # Без общего кеша снимки не держатся (core.catalog)
+        catalog.tags.get()
+        catalog.ingredients.get()
+    ingredient_index.refresh()
+
+
+def request_hot_paths():
+    """
+    Проходит middleware, представления и рендеринг ответа; при общем
+    кеше заодно заполняет кеш ответов для основного домена.
+    """
+    host = next(
+        (host for host in settings.ALLOWED_HOSTS if host not in ('', '*')),
+        'localhost'
+    )
+    handler = WSGIHandler()
+    for path, query in WARM_UP_PATHS:
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path,
+            'QUERY_STRING': query, 'HTTP_HOST': host.lstrip('.'),
+        }
+        setup_testing_defaults(environ)
+        response = handler(environ, lambda status, headers: None)
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+
+
+STEPS = (
+    ('импорт модулей', import_modules),
+    ('маршруты', compile_urls),
+    ('сериализаторы', build_serializers),
+    ('базы данных', check_databases),
+    ('справочники', prime_catalogs),
+    ('запросы', request_hot_paths),
+)
+
+
+def close_connections():
+    """Соединения и пулы не должны переходить в дочерние процессы."""
+    connections.close_all()
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            pool.close()
+
+
+def warm_up():
+    """
+    Прогревает процесс до fork воркеров gunicorn (preload_app).
+
+    Возвращает список (шаг, секунды, ошибка). После ошибки базы данных
+    шаги, которым она нужна, пропускаются: воркеры всё равно стартуют.
+    """
+    timings = []
+    failed = False
+    try:
+        for name, step in STEPS:
+            if failed and step in (prime_catalogs, request_hot_paths):
+                continue
+            started = time.perf_counter()
+            try:
+                step()
+                error = None
+            except Exception as exception:
+                error = f'{type(exception).__name__}: {exception}'
+                failed = failed or step is check_databases
+            timings.append((name, time.perf_counter() - started, error))
+    finally:
+        close_connections()
+    return timings
@@ -1,7 +1,9 @@
 import os
 
-from django.core.asgi import get_asgi_application
-
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
-application = get_asgi_application()
+from core.asgi import get_application  # noqa: E402
+
+# Асинхронные представления — в цикле событий, остальные — в пуле
+# из ASGI_SYNC_THREADS потоков (core.asgi)
+application = get_application()
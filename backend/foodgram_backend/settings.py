@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -26,20 +27,39 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'djoser',
     'django_filters',
+    'core.apps.CoreConfig',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.AnonymousResponseCacheMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+# Цепочка асинхронных представлений в ASGI-режиме (core.asgi): без
+# сессий, пользователя, CSRF и сообщений, которые им не нужны, а
+# встроенные middleware — из core.middleware, без смены потока
+ASYNC_MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.NPlusOneMiddleware',
+    'core.middleware.SecurityMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
+    'core.middleware.CommonMiddleware',
+    'core.middleware.AnonymousResponseCacheMiddleware',
+    'core.middleware.RequestProfilerMiddleware',
+    'core.middleware.XFrameOptionsMiddleware',
+]
 
 ROOT_URLCONF = 'foodgram_backend.urls'
 
@@ -61,6 +81,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
+# Режим воркеров gunicorn (gunicorn.conf.py): wsgi или asgi
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+# Потоки для синхронных представлений в ASGI-режиме (core.asgi)
+ASGI_SYNC_THREADS = int(os.getenv('ASGI_SYNC_THREADS', 4))
+# Потоки для параллельных подзапросов /api/batch/ (core.batch)
+BATCH_THREADS = int(os.getenv('BATCH_THREADS', 4))
+
 USE_SQLITE = os.getenv('USE_SQLITE', 'False') == 'True'
 if USE_SQLITE:
     DATABASES = {
@@ -69,17 +96,221 @@ if USE_SQLITE:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # Локальная проверка реплики: копию базы с задержкой обновляет
+    # команда replicate_sqlite
+    if os.getenv('SQLITE_REPLICA', 'False') == 'True':
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.replica.sqlite3',
+            'TEST': {'MIRROR': 'default'},
+        }
+    for number in range(int(os.getenv('SQLITE_SHARDS', 0))):
+        DATABASES[f'shard_{number}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / f'db.shard{number}.sqlite3',
+        }
 else:
+    # Пул соединений процесса: при нём соединение возвращается в пул
+    # после каждого запроса, поэтому CONN_MAX_AGE по умолчанию 0
+    DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+    # За pgbouncer в режиме transaction серверные курсоры
+    # (QuerySet.iterator()) не переживают границу транзакции
+    DB_TRANSACTION_POOLING = (
+        os.getenv('DB_TRANSACTION_POOLING', 'False') == 'True'
+    )
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'core.backends.postgresql',
             'NAME': os.getenv('POSTGRES_DB', 'django'),
             'USER': os.getenv('POSTGRES_USER', 'django'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', 'localhost'),
             'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': int(
+                os.getenv('DB_CONN_MAX_AGE', 0 if DB_POOL else 60)
+            ),
+            'CONN_HEALTH_CHECKS': (
+                os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+            ),
+            'DISABLE_SERVER_SIDE_CURSORS': DB_TRANSACTION_POOLING,
+            'POOL': {
+                # Потоку gunicorn нужно не больше одного соединения;
+                # в ASGI-режиме ещё одно — общему потоку
+                # асинхронных представлений, и по одному — потокам
+                # параллельных подзапросов /api/batch/
+                'MAX_SIZE': int(os.getenv(
+                    'DB_POOL_MAX_SIZE',
+                    (
+                        ASGI_SYNC_THREADS + 1 if SERVER_MODE == 'asgi'
+                        else int(os.getenv('GUNICORN_THREADS', 1))
+                    ) + BATCH_THREADS
+                )),
+                'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                'MAX_LIFETIME': float(
+                    os.getenv('DB_POOL_MAX_LIFETIME', 1800)
+                ),
+                'CHECK_INTERVAL': float(
+                    os.getenv('DB_POOL_CHECK_INTERVAL', 30)
+                ),
+            } if DB_POOL else None,
         }
     }
+    # Реплики только для чтения: хосты через запятую
+    for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1
+    ):
+        DATABASES[f'replica_{number}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            'TEST': {'MIRROR': 'default'},
+        }
+    # Шарды избранного, корзин и подписок: хосты через запятую
+    for number, host in enumerate(
+        filter(None, os.getenv('DB_SHARD_HOSTS', '').split(','))
+    ):
+        DATABASES[f'shard_{number}'] = {
+            **DATABASES['default'], 'HOST': host
+        }
+
+DATABASE_REPLICAS = [
+    alias for alias in DATABASES if alias.startswith('replica')
+]
+# Порядок шардов задаёт раскладку по хешу user_id: после изменения
+# состава выполните rebalance_shards
+RELATION_SHARDS = [alias for alias in DATABASES if alias.startswith('shard_')]
+DATABASE_ROUTERS = ['core.sharding.ShardRouter', 'core.routers.ReplicaRouter']
+# Только эти пути читают с реплик
+REPLICA_READ_PREFIX = '/api/'
+# Сколько секунд после записи клиент читает с основной БД
+REPLICA_STICKINESS_SECONDS = int(
+    os.getenv('REPLICA_STICKINESS_SECONDS', 5)
+)
+
+# Число воркеров из gunicorn.conf.py: при нескольких воркерах кеш
+# locmem у каждого свой, и то, что на нём держится, проверяет core.checks
+GUNICORN_WORKERS = int(os.getenv('GUNICORN_WORKERS', 1))
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+# Псевдоним из CACHE_BACKENDS или полный путь к классу бэкенда
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Страховочный срок жизни ответов для анонимов, в секундах
+ANONYMOUS_CACHE_TIMEOUT = int(os.getenv('ANONYMOUS_CACHE_TIMEOUT', 600))
+# Как часто снимки тегов и ингредиентов (core.catalog) сверяются
+# с версией в общем кеше, в секундах
+CATALOG_CHECK_INTERVAL = float(os.getenv('CATALOG_CHECK_INTERVAL', 1))
+# Сколько ингредиентов отдаёт асинхронный поиск ?name= (core.catalog)
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 100))
+
+# Индекс «ингредиент → рецепты» (core.ingredient_index) дочитывает
+# изменения из RecipeChange не чаще раза в INGREDIENT_INDEX_SYNC_INTERVAL
+# секунд и полностью перестраивается в фоне раз в INGREDIENT_INDEX_REBUILD
+# секунд; журнал хранится столько дней (чистит update_similar_recipes)
+INGREDIENT_INDEX_SYNC_INTERVAL = float(
+    os.getenv('INGREDIENT_INDEX_SYNC_INTERVAL', 1)
+)
+INGREDIENT_INDEX_REBUILD = int(os.getenv('INGREDIENT_INDEX_REBUILD', 3600))
+RECIPE_CHANGES_RETENTION_DAYS = int(
+    os.getenv('RECIPE_CHANGES_RETENTION_DAYS', 7)
+)
+
+# Рейтинги рецептов (update_rankings): вес добавления в избранное
+# и в корзину; окна трендовости — (дней, вес), действие учитывается
+# во всех окнах, в которые попадает
+RANKING_FAVORITE_WEIGHT = float(os.getenv('RANKING_FAVORITE_WEIGHT', 1))
+RANKING_SHOPPING_CART_WEIGHT = float(
+    os.getenv('RANKING_SHOPPING_CART_WEIGHT', 0.5)
+)
+TRENDING_WINDOWS = ((1, 4), (7, 2), (30, 1))
+
+# Пакетные запросы /api/batch/: число подзапросов и их суммарная
+# стоимость; подзапрос к списку стоит BATCH_LIST_COST, остальные — 1
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', 20))
+BATCH_MAX_COST = int(os.getenv('BATCH_MAX_COST', 40))
+BATCH_LIST_COST = int(os.getenv('BATCH_LIST_COST', 5))
+
+# Похожие рецепты (update_similar_recipes): длина списка и доля
+# сходства по тегам, остальное — сходство по ингредиентам (Жаккар)
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', 10))
+SIMILAR_RECIPES_TAG_WEIGHT = float(
+    os.getenv('SIMILAR_RECIPES_TAG_WEIGHT', 0.2)
+)
+# Ингредиенты больше чем в SIMILAR_RECIPES_STOP_RATIO рецептов (и не
+# меньше чем в SIMILAR_RECIPES_STOP_MIN) не порождают кандидатов в
+# похожие, но учитываются в сходстве
+SIMILAR_RECIPES_STOP_RATIO = float(
+    os.getenv('SIMILAR_RECIPES_STOP_RATIO', 0.05)
+)
+SIMILAR_RECIPES_STOP_MIN = int(os.getenv('SIMILAR_RECIPES_STOP_MIN', 1000))
+
+# Запросы дольше SLOW_REQUEST_MS (0 — не писать) попадают в журнал
+# foodgram.slow_requests: JSON-строка с действием, временем и SQL
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 1000))
+SLOW_REQUEST_MAX_QUERIES = int(os.getenv('SLOW_REQUEST_MAX_QUERIES', 100))
+# Параметры SQL (токены, хеши паролей) пишутся только для отладки
+SLOW_REQUEST_LOG_PARAMS = (
+    os.getenv('SLOW_REQUEST_LOG_PARAMS', 'False') == 'True'
+)
+SLOW_REQUEST_MAX_PARAMS = 500
+SLOW_REQUEST_LOG = os.getenv('SLOW_REQUEST_LOG')
+
+# Повторы одного запроса из одного места кода (core.nplusone):
+# off, log, warn или raise; в тестах — N_PLUS_ONE_TEST_MODE
+N_PLUS_ONE_MODE = os.getenv('N_PLUS_ONE_MODE', 'log' if DEBUG else 'off')
+N_PLUS_ONE_TEST_MODE = os.getenv('N_PLUS_ONE_TEST_MODE', 'raise')
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 3))
+TEST_RUNNER = 'core.runner.DiscoverRunner'
+
+# Профили запросов сотрудников (core.profiling): каталог файлов
+# и интервал выборок стека в секундах
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.001))
+
+# Файлы метрик процессов (core.metrics) и токен для /metrics;
+# без токена /metrics доступен только при DEBUG
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_lines': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': SLOW_REQUEST_LOG,
+            'formatter': 'json_lines',
+        } if SLOW_REQUEST_LOG else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json_lines',
+        },
+    },
+    'loggers': {
+        'foodgram.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'foodgram.n_plus_one': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,6 +336,11 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'core.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
+    # Те же рендереры DRF, но с учётом времени в Server-Timing
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.JSONRenderer',
+        'core.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 DJOSER = {
@@ -137,6 +373,16 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'collected_static'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = Path('/media')
+MEDIA_ROOT = Path(os.getenv('MEDIA_ROOT', '/media'))
+
+# Файлы именуются по хешу содержимого и хранятся без дублей
+DEFAULT_FILE_STORAGE = os.getenv(
+    'DEFAULT_FILE_STORAGE', 'core.storage.ContentAddressedStorage'
+)
+
+# Файл map для nginx с соответствием коротких кодов и id рецептов
+SHORT_LINKS_MAP_PATH = Path(
+    os.getenv('SHORT_LINKS_MAP_PATH', '/short_links/short_links.map')
+)
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -3,8 +3,12 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Не проксируется nginx: Prometheus обращается к backend:8000
+    path('metrics', metrics_view),
     path('api/', include('api.urls')),
     path('', include('recipes.urls')),
 ]
@@ -0,0 +1,63 @@
+import gc
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
+
+# wsgi — синхронные воркеры; asgi — воркеры uvicorn: асинхронные
+# представления в цикле событий, остальные в пуле потоков (core.asgi)
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'foodgram_backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram_backend.wsgi:application'
+    threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# Приложение загружается и прогревается в мастере до fork: воркеры
+# получают готовую память через copy-on-write. Новый код при этом
+# подхватывается только перезапуском мастера, а не сигналом HUP.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def when_ready(server):
+    from core import metrics
+
+    if preload_app:
+        from core.warmup import warm_up
+
+        for name, seconds, error in warm_up():
+            if error:
+                server.log.warning('Прогрев: %s — ошибка %s', name, error)
+            else:
+                server.log.info(
+                    'Прогрев: %s — %.0f мс', name, seconds * 1000
+                )
+    # Метрики прошлого запуска и запросов прогрева не учитываем
+    metrics.clear()
+    if preload_app:
+        # Сборщик мусора не будет трогать прогретые объекты и копировать
+        # их страницы в каждый воркер
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    from core import metrics
+
+    metrics.worker_started()
+
+
+def child_exit(server, worker):
+    from core import metrics
+
+    metrics.mark_process_dead(worker.pid)
+    metrics.inc('foodgram_worker_exits_total')
+
+
+def worker_abort(worker):
+    from core import metrics
+
+    metrics.inc('foodgram_worker_timeouts_total')
@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.utils.html import format_html
 
+from core import sharding
+from core.admin import (
+    AutocompleteFilter, ScalableAdminMixin, ShardedAdminMixin, SubqueryCount
+)
 from .models import (
     Favorite, Ingredient, IngredientInRecipe, Recipe, ShoppingCart, Tag
 )
@@ -30,7 +34,7 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         'name',
         'author',
@@ -40,13 +44,35 @@ class RecipeAdmin(admin.ModelAdmin):
         'favorites_count',
         'image_preview',
     )
-    list_filter = ('tags',)
-    search_fields = ('author', 'author__email', 'name',)
+    list_filter = ('tags', ('author', AutocompleteFilter))
+    list_select_related = ('author',)
+    search_fields = ('author__username', 'author__email', 'name',)
     ordering = ('name',)
     inlines = (IngredientInRecipeInline,)
     filter_horizontal = ('tags',)
+    autocomplete_fields = ('author',)
     readonly_fields = ('favorites_count',)
 
+    def get_list_display(self, request):
+        list_display = super().get_list_display(request)
+        if sharding.is_enabled():
+            # Избранное в шардах: подзапрос к default вернул бы нули
+            return tuple(
+                name for name in list_display if name != 'favorites_count'
+            )
+        return list_display
+
+    def get_queryset(self, request):
+        queryset = (
+            super().get_queryset(request)
+            .prefetch_related('ingredients', 'tags')
+        )
+        if sharding.is_enabled():
+            return queryset
+        return queryset.annotate(
+            favorites_count=SubqueryCount(Favorite, 'recipe')
+        )
+
     def author_email(self, obj):
         return obj.author.email
     author_email.short_description = 'Email'
@@ -57,10 +83,12 @@ class RecipeAdmin(admin.ModelAdmin):
             '<img src="{}" width="50">', obj.image.url
         )
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorites_count(self, obj):
-        # Подсчитываем количество добавлений в избранное
-        return obj.favorites.count()
+        # Количество добавлений в избранное аннотировано в get_queryset
+        if sharding.is_enabled():
+            return sharding.count_across_shards(Favorite, recipe=obj)
+        return obj.favorites_count
 
     @admin.display(description='Ингредиенты')
     def ingredients_list(self, obj):
@@ -85,22 +113,28 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ShardedAdminMixin, ScalableAdminMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'recipe',
     )
-    list_filter = ('user',)
-    search_fields = ('user', 'recipe')
+    list_filter = (('user', AutocompleteFilter),)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
     ordering = ('user',)
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(
+    ShardedAdminMixin, ScalableAdminMixin, admin.ModelAdmin
+):
     list_display = (
         'user',
         'recipe',
     )
-    list_filter = ('user',)
-    search_fields = ('user', 'recipe')
+    list_filter = (('user', AutocompleteFilter),)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
     ordering = ('user',)
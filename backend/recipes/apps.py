@@ -5,3 +5,10 @@ class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from core.storage import connect_file_cleanup
+        from .models import Recipe
+        from . import signals  # noqa: F401
+
+        connect_file_cleanup(Recipe, 'image')
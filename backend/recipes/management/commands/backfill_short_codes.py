@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core.short_codes import encode_short_code
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда присвоения коротких кодов рецептам без них."""
+
+    help = 'Присваивает short_code всем рецептам, у которых его нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одном UPDATE. По умолчанию: 1000'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = (
+            Recipe.objects.filter(short_code__isnull=True)
+            .only('id').order_by('id')
+        )
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for recipe in batch:
+                recipe.short_code = encode_short_code(recipe.id)
+            Recipe.objects.bulk_update(batch, ('short_code',))
+            updated += len(batch)
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(
+            f'Коротких кодов присвоено: {updated}'
+        ))
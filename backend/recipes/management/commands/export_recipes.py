@@ -0,0 +1,89 @@
+import json
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import IngredientInRecipe, Recipe
+
+
+class Command(BaseCommand):
+    """Команда выгрузки рецептов в NDJSON."""
+
+    help = (
+        'Выгружает рецепты вместе с автором, тегами и ингредиентами '
+        'в NDJSON: один рецепт на строку'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', type=str, default='-',
+            help='Путь к файлу выгрузки. По умолчанию: stdout'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Количество рецептов в одной выборке. По умолчанию: 2000'
+        )
+
+    @staticmethod
+    def _iter_recipes(batch_size):
+        """Рецепты с тегами и ингредиентами: 3 запроса на пачку."""
+        queryset = (
+            Recipe.objects.order_by('id')
+            .values(
+                'id', 'author__email', 'name', 'text', 'cooking_time',
+                'image', 'pub_date'
+            )
+        )
+        last_id = 0
+        while True:
+            recipes = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not recipes:
+                return
+            ids = [recipe['id'] for recipe in recipes]
+            tags = defaultdict(list)
+            for recipe_id, slug in (
+                Recipe.tags.through.objects.filter(recipe_id__in=ids)
+                .values_list('recipe_id', 'tag__slug')
+            ):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            for recipe_id, name, measurement_unit, amount in (
+                IngredientInRecipe.objects.filter(recipe_id__in=ids)
+                .values_list(
+                    'recipe_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount'
+                )
+            ):
+                ingredients[recipe_id].append({
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                    'amount': amount,
+                })
+            for recipe in recipes:
+                recipe_id = recipe.pop('id')
+                yield {
+                    'author': recipe.pop('author__email'),
+                    **recipe,
+                    'pub_date': recipe['pub_date'].isoformat(),
+                    'tags': tags[recipe_id],
+                    'ingredients': ingredients[recipe_id],
+                }
+            last_id = ids[-1]
+
+    def handle(self, *args, **options):
+        to_stdout = options['output'] == '-'
+        output = (
+            self.stdout if to_stdout
+            else open(options['output'], 'w', encoding='utf-8')
+        )
+        exported = 0
+        try:
+            for recipe in self._iter_recipes(options['batch_size']):
+                output.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+                exported += 1
+        finally:
+            if not to_stdout:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {exported}'
+        ))
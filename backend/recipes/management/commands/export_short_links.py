@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipes.short_links import update_map, write_map
+
+
+class Command(BaseCommand):
+    """Команда выгрузки коротких ссылок в map-файл nginx."""
+
+    help = (
+        'Выгружает соответствие коротких кодов и id рецептов в файл, '
+        'подключаемый в блок map конфигурации nginx. Коды новых рецептов '
+        'дописываются, после удалений файл переписывается целиком'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', type=str, default=str(settings.SHORT_LINKS_MAP_PATH),
+            help='Путь к map-файлу. По умолчанию: SHORT_LINKS_MAP_PATH'
+        )
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Переписать файл целиком, даже если он не изменился'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять выгрузку раз в столько секунд (сервис '
+                 'short_links в docker-compose). По умолчанию: один раз'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер пачки при чтении из БД. По умолчанию: 5000'
+        )
+
+    def export(self, options):
+        if options['full']:
+            written, changed = write_map(
+                options['output'], options['batch_size'], force=True
+            )
+            full = True
+        else:
+            written, changed, full = update_map(
+                options['output'], options['batch_size']
+            )
+        if not changed:
+            if not options['interval']:
+                self.stdout.write('Файл коротких ссылок не изменился.')
+            return
+        mode = 'выгружено' if full else 'дописано'
+        self.stdout.write(self.style.SUCCESS(
+            f'Коротких ссылок {mode}: {written}. nginx подхватит файл '
+            'после reload.'
+        ))
+
+    def handle(self, *args, **options):
+        self.export(options)
+        if not options['interval']:
+            return
+        options['full'] = False
+        while True:
+            time.sleep(options['interval'])
+            # Как между HTTP-запросами: соединение с БД не держится
+            # дольше CONN_MAX_AGE и переоткрывается после сбоев
+            close_old_connections()
+            self.export(options)
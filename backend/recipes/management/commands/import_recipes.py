@@ -0,0 +1,213 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from core.cache import invalidate
+from core.short_codes import encode_short_code
+from core.utils import batched, bulk_create_with_ids
+from recipes.models import (
+    Ingredient, IngredientInRecipe, Recipe, RecipeChange, RecipeRanking, Tag
+)
+from users.models import User
+
+REQUIRED_FIELDS = (
+    'author', 'name', 'text', 'cooking_time', 'image', 'pub_date', 'tags',
+    'ingredients',
+)
+TEXT_FIELDS = ('author', 'name', 'text', 'image', 'pub_date')
+
+
+def is_positive_int(value):
+    return (
+        isinstance(value, int) and not isinstance(value, bool) and value > 0
+    )
+
+
+class Command(BaseCommand):
+    """Команда загрузки рецептов из NDJSON, выгруженного export_recipes."""
+
+    help = 'Загружает рецепты из NDJSON пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', type=str, nargs='?', default='-',
+            help='Путь к NDJSON файлу. По умолчанию: stdin'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одной транзакции. По умолчанию: 1000'
+        )
+
+    def _load_catalogs(self):
+        """Справочники тегов и ингредиентов по естественным ключам."""
+        self.tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredient_ids = {
+            (name, measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        }
+
+    @staticmethod
+    def _validate(item):
+        """Проверяет поля рецепта; возвращает причину пропуска или None."""
+        if isinstance(item, ValueError):
+            return f'неверный JSON: {item}'
+        if not isinstance(item, dict):
+            return 'ожидается объект'
+        missing = [field for field in REQUIRED_FIELDS if field not in item]
+        if missing:
+            return f'нет полей {", ".join(missing)}'
+        if not all(isinstance(item[field], str) for field in TEXT_FIELDS):
+            return f'поля {", ".join(TEXT_FIELDS)} должны быть строками'
+        if not is_positive_int(item['cooking_time']):
+            return 'cooking_time должно быть целым положительным числом'
+        if parse_datetime(item['pub_date']) is None:
+            return f'неверная дата {item["pub_date"]}'
+        if not isinstance(item['tags'], list) or not all(
+            isinstance(slug, str) for slug in item['tags']
+        ):
+            return 'tags должно быть списком строк'
+        if not isinstance(item['ingredients'], list):
+            return 'ingredients должно быть списком'
+        keys = set()
+        for ingredient in item['ingredients']:
+            if not isinstance(ingredient, dict) or not all(
+                isinstance(ingredient.get(field), str)
+                for field in ('name', 'measurement_unit')
+            ) or not is_positive_int(ingredient.get('amount')):
+                return f'неверный ингредиент {ingredient}'
+            # Как в API: повтор нарушил бы unique_ingredient_in_recipe
+            # и откатил бы всю пачку
+            key = (ingredient['name'], ingredient['measurement_unit'])
+            if key in keys:
+                return f'ингредиент {key[0]} ({key[1]}) повторяется'
+            keys.add(key)
+        return None
+
+    def _resolve(self, item, author_ids):
+        """Проверяет связи рецепта; возвращает причину пропуска или None."""
+        if item['author'] not in author_ids:
+            return f'автор {item["author"]} не найден'
+        for slug in item['tags']:
+            if slug not in self.tag_ids:
+                return f'тег {slug} не найден'
+        for ingredient in item['ingredients']:
+            key = (ingredient['name'], ingredient['measurement_unit'])
+            if key not in self.ingredient_ids:
+                return f'ингредиент {key[0]} ({key[1]}) не найден'
+        return None
+
+    @transaction.atomic
+    def _import_batch(self, items):
+        checked = []
+        for number, item in items:
+            reason = self._validate(item)
+            if reason:
+                self._skip(number, reason)
+            else:
+                checked.append((number, item))
+        author_ids = dict(
+            User.objects.filter(
+                email__in={item['author'] for _, item in checked}
+            )
+            .values_list('email', 'id')
+        )
+        valid_items = []
+        for number, item in checked:
+            reason = self._resolve(item, author_ids)
+            if reason:
+                self._skip(number, reason)
+            else:
+                valid_items.append(item)
+        recipes = [
+            Recipe(
+                author_id=author_ids[item['author']],
+                name=item['name'],
+                text=item['text'],
+                cooking_time=item['cooking_time'],
+                image=item['image'],
+            )
+            for item in valid_items
+        ]
+        if not recipes:
+            return 0
+        bulk_create_with_ids(Recipe, recipes)
+        # bulk_create проставляет pub_date текущим временем — возвращаем
+        for recipe, item in zip(recipes, valid_items):
+            recipe.short_code = encode_short_code(recipe.id)
+            recipe.pub_date = parse_datetime(item['pub_date'])
+        Recipe.objects.bulk_update(recipes, ('short_code', 'pub_date'))
+        # Строки рейтинга при create создаёт сигнал, bulk_create его обходит
+        RecipeRanking.objects.bulk_create(
+            (RecipeRanking(recipe_id=recipe.id) for recipe in recipes),
+            ignore_conflicts=True
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe_id=recipe.id,
+                ingredient_id=self.ingredient_ids[
+                    (ingredient['name'], ingredient['measurement_unit'])
+                ],
+                amount=ingredient['amount'],
+            )
+            for recipe, item in zip(recipes, valid_items)
+            for ingredient in item['ingredients']
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=self.tag_ids[slug])
+            for recipe, item in zip(recipes, valid_items)
+            # Повтор тега в строке не должен нарушить уникальность
+            for slug in dict.fromkeys(item['tags'])
+        )
+        # bulk_create не отправляет сигналы: журнал изменений пишем сами
+        RecipeChange.record(*(recipe.id for recipe in recipes))
+        return len(recipes)
+
+    def _skip(self, number, reason):
+        self.skipped += 1
+        self.stderr.write(f'Строка {number} пропущена: {reason}')
+
+    @staticmethod
+    def _iter_items(file):
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as error:
+                # Пропускается и учитывается в итоге, как неверные поля
+                yield number, error
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        self._load_catalogs()
+        file = (
+            sys.stdin if options['input'] == '-'
+            else open(options['input'], encoding='utf-8')
+        )
+        imported = 0
+        self.skipped = 0
+        started = time.monotonic()
+        items = self._iter_items(file)
+        try:
+            for batch in batched(items, options['batch_size']):
+                imported += self._import_batch(batch)
+                elapsed = time.monotonic() - started
+                rate = imported / elapsed * 60 if elapsed else 0
+                self.stdout.write(
+                    f'Загружено рецептов: {imported} ({rate:.0f} в минуту)'
+                )
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        # bulk_create не отправляет сигналы: сбрасываем кеш ответов явно
+        invalidate('recipe_list')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершён! Рецептов: {imported}, '
+            f'пропущено строк: {self.skipped}'
+        ))
@@ -1,55 +1,226 @@
 import csv
+import io
+import json
 import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from core.utils import batched
 from recipes.models import Ingredient
 
+JSON_READ_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv_rows(file):
+    """Построчно читает пары (название, единица измерения) из CSV."""
+    for row in csv.reader(file):
+        if len(row) >= 2:  # Проверяем, что есть оба значения
+            yield row[0], row[1]
+
+
+def iter_json_rows(file):
+    """
+    Потоково читает объекты из JSON-массива или NDJSON,
+    не загружая файл в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        # Пропускаем разделители между объектами
+        buffer = buffer.lstrip().lstrip('[,').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer:
+                    raise
+                return
+            chunk = file.read(JSON_READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item.get('name', ''), item.get('measurement_unit', '')
+
+
+READERS = {
+    'csv': iter_csv_rows,
+    'json': iter_json_rows,
+}
+
+
+def iter_ingredients(file, file_format):
+    for name, measurement_unit in READERS[file_format](file):
+        name = name.strip()
+        if name:  # Пропускаем пустые строки
+            yield name, measurement_unit.strip()
+
 
 class Command(BaseCommand):
-    """Команда загрузки данных из CSV файлов."""
+    """Команда загрузки каталога ингредиентов из CSV или JSON."""
 
-    help = 'Загружает данные из CSV файла в базу данных'
+    help = 'Загружает ингредиенты из CSV или JSON файла в базу данных'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--data-dir', type=str, default='./data',
-            help='Путь к директории с CSV файлами. По умолчанию: /data'
+            help='Путь к директории с файлами данных. По умолчанию: ./data'
+        )
+        parser.add_argument(
+            '--file', type=str,
+            help='Путь к файлу каталога; имеет приоритет над --data-dir'
+        )
+        parser.add_argument(
+            '--format', choices=('auto', *READERS), default='auto',
+            help='Формат файла. По умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одной вставке. По умолчанию: 5000'
+        )
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='Обновлять единицу измерения у существующих ингредиентов'
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL'
+        )
+
+    def _find_file(self, options):
+        if options['file']:
+            return options['file']
+        # Получаем путь к папке с данными через аргументы
+        for extension in READERS:
+            file_path = os.path.join(
+                options['data_dir'], f'ingredients.{extension}'
+            )
+            if os.path.exists(file_path):
+                return file_path
+        return None
+
+    def _report(self, loaded, started):
+        elapsed = time.monotonic() - started
+        rate = loaded / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Обработано строк: {loaded} ({rate:.0f} строк/с)'
         )
 
+    @staticmethod
+    def _insert_batch(batch, upsert):
+        """Вставка пачки через ORM: 2–3 запроса на пачку."""
+        if upsert:
+            units = {}
+            for name, measurement_unit in batch:
+                units.setdefault(name, []).append(measurement_unit)
+            existing = {}
+            for ingredient in Ingredient.objects.filter(name__in=units):
+                existing.setdefault(ingredient.name, []).append(ingredient)
+            changed = []
+            # Как и в COPY: меняем единицу, только если ингредиент с таким
+            # названием один, а с новой единицей его ещё нет
+            for name, ingredients in existing.items():
+                if len(ingredients) != 1:
+                    continue
+                ingredient = ingredients[0]
+                if ingredient.measurement_unit not in units[name]:
+                    ingredient.measurement_unit = units[name][0]
+                    changed.append(ingredient)
+            Ingredient.objects.bulk_update(changed, ('measurement_unit',))
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in batch
+            ),
+            ignore_conflicts=True
+        )
+
+    def _load_orm(self, rows, batch_size, upsert):
+        loaded = 0
+        started = time.monotonic()
+        for batch in batched(rows, batch_size):
+            with transaction.atomic():
+                self._insert_batch(batch, upsert)
+            loaded += len(batch)
+            self._report(loaded, started)
+        return loaded
+
+    def _load_copy(self, rows, batch_size, upsert):
+        """
+        Загрузка через COPY во временную таблицу и один INSERT ... SELECT.
+        """
+        quote = connection.ops.quote_name
+        table = quote(Ingredient._meta.db_table)
+        loaded = 0
+        started = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            for batch in batched(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging FROM STDIN WITH CSV', buffer
+                )
+                loaded += len(batch)
+                self._report(loaded, started)
+            if upsert:
+                cursor.execute(
+                    f'UPDATE {table} AS i '
+                    'SET measurement_unit = s.measurement_unit '
+                    'FROM ingredient_staging AS s '
+                    'WHERE i.name = s.name '
+                    'AND i.measurement_unit <> s.measurement_unit '
+                    f'AND NOT EXISTS (SELECT 1 FROM {table} AS o '
+                    'WHERE o.name = i.name AND o.id <> i.id) '
+                    f'AND NOT EXISTS (SELECT 1 FROM {table} AS d '
+                    'WHERE d.name = s.name '
+                    'AND d.measurement_unit = s.measurement_unit)'
+                )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_staging ON CONFLICT DO NOTHING'
+            )
+        return loaded
+
     def handle(self, *args, **options):
         """Основной метод импорта данных."""
-        self.stdout.write(self.style.SUCCESS(
-            'Начало загрузки данных из CSV...')
-        )
-        models_config = {
-            'ingredients.csv': Ingredient,
-        }
-        # Получаем путь к папке с данными через аргументы
-        data_dir = options['data_dir']
-        for filename, model in models_config.items():
-            file_path = os.path.join(data_dir, filename)
-            if not os.path.exists(file_path):
-                self.stdout.write(
-                    self.style.WARNING(f'Файл {filename} не найден!')
+        file_path = self._find_file(options)
+        if file_path is None or not os.path.exists(file_path):
+            self.stdout.write(
+                self.style.WARNING('Файл с ингредиентами не найден!')
+            )
+            return
+        file_format = options['format']
+        if file_format == 'auto':
+            file_format = os.path.splitext(file_path)[1].lstrip('.').lower()
+            if file_format not in READERS:
+                raise CommandError(
+                    f'Не удалось определить формат файла {file_path}'
                 )
-                continue
-            with open(file_path, encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                objects_to_create = []
-                for row in reader:
-                    if len(row) >= 2:  # Проверяем, что есть оба значения
-                        name = row[0].strip()
-                        measurement_unit = row[1].strip()
-                        if name:  # Пропускаем пустые строки
-                            objects_to_create.append(
-                                Ingredient(
-                                    name=name,
-                                    measurement_unit=measurement_unit
-                                )
-                            )
-                if objects_to_create:
-                    Ingredient.objects.bulk_create(
-                        objects_to_create, ignore_conflicts=True
-                    )
-        self.stdout.write(self.style.SUCCESS('Загрузка данных завершена!'))
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        use_copy = (
+            connection.vendor == 'postgresql' and not options['no_copy']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Начало загрузки данных из {file_path}...'
+        ))
+        started = time.monotonic()
+        with open(file_path, encoding='utf-8', newline='') as file:
+            rows = iter_ingredients(file, file_format)
+            load = self._load_copy if use_copy else self._load_orm
+            loaded = load(rows, options['batch_size'], options['upsert'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка данных завершена! Строк: {loaded} за {elapsed:.1f} с'
+        ))
@@ -0,0 +1,270 @@
+import io
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+
+from core import sharding
+from core.cache import invalidate
+from core.short_codes import encode_short_code
+from core.utils import batched, bulk_create_with_ids
+from recipes.models import (
+    Favorite, Ingredient, IngredientInRecipe, Recipe, RecipeChange,
+    RecipeRanking, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+SEED_PASSWORD = 'seed-password'
+SEED_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+
+
+def zipf_cum_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для rng.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+class Command(BaseCommand):
+    """Команда генерации объёмных тестовых данных."""
+
+    help = (
+        'Генерирует пользователей, рецепты, избранное, корзины и подписки '
+        'с реалистичными распределениями для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей. По умолчанию: 1000'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Количество рецептов. По умолчанию: 10000'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора; одинаковое зерно даёт одинаковые данные'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число избранных рецептов на пользователя'
+        )
+        parser.add_argument(
+            '--carts', type=float, default=5,
+            help='Среднее число рецептов в корзине пользователя'
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок пользователя'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа для популярности'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одной вставке. По умолчанию: 5000'
+        )
+
+    def _progress(self, stage, done, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'{stage}: {done} ({rate:.0f} строк/с)')
+
+    def _bulk_insert(self, stage, model, rows):
+        """Вставляет объекты пачками, каждая пачка — отдельная транзакция."""
+        started = time.monotonic()
+        done = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                # Связи пользователей уходят в их шарды, если они настроены
+                sharding.bulk_create(model, batch)
+            done += len(batch)
+            self._progress(stage, done, started)
+
+    def _insert_with_ids(self, stage, model, rows, after_insert=None):
+        """
+        Вставляет объекты пачками и возвращает их id.
+
+        id назначает БД: явные id разошлись бы с последовательностями
+        и с параллельными вставками.
+        """
+        started = time.monotonic()
+        ids = []
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                bulk_create_with_ids(model, batch)
+                if after_insert:
+                    after_insert(batch)
+            ids.extend(obj.pk for obj in batch)
+            self._progress(stage, len(ids), started)
+        return ids
+
+    @staticmethod
+    def _first_number(model):
+        """Номер для имён: больше номеров прошлых запусков."""
+        return (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+
+    def _placeholder_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1), (200, 200, 200)).save(buffer, 'PNG')
+        return default_storage.save(
+            'images/seed.png', ContentFile(buffer.getvalue())
+        )
+
+    def _pick_unique(self, population, cum_weights, count, exclude=None):
+        """count различных элементов с учётом весов популярности."""
+        count = min(count, len(population) - (exclude is not None))
+        picked = set()
+        while len(picked) < count:
+            for item in self.rng.choices(
+                population, cum_weights=cum_weights, k=count - len(picked)
+            ):
+                if item != exclude:
+                    picked.add(item)
+        return picked
+
+    def _poisson_like(self, mean):
+        """Неотрицательное число с длинным хвостом и средним около mean."""
+        return int(self.rng.expovariate(1 / mean)) if mean > 0 else 0
+
+    def _users(self, first_number, count):
+        password = make_password(SEED_PASSWORD)
+        for number in range(first_number, first_number + count):
+            yield User(
+                username=f'seed_user_{number}',
+                email=f'seed_user_{number}@example.com',
+                first_name='Тест',
+                last_name=f'Пользователь {number}',
+                password=password,
+            )
+
+    def _recipes(self, first_number, count, user_ids, image):
+        author_weights = zipf_cum_weights(len(user_ids), self.skew)
+        for number in range(first_number, first_number + count):
+            yield Recipe(
+                author_id=self.rng.choices(
+                    user_ids, cum_weights=author_weights
+                )[0],
+                name=f'Рецепт {number}',
+                text=f'Описание рецепта {number}',
+                cooking_time=self.rng.randint(5, 180),
+                image=image,
+            )
+
+    @staticmethod
+    def _assign_short_codes(recipes):
+        for recipe in recipes:
+            recipe.short_code = encode_short_code(recipe.id)
+        Recipe.objects.bulk_update(recipes, ('short_code',))
+
+    def _recipe_ingredients(self, recipe_ids, ingredient_ids):
+        weights = zipf_cum_weights(len(ingredient_ids), self.skew)
+        for recipe_id in recipe_ids:
+            # Логнормальное распределение: медиана ~7 ингредиентов
+            count = max(1, round(self.rng.lognormvariate(2, 0.4)))
+            for ingredient_id in self._pick_unique(
+                ingredient_ids, weights, count
+            ):
+                yield IngredientInRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+
+    def _recipe_tags(self, recipe_ids, tag_ids):
+        through = Recipe.tags.through
+        for recipe_id in recipe_ids:
+            for tag_id in self.rng.sample(
+                tag_ids, self.rng.randint(1, len(tag_ids))
+            ):
+                yield through(recipe_id=recipe_id, tag_id=tag_id)
+
+    def _user_relations(self, model, user_ids, recipe_ids, mean):
+        weights = zipf_cum_weights(len(recipe_ids), self.skew)
+        for user_id in user_ids:
+            for recipe_id in self._pick_unique(
+                recipe_ids, weights, self._poisson_like(mean)
+            ):
+                yield model(user_id=user_id, recipe_id=recipe_id)
+
+    def _subscriptions(self, user_ids, mean):
+        # Популярные авторы получают больше подписчиков (степенной закон)
+        weights = zipf_cum_weights(len(user_ids), self.skew)
+        for user_id in user_ids:
+            for author_id in self._pick_unique(
+                user_ids, weights, self._poisson_like(mean), exclude=user_id
+            ):
+                yield Subscription(user_id=user_id, author_id=author_id)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.skew = options['skew']
+        self.batch_size = options['batch_size']
+        if self.batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'Каталог ингредиентов пуст, сначала выполните load_csv_data'
+            )
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug) for name, slug in SEED_TAGS
+            )
+        tag_ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+        # Порядок каталога перемешиваем, чтобы популярными оказались
+        # не только ингредиенты с начала алфавита
+        self.rng.shuffle(ingredient_ids)
+        started = time.monotonic()
+
+        user_ids = self._insert_with_ids('Пользователи', User, self._users(
+            self._first_number(User), options['users']
+        ))
+        recipe_ids = self._insert_with_ids('Рецепты', Recipe, self._recipes(
+            self._first_number(Recipe), options['recipes'], user_ids,
+            self._placeholder_image()
+        ), self._assign_short_codes)
+        # Строки рейтинга при create создаёт сигнал, bulk_create его обходит
+        self._bulk_insert('Рейтинги', RecipeRanking, (
+            RecipeRanking(recipe_id=recipe_id) for recipe_id in recipe_ids
+        ))
+        self._bulk_insert(
+            'Ингредиенты в рецептах', IngredientInRecipe,
+            self._recipe_ingredients(recipe_ids, ingredient_ids)
+        )
+        self._bulk_insert(
+            'Теги рецептов', Recipe.tags.through,
+            self._recipe_tags(recipe_ids, tag_ids)
+        )
+        self._bulk_insert('Избранное', Favorite, self._user_relations(
+            Favorite, user_ids, recipe_ids, options['favorites']
+        ))
+        self._bulk_insert('Корзины', ShoppingCart, self._user_relations(
+            ShoppingCart, user_ids, recipe_ids, options['carts']
+        ))
+        self._bulk_insert('Подписки', Subscription, self._subscriptions(
+            user_ids, options['subscriptions']
+        ))
+        # bulk_create не отправляет сигналы: сбрасываем кеш ответов
+        # и перестраиваем индексы рецептов явно
+        invalidate('recipe_list')
+        RecipeChange.record()
+        self.stdout.write(self.style.SUCCESS(
+            f'Генерация завершена за {time.monotonic() - started:.1f} с. '
+            f'Пароль пользователей: {SEED_PASSWORD}'
+        ))
@@ -0,0 +1,162 @@
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core import sharding
+from core.cache import invalidate
+from core.utils import batched
+from recipes.models import (
+    Favorite, RankingRun, Recipe, RecipeActivity, RecipeRanking,
+    ShoppingCart
+)
+
+# Запас на транзакции, которые зафиксировались позже начала прошлого
+# запуска: рецепт пересчитывается с нуля, повтор ничего не портит
+OVERLAP = timedelta(minutes=5)
+
+
+def weights():
+    return {
+        RecipeActivity.FAVORITE: settings.RANKING_FAVORITE_WEIGHT,
+        RecipeActivity.SHOPPING_CART: settings.RANKING_SHOPPING_CART_WEIGHT,
+    }
+
+
+def windows():
+    return [
+        (timedelta(days=days), weight)
+        for days, weight in settings.TRENDING_WINDOWS
+    ]
+
+
+class Command(BaseCommand):
+    """Пересчёт популярности и трендовости рецептов."""
+
+    help = (
+        'Пересчитывает RecipeRanking для рецептов, у которых с прошлого '
+        'запуска изменились избранное и корзины или действия вышли '
+        'из окна трендовости. Запускается периодически, например cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рецепты (после seed и импорта)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Рецептов в одной транзакции. По умолчанию: 500'
+        )
+
+    @staticmethod
+    def _affected(previous, now):
+        """Рецепты с новыми действиями и с действиями, вышедшими из окон."""
+        since = previous.started - OVERLAP
+        activity = RecipeActivity.objects.values_list('recipe_id', flat=True)
+        recipe_ids = set(activity.filter(created__gte=since))
+        for window, _ in windows():
+            recipe_ids.update(activity.filter(
+                created__gte=since - window, created__lt=now - window
+            ))
+        # Рецепты из bulk_create, у которых ещё нет строки рейтинга
+        recipe_ids.update(
+            Recipe.objects.filter(pk__gt=previous.last_recipe_id)
+            .values_list('pk', flat=True)
+        )
+        return recipe_ids
+
+    @staticmethod
+    def _scores(recipe_ids, now):
+        """(популярность, трендовость) для пачки рецептов."""
+        kind_weights = weights()
+        popular = defaultdict(float)
+        for kind, model in (
+            (RecipeActivity.FAVORITE, Favorite),
+            (RecipeActivity.SHOPPING_CART, ShoppingCart),
+        ):
+            counts = sharding.count_grouped(
+                model, 'recipe_id', recipe_id__in=recipe_ids
+            )
+            for recipe_id, count in counts.items():
+                popular[recipe_id] += count * kind_weights[kind]
+        trend_windows = windows()
+        oldest = now - max(window for window, _ in trend_windows)
+        trending = defaultdict(float)
+        for recipe_id, kind, delta, created in (
+            RecipeActivity.objects
+            .filter(recipe_id__in=recipe_ids, created__gte=oldest)
+            .values_list('recipe_id', 'kind', 'delta', 'created')
+        ):
+            # Действие считается во всех окнах, куда попадает: свежие
+            # весят больше всего, затем их вклад убывает ступенями
+            age = now - created
+            trending[recipe_id] += delta * kind_weights[kind] * sum(
+                weight for window, weight in trend_windows if age < window
+            )
+        return {
+            recipe_id: (popular[recipe_id], max(trending[recipe_id], 0))
+            for recipe_id in recipe_ids
+        }
+
+    @staticmethod
+    def _save(scores):
+        existing = RecipeRanking.objects.in_bulk(list(scores))
+        # Рецепты, удалённые после выборки, пропускаются
+        recipe_ids = set(
+            Recipe.objects.filter(pk__in=list(scores))
+            .values_list('pk', flat=True)
+        )
+        changed, created = [], []
+        for recipe_id, (popular, trending) in scores.items():
+            ranking = existing.get(recipe_id)
+            if ranking is None:
+                if recipe_id in recipe_ids:
+                    created.append(RecipeRanking(
+                        recipe_id=recipe_id, popular=popular,
+                        trending=trending
+                    ))
+            elif (ranking.popular, ranking.trending) != (popular, trending):
+                ranking.popular, ranking.trending = popular, trending
+                changed.append(ranking)
+        RecipeRanking.objects.bulk_update(changed, ('popular', 'trending'))
+        RecipeRanking.objects.bulk_create(created, ignore_conflicts=True)
+        return len(changed) + len(created)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        now = timezone.now()
+        previous = RankingRun.objects.order_by('-started').first()
+        full = options['full'] or previous is None
+        last_recipe_id = (
+            Recipe.objects.aggregate(last=Max('pk'))['last'] or 0
+        )
+        if full:
+            recipe_ids = Recipe.objects.values_list('pk', flat=True)
+        else:
+            recipe_ids = self._affected(previous, now)
+        updated = 0
+        for batch in batched(sorted(recipe_ids), options['batch_size']):
+            with transaction.atomic():
+                updated += self._save(self._scores(batch, now))
+        longest = max(window for window, _ in windows())
+        RecipeActivity.objects.filter(
+            created__lt=now - longest - OVERLAP
+        ).delete()
+        RankingRun.objects.create(
+            started=now, last_recipe_id=last_recipe_id, updated=updated,
+            full=full, duration=time.monotonic() - started
+        )
+        if updated:
+            # Ответы с ordering=popular|trending лежат в кеше анонимов
+            invalidate('recipe_list')
+        mode = 'полностью' if full else 'по изменениям'
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны {mode}: изменено {updated}, '
+            f'{time.monotonic() - started:.1f} с'
+        ))
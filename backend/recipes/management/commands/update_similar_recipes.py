@@ -0,0 +1,267 @@
+import heapq
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from core.cache import invalidate
+from core.ingredient_index import load_recipes
+from core.utils import batched
+from recipes.models import RecipeChange, SimilarRecipe, SimilarityRun
+
+# Запас на транзакции, которые взяли номер в журнале раньше, а
+# зафиксировались позже прошлого запуска: повтор ничего не портит
+OVERLAP = timedelta(minutes=5)
+
+
+def jaccard(first, second):
+    union = len(first | second)
+    return len(first & second) / union if union else 0
+
+
+class Similarity:
+    """
+    Сходство рецептов по множествам ингредиентов и тегов.
+
+    Кандидаты для рецепта — только рецепты с общими ингредиентами:
+    их пересечения считаются одним проходом по спискам инвертированного
+    индекса, без сравнения со всеми рецептами. Стоп-ингредиенты (соль,
+    вода — есть почти везде) кандидатов не порождают: их списки дали бы
+    почти все рецепты. Общие стоп-ингредиенты пары досчитываются по
+    битовым маскам. Рецепт только из стоп-ингредиентов остаётся без
+    похожих. Различных наборов тегов немного, поэтому сходство по тегам
+    считается на набор, а не на пару.
+    """
+
+    def __init__(self, recipes):
+        self.recipes = recipes
+        self.tag_weight = settings.SIMILAR_RECIPES_TAG_WEIGHT
+        self.postings = defaultdict(list)
+        self.sizes = {}
+        # id рецепта -> номер его набора тегов в tag_sets
+        self.tag_groups = {}
+        groups = {}
+        for recipe_id, (ingredient_ids, _, tag_ids) in recipes.items():
+            for ingredient_id in ingredient_ids:
+                self.postings[ingredient_id].append(recipe_id)
+            self.sizes[recipe_id] = len(ingredient_ids)
+            self.tag_groups[recipe_id] = groups.setdefault(
+                frozenset(tag_ids), len(groups)
+            )
+        self.tag_sets = list(groups)
+        cutoff = max(
+            settings.SIMILAR_RECIPES_STOP_RATIO * len(recipes),
+            settings.SIMILAR_RECIPES_STOP_MIN
+        )
+        # Стоп-ингредиент -> его бит в масках
+        self.stop_bits = {
+            ingredient_id: 1 << bit for bit, ingredient_id in enumerate(
+                ingredient_id
+                for ingredient_id, recipe_ids in self.postings.items()
+                if len(recipe_ids) > cutoff
+            )
+        }
+        self.stop_postings = {
+            ingredient_id: self.postings.pop(ingredient_id)
+            for ingredient_id in self.stop_bits
+        }
+        # id рецепта -> маска его стоп-ингредиентов (если они есть)
+        self.stop_masks = defaultdict(int)
+        for ingredient_id, bit in self.stop_bits.items():
+            for recipe_id in self.stop_postings[ingredient_id]:
+                self.stop_masks[recipe_id] |= bit
+        self.stop_masks = dict(self.stop_masks)
+
+    def stop_changed(self, previous):
+        """
+        Рецепты с ингредиентами, которые стали или перестали быть
+        стоп-ингредиентами по сравнению с набором previous.
+        """
+        recipe_ids = set()
+        for ingredient_id in self.stop_bits.keys() ^ set(previous):
+            recipe_ids.update(
+                self.stop_postings.get(ingredient_id)
+                or self.postings.get(ingredient_id, ())
+            )
+        return recipe_ids
+
+    def scores(self, recipe_id):
+        """
+        Сходство рецепта с каждым рецептом, где есть его ингредиенты,
+        кроме стоп-ингредиентов.
+        """
+        ingredient_ids, _, _ = self.recipes[recipe_id]
+        tag_ids = self.tag_sets[self.tag_groups[recipe_id]]
+        common = Counter()
+        for ingredient_id in ingredient_ids:
+            if ingredient_id not in self.stop_bits:
+                common.update(self.postings[ingredient_id])
+        del common[recipe_id]
+        tag_scores = [
+            self.tag_weight * jaccard(tag_ids, other_tags)
+            for other_tags in self.tag_sets
+        ]
+        ingredient_weight = 1 - self.tag_weight
+        size, sizes, tag_groups = (
+            len(ingredient_ids), self.sizes, self.tag_groups
+        )
+        stop_mask, stop_masks = (
+            self.stop_masks.get(recipe_id, 0), self.stop_masks
+        )
+        if stop_mask:
+            for other_id in common:
+                common[other_id] += (
+                    stop_mask & stop_masks.get(other_id, 0)
+                ).bit_count()
+        # Жаккар по ингредиентам: общие / (|A| + |B| - общие)
+        return {
+            other_id: (
+                ingredient_weight * shared
+                / (size + sizes[other_id] - shared)
+                + tag_scores[tag_groups[other_id]]
+            )
+            for other_id, shared in common.items()
+        }
+
+    @staticmethod
+    def top(scores, count):
+        """count лучших пар (id, сходство); при равенстве выше новый."""
+        return [
+            (recipe_id, score) for score, recipe_id in heapq.nlargest(
+                count, zip(scores.values(), scores.keys())
+            )
+        ]
+
+
+class Command(BaseCommand):
+    """Пересчёт списков похожих рецептов."""
+
+    help = (
+        'Пересчитывает SimilarRecipe: списки изменённых с прошлого запуска '
+        'рецептов и списки, в которые они входили или теперь входят. '
+        'Запускается периодически, например cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать списки всех рецептов'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Рецептов в одной транзакции. По умолчанию: 500'
+        )
+
+    @staticmethod
+    def _changed(previous, now):
+        """Изменённые рецепты или None, если нужен полный пересчёт."""
+        retention = timedelta(days=settings.RECIPE_CHANGES_RETENTION_DAYS)
+        if previous is None or previous.started < now - retention:
+            # Журнал мог быть очищен после прошлого запуска
+            return None
+        recipe_ids = set(
+            RecipeChange.objects.filter(
+                Q(id__gt=previous.last_change)
+                | Q(created__gte=previous.started - OVERLAP)
+            ).values_list('recipe_id', flat=True)
+        )
+        return None if None in recipe_ids else recipe_ids
+
+    @staticmethod
+    def _affected(similarity, changed, batch_size):
+        """Списки, на которые могли повлиять изменённые рецепты."""
+        count = settings.SIMILAR_RECIPES_COUNT
+        recipe_ids = changed & similarity.recipes.keys()
+        # Списки, где рецепт уже есть: он мог стать менее похожим
+        # или быть удалён
+        for batch in batched(changed, batch_size):
+            recipe_ids.update(
+                SimilarRecipe.objects.filter(similar_id__in=batch)
+                .values_list('recipe_id', flat=True)
+            )
+        # Списки, в которые рецепт теперь попадает: сходство не ниже
+        # последнего места или список ещё не заполнен
+        # Лучшее сходство с изменёнными рецептами: последние места
+        # читаются одним запросом на пачку, а не на каждый рецепт
+        best = {}
+        for recipe_id in changed & similarity.recipes.keys():
+            for other_id, score in similarity.scores(recipe_id).items():
+                if score > best.get(other_id, -1):
+                    best[other_id] = score
+        for batch in batched(best, batch_size):
+            last = dict(
+                SimilarRecipe.objects
+                .filter(recipe_id__in=batch, position=count - 1)
+                .values_list('recipe_id', 'score')
+            )
+            recipe_ids.update(
+                other_id for other_id in batch
+                if other_id not in last or best[other_id] >= last[other_id]
+            )
+        return recipe_ids
+
+    @staticmethod
+    def _save(similarity, recipe_ids):
+        count = settings.SIMILAR_RECIPES_COUNT
+        rows = []
+        for recipe_id in recipe_ids:
+            if recipe_id not in similarity.recipes:
+                # Удалённый рецепт: его список удалён каскадом
+                continue
+            top = similarity.top(similarity.scores(recipe_id), count)
+            rows.extend(
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id,
+                    position=position, score=score
+                )
+                for position, (similar_id, score) in enumerate(top)
+            )
+        SimilarRecipe.objects.filter(recipe_id__in=recipe_ids).delete()
+        SimilarRecipe.objects.bulk_create(rows)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        now = timezone.now()
+        previous = SimilarityRun.objects.order_by('-started').first()
+        # Номер изменения читается до данных: изменения, сделанные во
+        # время загрузки, попадут и в следующий запуск
+        last_change = (
+            RecipeChange.objects.aggregate(last=Max('id'))['last'] or 0
+        )
+        similarity = Similarity(load_recipes())
+        changed = None if options['full'] else self._changed(previous, now)
+        full = changed is None
+        if full:
+            recipe_ids = similarity.recipes.keys()
+        else:
+            recipe_ids = self._affected(
+                similarity, changed, options['batch_size']
+            )
+            recipe_ids |= similarity.stop_changed(previous.stop_ingredients)
+        updated = 0
+        for batch in batched(sorted(recipe_ids), options['batch_size']):
+            with transaction.atomic():
+                self._save(similarity, batch)
+            updated += len(batch)
+        SimilarityRun.objects.create(
+            started=now, last_change=last_change, updated=updated,
+            full=full, duration=time.monotonic() - started,
+            stop_ingredients=sorted(similarity.stop_bits)
+        )
+        # Журнал нужен ещё индексам процессов (core.ingredient_index):
+        # они перестраиваются полностью, если отстали сильнее
+        RecipeChange.objects.filter(created__lt=now - timedelta(
+            days=settings.RECIPE_CHANGES_RETENTION_DAYS
+        )).delete()
+        if updated:
+            invalidate('similar_recipes')
+        mode = 'полностью' if full else 'по изменениям'
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны {mode}: списков {updated}, '
+            f'{time.monotonic() - started:.1f} с'
+        ))
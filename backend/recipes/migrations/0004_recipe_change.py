@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(blank=True, help_text='Пусто — изменилось много рецептов, нужна полная перестройка', null=True, verbose_name='Рецепт')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'изменение рецепта',
+                'verbose_name_plural': 'изменения рецептов',
+            },
+        ),
+    ]
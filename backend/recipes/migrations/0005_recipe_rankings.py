@@ -0,0 +1,77 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(verbose_name='Начат')),
+                ('last_recipe_id', models.BigIntegerField(default=0, verbose_name='Последний рецепт')),
+                ('updated', models.PositiveIntegerField(verbose_name='Пересчитано рецептов')),
+                ('full', models.BooleanField(default=False, verbose_name='Полный пересчёт')),
+                ('duration', models.FloatField(verbose_name='Длительность, с')),
+            ],
+            options={
+                'verbose_name': 'пересчёт рейтингов',
+                'verbose_name_plural': 'пересчёты рейтингов',
+                'get_latest_by': 'started',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(verbose_name='Рецепт')),
+                ('kind', models.CharField(choices=[('favorite', 'Избранное'), ('shopping_cart', 'Корзина')], max_length=16, verbose_name='Действие')),
+                ('delta', models.SmallIntegerField(verbose_name='Изменение')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время')),
+            ],
+            options={
+                'verbose_name': 'действие с рецептом',
+                'verbose_name_plural': 'действия с рецептами',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeRanking',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('popular', models.FloatField(default=0, verbose_name='Популярность')),
+                ('trending', models.FloatField(default=0, verbose_name='Трендовость')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Пересчитан')),
+            ],
+            options={
+                'verbose_name': 'рейтинг рецепта',
+                'verbose_name_plural': 'рейтинги рецептов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reciperanking',
+            index=models.Index(fields=['-popular', '-recipe'], name='ranking_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reciperanking',
+            index=models.Index(fields=['-trending', '-recipe'], name='ranking_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeactivity',
+            index=models.Index(fields=['recipe_id', 'created'], name='activity_recipe_created_idx'),
+        ),
+        # Строки с нулевыми оценками для уже существующих рецептов,
+        # оценки посчитает первый запуск update_rankings
+        migrations.RunSQL(
+            'INSERT INTO recipes_reciperanking '
+            '(recipe_id, popular, trending, updated) '
+            'SELECT id, 0, 0, CURRENT_TIMESTAMP FROM recipes_recipe',
+            migrations.RunSQL.noop,
+        ),
+    ]
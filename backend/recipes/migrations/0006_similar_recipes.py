@@ -0,0 +1,48 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_rankings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started', models.DateTimeField(verbose_name='Начат')),
+                ('last_change', models.BigIntegerField(default=0, verbose_name='Последнее изменение')),
+                ('updated', models.PositiveIntegerField(verbose_name='Пересчитано списков')),
+                ('full', models.BooleanField(default=False, verbose_name='Полный пересчёт')),
+                ('duration', models.FloatField(verbose_name='Длительность, с')),
+            ],
+            options={
+                'verbose_name': 'пересчёт похожих рецептов',
+                'verbose_name_plural': 'пересчёты похожих рецептов',
+                'get_latest_by': 'started',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_recipes', to='recipes.recipe', verbose_name='Рецепт')),
+                ('similar', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='similar_to', to='recipes.recipe', verbose_name='Похожий рецепт')),
+            ],
+            options={
+                'verbose_name': 'похожий рецепт',
+                'verbose_name_plural': 'похожие рецепты',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'position'), name='unique_similar_recipe_position'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def create_rankings(apps, schema_editor):
+    """Строки рейтинга для рецептов, созданных до 0005 и bulk_create."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeRanking = apps.get_model('recipes', 'RecipeRanking')
+    recipe_ids = (
+        Recipe.objects.filter(ranking__isnull=True)
+        .values_list('id', flat=True)
+        .iterator()
+    )
+    RecipeRanking.objects.bulk_create(
+        (RecipeRanking(recipe_id=recipe_id) for recipe_id in recipe_ids),
+        batch_size=1000, ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_rankings, migrations.RunPython.noop),
+    ]
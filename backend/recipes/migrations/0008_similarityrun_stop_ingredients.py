@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_backfill_recipe_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarityrun',
+            name='stop_ingredients',
+            field=models.JSONField(default=list, verbose_name='Стоп-ингредиенты'),
+        ),
+    ]
@@ -6,6 +6,8 @@ from core.constants import (
     MAX_SHORT_CODE_LENGTH, MAX_STR_LENGTH, MAX_TAG_LENGTH, MAX_UNIT_LENGTH,
     MIN_VALUE_LENGTH,
 )
+from core.sharding import ShardedManager
+from core.short_codes import encode_short_code
 from users.models import User
 
 
@@ -89,10 +91,27 @@ class Recipe(models.Model):
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
         ordering = ('-pub_date',)
+        indexes = (
+            # Лента рецептов и рецепты автора всегда по убыванию даты
+            models.Index(fields=('-pub_date',), name='recipe_pub_date_idx'),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name[:MAX_STR_LENGTH]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.short_code:
+            # Код однозначно выводится из id, поэтому назначается сразу
+            self.short_code = encode_short_code(self.pk)
+            Recipe.objects.filter(pk=self.pk).update(
+                short_code=self.short_code
+            )
+
 
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(
@@ -122,6 +141,12 @@ class IngredientInRecipe(models.Model):
                 name='unique_ingredient_in_recipe'
             ),
         )
+        indexes = (
+            # Поиск рецептов по ингредиенту без обращения к таблице
+            models.Index(
+                fields=('ingredient', 'recipe'), name='ingredient_recipe_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.ingredient} — {self.amount} ({self.recipe})'
@@ -139,6 +164,8 @@ class UserRecipeRelation(models.Model):
         verbose_name='Рецепт'
     )
 
+    objects = ShardedManager()
+
     class Meta:
         abstract = True
         constraints = (
@@ -164,3 +191,180 @@ class ShoppingCart(UserRecipeRelation):
         verbose_name = 'покупка'
         verbose_name_plural = 'покупки'
         default_related_name = 'shopping_carts'
+
+
+class RecipeChange(models.Model):
+    """
+    Журнал изменений рецептов для индексов в памяти процессов.
+
+    Процесс помнит последнюю обработанную запись и перечитывает только
+    рецепты из новых записей (core.ingredient_index).
+    """
+
+    recipe_id = models.BigIntegerField(
+        'Рецепт', null=True, blank=True,
+        help_text='Пусто — изменилось много рецептов, нужна полная перестройка'
+    )
+    created = models.DateTimeField('Время', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'изменение рецепта'
+        verbose_name_plural = 'изменения рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id or "все"} ({self.created:%Y-%m-%d %H:%M})'
+
+    @classmethod
+    def record(cls, *recipe_ids):
+        """Запись об изменении; без id — изменились все рецепты."""
+        cls.objects.bulk_create(
+            [cls(recipe_id=recipe_id) for recipe_id in recipe_ids]
+            or [cls(recipe_id=None)]
+        )
+
+
+class RecipeActivity(models.Model):
+    """
+    Добавления и удаления рецептов в избранном и корзинах.
+
+    Из журнала update_rankings считает трендовость по окнам времени;
+    хранится не дольше самого длинного окна.
+    """
+
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    KINDS = (
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Корзина'),
+    )
+
+    recipe_id = models.BigIntegerField('Рецепт')
+    kind = models.CharField('Действие', max_length=16, choices=KINDS)
+    delta = models.SmallIntegerField('Изменение')
+    created = models.DateTimeField('Время', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'действие с рецептом'
+        verbose_name_plural = 'действия с рецептами'
+        indexes = (
+            models.Index(
+                fields=('recipe_id', 'created'),
+                name='activity_recipe_created_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.kind} {self.delta:+d}'
+
+
+class RecipeRanking(models.Model):
+    """
+    Популярность и трендовость рецепта, посчитанные update_rankings.
+
+    Строка есть у каждого рецепта, поэтому сортировка ленты по ним
+    идёт по индексам (оценка, рецепт) без соединения с агрегатами.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт'
+    )
+    popular = models.FloatField('Популярность', default=0)
+    trending = models.FloatField('Трендовость', default=0)
+    updated = models.DateTimeField('Пересчитан', auto_now=True)
+
+    class Meta:
+        verbose_name = 'рейтинг рецепта'
+        verbose_name_plural = 'рейтинги рецептов'
+        indexes = (
+            models.Index(
+                fields=('-popular', '-recipe'), name='ranking_popular_idx'
+            ),
+            models.Index(
+                fields=('-trending', '-recipe'), name='ranking_trending_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.popular:g} / {self.trending:g}'
+
+
+class RankingRun(models.Model):
+    """Запуск update_rankings: с какого момента считать следующий."""
+
+    started = models.DateTimeField('Начат')
+    last_recipe_id = models.BigIntegerField('Последний рецепт', default=0)
+    updated = models.PositiveIntegerField('Пересчитано рецептов')
+    full = models.BooleanField('Полный пересчёт', default=False)
+    duration = models.FloatField('Длительность, с')
+
+    class Meta:
+        verbose_name = 'пересчёт рейтингов'
+        verbose_name_plural = 'пересчёты рейтингов'
+        get_latest_by = 'started'
+
+    def __str__(self):
+        return f'{self.started:%Y-%m-%d %H:%M:%S}: {self.updated}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Место в списке похожих рецептов, посчитанном update_similar_recipes.
+
+    Список читается одним запросом по индексу (рецепт, место). Строка с
+    удалённым похожим рецептом остаётся до пересчёта: по ней следующий
+    запуск находит списки, которые нужно обновить.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    position = models.PositiveSmallIntegerField('Место')
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'position'),
+                name='unique_similar_recipe_position'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id} → {self.similar_id}: {self.score:.3f}'
+
+
+class SimilarityRun(models.Model):
+    """Запуск update_similar_recipes: с какого изменения продолжать."""
+
+    started = models.DateTimeField('Начат')
+    last_change = models.BigIntegerField('Последнее изменение', default=0)
+    updated = models.PositiveIntegerField('Пересчитано списков')
+    full = models.BooleanField('Полный пересчёт', default=False)
+    duration = models.FloatField('Длительность, с')
+    # Если набор сменился, списки рецептов с этими ингредиентами
+    # пересчитываются и без изменений в самих рецептах
+    stop_ingredients = models.JSONField('Стоп-ингредиенты', default=list)
+
+    class Meta:
+        verbose_name = 'пересчёт похожих рецептов'
+        verbose_name_plural = 'пересчёты похожих рецептов'
+        get_latest_by = 'started'
+
+    def __str__(self):
+        return f'{self.started:%Y-%m-%d %H:%M:%S}: {self.updated}'
@@ -0,0 +1,147 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from functools import partial
+
+from .models import Recipe
+
+
+def coded_recipes():
+    return (
+        Recipe.objects.filter(short_code__isnull=False)
+        .values_list('id', 'short_code').order_by('id')
+    )
+
+
+def _write_entries(map_file, queryset, batch_size, digest=None):
+    """Пишет строки map пачками по id: (строк, id последней строки)."""
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return written, last_id
+        chunk = ''.join(
+            f'{short_code} {recipe_id};\n' for recipe_id, short_code in batch
+        ).encode()
+        if digest is not None:
+            digest.update(chunk)
+        map_file.write(chunk)
+        written += len(batch)
+        last_id = batch[-1][0]
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as map_file:
+            for chunk in iter(partial(map_file.read, 64 * 1024), b''):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def _state_path(path):
+    # Не *.map: nginx подключает из каталога только map-файлы
+    return f'{path}.state'
+
+
+def read_state(path):
+    """{'last_id', 'count'} последней выгрузки или None."""
+    try:
+        with open(_state_path(path), encoding='utf-8') as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_state(path, last_id, count):
+    with open(_state_path(path), 'w', encoding='utf-8') as state_file:
+        json.dump({'last_id': last_id, 'count': count}, state_file)
+
+
+@contextmanager
+def _replacing(path):
+    """
+    Временный файл рядом с path; после блока подменяет path атомарно,
+    поэтому nginx не прочитает map-файл наполовину.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', suffix='.tmp'
+    )
+    try:
+        with os.fdopen(fd, 'wb') as map_file:
+            yield map_file, tmp_path
+        if os.path.exists(tmp_path):
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@contextmanager
+def _locked(path):
+    # Параллельная выгрузка со старыми данными не подменит более новую
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _write_full(path, batch_size, force):
+    with _replacing(path) as (map_file, tmp_path):
+        digest = hashlib.sha256()
+        written, last_id = _write_entries(
+            map_file, coded_recipes(), batch_size, digest
+        )
+        map_file.close()
+        changed = force or digest.hexdigest() != _file_digest(path)
+        if not changed:
+            os.remove(tmp_path)
+    _write_state(path, last_id, written)
+    return written, changed
+
+
+def write_map(path, batch_size=5000, force=False):
+    """
+    Переписывает map-файл nginx целиком: (строк, изменился ли файл).
+    """
+    path = str(path)
+    with _locked(path):
+        return _write_full(path, batch_size, force)
+
+
+def update_map(path, batch_size=5000):
+    """
+    Дописывает в map-файл коды рецептов новее последней выгрузки:
+    (записано строк, изменился ли файл, переписан ли целиком).
+
+    Если кодов в БД не столько, сколько выгружено плюс новые (рецепты
+    удалены или старым рецептам присвоены коды), файл переписывается
+    целиком.
+    """
+    path = str(path)
+    with _locked(path):
+        state = read_state(path)
+        queryset = coded_recipes()
+        new = queryset.filter(id__gt=state['last_id']) if state else None
+        if (
+            state is None or not os.path.exists(path)
+            or queryset.count() != state['count'] + new.count()
+        ):
+            return (*_write_full(path, batch_size, force=False), True)
+        if not new.exists():
+            return 0, False, False
+        with _replacing(path) as (map_file, _):
+            with open(path, 'rb') as current:
+                shutil.copyfileobj(current, map_file)
+            written, last_id = _write_entries(map_file, new, batch_size)
+        _write_state(path, last_id, state['count'] + written)
+        return written, True, False
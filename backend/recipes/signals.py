@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Recipe
+from .views import short_links
+
+
+@receiver(post_delete, sender=Recipe)
+def clear_short_code_cache(sender, **kwargs):
+    # Кеш локален для процесса: сбрасывается только здесь, другие
+    # воркеры перенаправляют код удалённого рецепта, пока запись не
+    # вытеснена, и страница рецепта отвечает 404. map-файл nginx
+    # перепишет сервис short_links (export_short_links --interval)
+    short_links.clear()
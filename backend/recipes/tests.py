@@ -0,0 +1,382 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.nplusone import detect_n_plus_one
+from core.short_codes import encode_short_code
+from recipes.models import (
+    Ingredient, IngredientInRecipe, Recipe, RecipeChange, RecipeRanking,
+    SimilarRecipe, Tag
+)
+from recipes.management.commands.load_csv_data import iter_json_rows
+from recipes.short_links import update_map
+from users.models import User
+
+
+def recipe_item(name, **fields):
+    return {
+        'author': 'author@example.com',
+        'name': name,
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': 'images/seed.png',
+        'pub_date': '2026-01-01T00:00:00+00:00',
+        'tags': ['lunch'],
+        'ingredients': [
+            {'name': 'Соль', 'measurement_unit': 'г', 'amount': 1}
+        ],
+        **fields,
+    }
+
+
+class ImportRecipesTests(TestCase):
+    """Загрузка рецептов из NDJSON командой import_recipes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        Tag.objects.create(name='Обед', slug='lunch')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def import_lines(self, lines):
+        stdout, stderr = StringIO(), StringIO()
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.ndjson', encoding='utf-8'
+        ) as file:
+            file.writelines(line + '\n' for line in lines)
+            file.flush()
+            call_command(
+                'import_recipes', file.name, stdout=stdout, stderr=stderr
+            )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_invalid_lines_are_skipped(self):
+        first, second = recipe_item('Первый'), recipe_item('Второй')
+        del second['pub_date']
+        stdout, stderr = self.import_lines([
+            json.dumps(first),
+            '{"name": ',
+            json.dumps(second),
+            json.dumps(recipe_item('Третий', cooking_time='долго')),
+            json.dumps(recipe_item('Четвёртый', tags=['dinner'])),
+            json.dumps(recipe_item('Пятый')),
+            json.dumps(recipe_item('Шестой', ingredients=[
+                {'name': 'Соль', 'measurement_unit': 'г', 'amount': 1},
+                {'name': 'Соль', 'measurement_unit': 'г', 'amount': 2},
+            ])),
+        ])
+        self.assertIn('Рецептов: 2, пропущено строк: 5', stdout)
+        for number in (2, 3, 4, 5, 7):
+            self.assertIn(f'Строка {number} пропущена', stderr)
+        self.assertIn('ингредиент Соль (г) повторяется', stderr)
+        self.assertEqual(
+            set(Recipe.objects.values_list('name', flat=True)),
+            {'Первый', 'Пятый'}
+        )
+
+    def test_rows_bypassed_by_bulk_create(self):
+        # Удалённый id не должен достаться новому рецепту
+        deleted = Recipe.objects.create(
+            author=self.author, name='Удалённый', text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+        deleted_id = deleted.id
+        deleted.delete()
+        self.import_lines([
+            json.dumps(recipe_item(f'Рецепт {number}')) for number in range(3)
+        ])
+        recipes = list(
+            Recipe.objects.prefetch_related('tags', 'ingredients')
+            .order_by('id')
+        )
+        self.assertEqual(len(recipes), 3)
+        self.assertNotIn(deleted_id, [recipe.id for recipe in recipes])
+        for number, recipe in enumerate(recipes):
+            self.assertEqual(recipe.name, f'Рецепт {number}')
+            self.assertEqual(recipe.short_code, encode_short_code(recipe.id))
+            self.assertEqual(
+                [tag.slug for tag in recipe.tags.all()], ['lunch']
+            )
+            self.assertEqual(len(recipe.ingredients.all()), 1)
+        recipe_ids = {recipe.id for recipe in recipes}
+        self.assertEqual(
+            set(RecipeRanking.objects.values_list('recipe_id', flat=True)),
+            recipe_ids
+        )
+        self.assertTrue(recipe_ids <= set(
+            RecipeChange.objects.values_list('recipe_id', flat=True)
+        ))
+
+
+class SeedTests(TestCase):
+    """Генерация тестовых данных командой seed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(20)
+        )
+
+    def seed(self, **options):
+        call_command(
+            'seed', users=5, recipes=8, stdout=StringIO(),
+            **options
+        )
+
+    def test_repeated_runs(self):
+        User.objects.create_user(
+            email='user@example.com', username='user',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+        self.seed()
+        self.seed(seed=7)
+        self.assertEqual(User.objects.count(), 11)
+        self.assertEqual(
+            User.objects.filter(username__startswith='seed_user_').count(),
+            10
+        )
+        recipes = list(Recipe.objects.order_by('id'))
+        self.assertEqual(len(recipes), 16)
+        for recipe in recipes:
+            self.assertEqual(recipe.short_code, encode_short_code(recipe.id))
+        self.assertEqual(RecipeRanking.objects.count(), 16)
+        # Новые записи после seed получают свободные id
+        User.objects.create_user(
+            email='late@example.com', username='late',
+            first_name='Имя', last_name='Фамилия', password='password'
+        )
+
+
+class LoadCatalogTests(TestCase):
+    """load_csv_data: потоковое чтение CSV и JSON, пачки и --upsert."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def load(self, path, *args):
+        call_command(
+            'load_csv_data', '--file', path, '--batch-size', '3', *args,
+            stdout=StringIO()
+        )
+
+    def catalog(self):
+        return set(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+    def test_json_array_and_ndjson(self):
+        items = [
+            {'name': f'Ингредиент {number}', 'measurement_unit': 'г'}
+            for number in range(5)
+        ]
+        expected = [(item['name'], 'г') for item in items]
+        # Объекты длиннее чанка собираются из нескольких чтений
+        with mock.patch(
+            'recipes.management.commands.load_csv_data.'
+            'JSON_READ_CHUNK_SIZE', 7
+        ):
+            for content in (
+                json.dumps(items, ensure_ascii=False, indent=1),
+                '\n'.join(json.dumps(item) for item in items) + '\n',
+            ):
+                with self.subTest(content=content[:10]):
+                    self.assertEqual(
+                        list(iter_json_rows(StringIO(content))), expected
+                    )
+
+    def test_csv_batches(self):
+        path = self.write('ingredients.csv', (
+            'Соль,г\nПерец,г\n,г\nСоль,г\nМука,кг\nСахар\n'
+        ))
+        self.load(path)
+        self.assertEqual(
+            self.catalog(), {('Соль', 'г'), ('Перец', 'г'), ('Мука', 'кг')}
+        )
+
+    def test_upsert(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='кг')
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        Ingredient.objects.create(name='Мука', measurement_unit='кг')
+        path = self.write('ingredients.json', json.dumps([
+            {'name': 'Соль', 'measurement_unit': 'г'},
+            {'name': 'Мука', 'measurement_unit': 'ст. л.'},
+            {'name': 'Перец', 'measurement_unit': 'г'},
+        ]))
+        self.load(path, '--upsert')
+        # Единственная соль сменила единицу, у муки их несколько —
+        # новая пара добавлена
+        self.assertEqual(self.catalog(), {
+            ('Соль', 'г'), ('Мука', 'г'), ('Мука', 'кг'),
+            ('Мука', 'ст. л.'), ('Перец', 'г'),
+        })
+
+
+class ShortLinksMapTests(TestCase):
+    """map-файл nginx: новые коды дописываются, удаления — перезапись."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'short_links.map')
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.author, name=name, text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+
+    def export(self):
+        # Каждая выгрузка — отдельный запуск команды: пачки одного
+        # запуска не должны считаться повторами между запусками
+        with detect_n_plus_one('export_short_links'):
+            return update_map(self.path)
+
+    def map_lines(self):
+        with open(self.path, encoding='utf-8') as map_file:
+            return map_file.read().splitlines()
+
+    def test_append_and_rewrite(self):
+        first = self.create_recipe('Первый')
+        self.assertEqual(self.export(), (1, True, True))
+        self.assertEqual(
+            self.map_lines(), [f'{first.short_code} {first.id};']
+        )
+        self.assertEqual(self.export(), (0, False, False))
+
+        second = self.create_recipe('Второй')
+        self.assertEqual(self.export(), (1, True, False))
+        self.assertEqual(self.map_lines(), [
+            f'{first.short_code} {first.id};',
+            f'{second.short_code} {second.id};',
+        ])
+
+        first.delete()
+        self.assertEqual(self.export(), (1, True, True))
+        self.assertEqual(
+            self.map_lines(), [f'{second.short_code} {second.id};']
+        )
+
+    def test_codes_assigned_to_old_recipes(self):
+        old = self.create_recipe('Старый')
+        Recipe.objects.filter(pk=old.pk).update(short_code=None)
+        self.create_recipe('Новый')
+        self.export()
+        call_command('backfill_short_codes', stdout=StringIO())
+        self.assertEqual(self.export(), (2, True, True))
+        self.assertIn(
+            f'{encode_short_code(old.id)} {old.id};', self.map_lines()
+        )
+
+
+@override_settings(
+    SIMILAR_RECIPES_COUNT=3, SIMILAR_RECIPES_STOP_RATIO=0.5,
+    SIMILAR_RECIPES_STOP_MIN=0
+)
+class SimilarRecipesTests(TestCase):
+    """update_similar_recipes: пересчёт по изменениям равен полному."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Автор', last_name='Рецептов', password='password'
+        )
+        cls.tags = [
+            Tag.objects.create(name=name, slug=slug)
+            for name, slug in (('Обед', 'lunch'), ('Ужин', 'dinner'))
+        ]
+        cls.salt, *cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Мука', 'Сахар', 'Яйцо', 'Масло', 'Рис')
+        ]
+
+    def create_recipe(self, name, *ingredients, tag=0):
+        recipe = Recipe.objects.create(
+            author=self.author, name=name, text='Описание',
+            cooking_time=10, image='images/seed.png'
+        )
+        Recipe.tags.through.objects.create(recipe=recipe, tag=self.tags[tag])
+        # Соль есть во всех рецептах — стоп-ингредиент
+        for ingredient in (self.salt, *ingredients):
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+        return recipe
+
+    def update(self, *args):
+        # Каждый пересчёт — отдельный запуск команды
+        with detect_n_plus_one('update_similar_recipes'):
+            call_command('update_similar_recipes', *args, stdout=StringIO())
+            # Иначе запас OVERLAP вернёт в пересчёт все прошлые изменения
+            RecipeChange.objects.update(
+                created=timezone.now() - timedelta(hours=1)
+            )
+            return sorted(
+                (row.recipe_id, row.position, row.similar_id,
+                 round(row.score, 9))
+                for row in SimilarRecipe.objects.all()
+            )
+
+    def test_incremental_run_matches_full_run(self):
+        flour, sugar, egg, butter, rice = self.ingredients
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes = [
+                self.create_recipe('Блины', flour, egg, butter),
+                self.create_recipe('Пирог', flour, sugar, egg, tag=1),
+                self.create_recipe('Каша', rice, butter),
+                self.create_recipe('Плов', rice, tag=1),
+                self.create_recipe('Печенье', flour, sugar, butter),
+                self.create_recipe('Рассол'),
+            ]
+        self.update('--full')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes[0].delete()
+            IngredientInRecipe.objects.filter(
+                recipe=recipes[2], ingredient=butter
+            ).delete()
+            IngredientInRecipe.objects.create(
+                recipe=recipes[3], ingredient=sugar, amount=1
+            )
+            self.create_recipe('Омлет', egg, butter)
+        self.assertEqual(self.update(), self.update('--full'))
+        # Новый рецепт попадает в списки не изменённых рецептов, а сахар
+        # (4 рецепта из 7) становится стоп-ингредиентом
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe('Кекс', flour, sugar, butter)
+        self.assertEqual(self.update(), self.update('--full'))
+        # Удалённый рецепт пропадает из чужих списков, сахар (3 из 6)
+        # снова порождает кандидатов
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes[1].delete()
+        incremental = self.update()
+        self.assertEqual(incremental, self.update('--full'))
+        similar = {
+            similar_id for recipe_id, _, similar_id, _ in incremental
+            if recipe_id == recipes[5].id
+        }
+        # Общая у рецепта только соль: кандидатов она не даёт
+        self.assertEqual(similar, set())
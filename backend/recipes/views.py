@@ -1,10 +1,44 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
-from django.views.decorators.http import require_GET
 
+from core import metrics
+from core.constants import MAX_SHORT_CODE_LENGTH, SHORT_LINK_CACHE_SIZE
+from core.short_codes import decode_short_code
+from core.utils import LRUCache, require_safe_async
 from .models import Recipe
 
+short_links = LRUCache(SHORT_LINK_CACHE_SIZE)
 
-@require_GET
-def redirect_short_link(request, short_code):
-    recipe = get_object_or_404(Recipe, short_code=short_code)
-    return redirect(f'/recipes/{recipe.id}', permanent=True)
+
+def resolve_short_code(short_code):
+    """
+    id рецепта по случайному коду старого формата; промахи (404)
+    не кешируются.
+    """
+    recipe_id = short_links.get(short_code)
+    if recipe_id is None:
+        recipe_id = get_object_or_404(
+            Recipe.objects.values_list('id', flat=True),
+            short_code=short_code
+        )
+        short_links.set(short_code, recipe_id)
+    return recipe_id
+
+
+@require_safe_async
+async def redirect_short_link(request, short_code):
+    if len(short_code) > MAX_SHORT_CODE_LENGTH:
+        raise Http404
+    # Новый код — это id рецепта в другой системе счисления: ответ без
+    # БД. Как и map-файл nginx, код удалённого рецепта ведёт на его
+    # страницу, которая отвечает 404
+    recipe_id = decode_short_code(short_code)
+    if recipe_id is None:
+        # Старые коды: при попадании в кеш ответ готовится в цикле
+        # событий, к БД обращаемся в потоке только при промахе
+        recipe_id = short_links.get(short_code)
+        metrics.cache_access('short_links', recipe_id is not None)
+        if recipe_id is None:
+            recipe_id = await sync_to_async(resolve_short_code)(short_code)
+    return redirect(f'/recipes/{recipe_id}', permanent=True)
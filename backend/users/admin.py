@@ -3,13 +3,18 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
 from django.utils.html import format_html
 
+from core import sharding
+from core.admin import (
+    AutocompleteFilter, ScalableAdminMixin, ShardedAdminMixin, SubqueryCount
+)
+from recipes.models import Recipe
 from .models import User, Subscription
 
 admin.site.unregister(Group)
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(ScalableAdminMixin, BaseUserAdmin):
     list_display = (
         'email',
         'username',
@@ -49,21 +54,52 @@ class UserAdmin(BaseUserAdmin):
             )
         return 'Нет фото'
 
-    @admin.display(description='Количество рецептов')
+    def get_list_display(self, request):
+        list_display = super().get_list_display(request)
+        if sharding.is_enabled():
+            # Подписки в шардах: подзапрос к default вернул бы нули
+            return tuple(
+                name for name in list_display
+                if name != 'subscriptions_to_author_count'
+            )
+        return list_display
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).annotate(
+            recipes_count=SubqueryCount(Recipe, 'author'),
+        )
+        if sharding.is_enabled():
+            return queryset
+        return queryset.annotate(
+            subscriptions_to_author_count=SubqueryCount(
+                Subscription, 'author'
+            ),
+        )
+
+    @admin.display(description='Количество рецептов', ordering='recipes_count')
     def recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
-    @admin.display(description='Количество подписчиков')
+    @admin.display(
+        description='Количество подписчиков',
+        ordering='subscriptions_to_author_count'
+    )
     def subscriptions_to_author_count(self, obj):
-        return obj.user_subscriptions.count()
+        return obj.subscriptions_to_author_count
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(
+    ShardedAdminMixin, ScalableAdminMixin, admin.ModelAdmin
+):
     list_display = (
         'user',
         'author',
     )
-    list_filter = ('user',)
-    search_fields = ('user',)
+    list_filter = (
+        ('user', AutocompleteFilter), ('author', AutocompleteFilter)
+    )
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
     ordering = ('author',)
@@ -5,3 +5,9 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     verbose_name = 'Пользователи'
+
+    def ready(self):
+        from core.storage import connect_file_cleanup
+        from .models import User
+
+        connect_file_cleanup(User, 'avatar')
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-19 09:23
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_subscription_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='subscription',
+            options={'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 
 from core.constants import MAX_EMAIL_LENGTH, MAX_NAME_LENGTH, MAX_STR_LENGTH
+from core.sharding import ShardedManager
 
 
 class User(AbstractUser):
@@ -51,6 +52,8 @@ class Subscription(models.Model):
         verbose_name='Автор'
     )
 
+    objects = ShardedManager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -61,6 +64,12 @@ class Subscription(models.Model):
                 name='unique_subscription'
             ),
         )
+        indexes = (
+            # Подписчики автора; выборки по user покрывает unique_subscription
+            models.Index(
+                fields=('author', 'user'), name='subscription_author_user_idx'
+            ),
+        )
 
     def clean(self):
         if self.user == self.author:
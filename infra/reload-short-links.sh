@@ -0,0 +1,22 @@
+#!/bin/sh
+# Перечитывает конфигурацию, когда сервис short_links подменяет map-файл:
+# nginx читает подключённые map-файлы только при запуске и reload.
+# Скрипт из /docker-entrypoint.d/ запускается перед nginx и оставляет
+# проверку в фоне. SHORT_LINKS_RELOAD_INTERVAL=0 выключает её.
+interval="${SHORT_LINKS_RELOAD_INTERVAL:-10}"
+[ "$interval" -gt 0 ] || exit 0
+
+map_state() {
+    stat -c '%i %Y %s' /etc/nginx/short_links/*.map 2>/dev/null
+}
+
+(
+    previous="$(map_state)"
+    while sleep "$interval"; do
+        current="$(map_state)"
+        if [ "$current" != "$previous" ] && nginx -t -q; then
+            nginx -s reload
+            previous="$current"
+        fi
+    done
+) &